@@ -3,20 +3,96 @@ import bz2
 import json
 import logging
 import os
+import sys
 from argparse import RawTextHelpFormatter
+from array import array
+from datetime import date as date_type
 from datetime import datetime
 from ipaddress import ip_address, ip_network
-from typing import Optional
+from typing import Iterator, Optional
 
 import ijson
 from pydantic import BaseModel, Field
 
+# Shared modules are in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.bz2reader import open_lines  # Parallel bz2 decompression
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 CPE_FIELD_IN_SHODAN = "cpe23"
 IP_FIELD_IN_SHODAN = "ip_str"
 PORT_FIELD_IN_SHODAN = "port"
 MODULE_FIELD_IN_SHODAN = "module"
 PREFIX_MODULE_FIELD_IN_SHODAN = "_shodan"
 
+# Scan files hold a JSON array (.json) or one scan per line (JSON Lines), optionally compressed
+JSON_LINES_EXTENSIONS = (".jsonl", ".jsonl.bz2", ".jsonl.zst")
+SCAN_FILE_EXTENSIONS = (".json", *JSON_LINES_EXTENSIONS)
+
+# Processes used to decompress each .bz2 file, the analysis itself runs on a single process
+READER_WORKERS = os.cpu_count() or 1
+
+# Compression of the Censys data stored in Shodan format, and the extension of each option
+OUTPUT_COMPRESSIONS = {"none": ".jsonl", "bz2": ".jsonl.bz2", "zstd": ".jsonl.zst"}
+
+
+def get_scan_file_extension(filename: str) -> Optional[str]:
+    """Get the scan file extension of a filename, None if it is not a scan file"""
+    for extension in SCAN_FILE_EXTENSIONS:
+        if filename.endswith(extension):
+            return extension
+
+    return None
+
+
+def get_scan_file_date(filename: str) -> str:
+    """Get the date of a scan file, e.g. 20240301 for BR.UFMG.20240301.jsonl.zst"""
+    return filename.removesuffix(get_scan_file_extension(filename)).split(".")[-1]
+
+
+def read_scans(path: str) -> Iterator[dict]:
+    """Read the scans of a file one at a time, so files of any size use constant memory
+
+    JSON arrays (.json and .json.bz2) are parsed incrementally with ijson and
+    JSON Lines files are read line by line."""
+    if path.endswith(JSON_LINES_EXTENSIONS[0]):
+        with open(path, "rb") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    elif path.endswith(JSON_LINES_EXTENSIONS[1:]):
+        for line in open_lines(path, READER_WORKERS):
+            if line.strip():
+                yield json.loads(line)
+
+    else:
+        with (bz2.open if path.endswith(".bz2") else open)(path, "rb") as file:
+            yield from ijson.items(file, "item", use_float=True)
+
+
+def open_scan_writer(path: str, compression: str):
+    """Open a binary file to write scans as JSON Lines, compressed with bz2 or zstd if asked"""
+    if compression == "bz2":
+        return bz2.open(path, "wb")
+
+    if compression == "zstd":
+        if zstandard is None:
+            logging.error("zstandard is needed to store zstd compressed files")
+            raise Exception("Missing zstandard package")
+
+        return zstandard.ZstdCompressor(level=3).stream_writer(
+            open(path, "wb"), closefd=True
+        )
+
+    return open(path, "wb")
+
+
 class FileSummary:
     """
     Class to handle functions to analyze Shodan and Censys data, reading 
@@ -26,37 +102,45 @@ class FileSummary:
     """
 
     def __init__(self):
-        self.days_scan: dict[str, dict] = {}
-        self.unique_ips: list[int] = [0]
-        self.all_ips: list[str] = []
-        self.repeated_ip_scan: list[int] = [0]
-        self.ip_scaned_again_same_day: list[int] = [0]
-        self.ips_scanned: list[int] = [0]
+        # IPs get a compact ID in the order they are first seen
+        self.ip_ids: dict[str, int] = {}
+        # Number of scans of each IP, indexed by IP ID
+        self.scans_by_ip: array = array("Q")
+        # Days each IP was scanned in, as (IP ID << 32) | day ordinal
+        self.ip_days: set[int] = set()
+        # Per-day counters, indexed by day
+        self.unique_ips: array = array("Q", [0])
+        self.repeated_ip_scan: array = array("Q", [0])
+        self.ip_scaned_again_same_day: array = array("Q", [0])
+        self.ips_scanned: array = array("Q", [0])
         self.attributes_collected: list[str] = []
         self.scan_modules: dict[str, set[str]] = {}
         self.cpe_by_ip: dict[str, set] = {}
 
     def add_info_temporal_scan(self, ip: str, timestamp: datetime, index: int):
-        date = f"{timestamp.year}:{timestamp.month}:{timestamp.day}"
+        day = timestamp.toordinal()
 
         self.ips_scanned[index] += 1
 
-        if ip in self.days_scan:
+        ip_id = self.ip_ids.get(ip)
+
+        if ip_id is None:
+            ip_id = len(self.ip_ids)
+            self.ip_ids[ip] = ip_id
+            self.scans_by_ip.append(1)
+            self.ip_days.add(ip_id << 32 | day)
+            self.unique_ips[index] += 1
+            return
 
-            if date in self.days_scan[ip]["timestamp"]:
-                self.ip_scaned_again_same_day[index] += 1
-            else:
-                self.repeated_ip_scan[index] += 1
+        ip_day = ip_id << 32 | day
 
-            self.days_scan[ip]["timestamp"].add(date)
-            self.days_scan[ip]["scans"] += 1
+        if ip_day in self.ip_days:
+            self.ip_scaned_again_same_day[index] += 1
         else:
-            self.days_scan[ip] = {"timestamp": set(), "scans": 1}
-            self.days_scan[ip]["timestamp"].add(date)
+            self.repeated_ip_scan[index] += 1
+            self.ip_days.add(ip_day)
 
-        if ip not in self.all_ips:
-            self.all_ips.append(ip)
-            self.unique_ips[index] += 1
+        self.scans_by_ip[ip_id] += 1
 
     def add_info_probe_data(
         self,
@@ -91,14 +175,36 @@ class FileSummary:
 
     def dump_info_temporal_scan(self, output_directory: str, initial_date, final_date):
 
-        # Sort ips by the number of scans
-        for ip, data in self.days_scan.items():
-            self.days_scan[ip]["timestamp"] = sorted(data["timestamp"])
+        # Days of each IP as "Y:M:D" strings, formatting every day only once
+        date_by_day: dict[int, str] = {}
+        dates_by_ip: list[list[str]] = [[] for _ in range(len(self.ip_ids))]
+
+        for ip_day in self.ip_days:
+            day = ip_day & 0xFFFFFFFF
+
+            if day not in date_by_day:
+                date = date_type.fromordinal(day)
+                date_by_day[day] = f"{date.year}:{date.month}:{date.day}"
 
-        sorted_daysScan = sorted(
-            self.days_scan.items(), key=lambda x: x[1]["scans"], reverse=True
+            dates_by_ip[ip_day >> 32].append(date_by_day[day])
+
+        # Sort ips by the number of scans, ties keep the order ips were first seen
+        ips = list(self.ip_ids)
+        sorted_ip_ids = sorted(
+            range(len(ips)), key=lambda x: self.scans_by_ip[x], reverse=True
         )
 
+        sorted_daysScan = [
+            (
+                ips[ip_id],
+                {
+                    "timestamp": sorted(dates_by_ip[ip_id]),
+                    "scans": self.scans_by_ip[ip_id],
+                },
+            )
+            for ip_id in sorted_ip_ids
+        ]
+
         # Group data for JSON output
         data = {
             "days_summary": [
@@ -278,14 +384,16 @@ class AnalysisShodanCensysData:
     """class to load, filter and make analysis in shodan and censys data"""
 
     def load_censys_in_shodan_format(
-        self, input_directory_load_Censys, output_directory_load_Censys
+        self, input_directory_load_Censys, output_directory_load_Censys, compression="none"
     ):
         """
-        load_censys_in_shodan_format: parse censys file (.json.bz2) to shodan format (.json)
+        load_censys_in_shodan_format: parse censys file (.json.bz2) to shodan format (.jsonl, .jsonl.bz2 or .jsonl.zst)
+
+        input: directory with initial data, output direcoty to store censys file in shodan format and compression of the output files (none, bz2 or zstd)
 
-        input: directory with initial data and output direcoty to store censys file in shodan format
+        return: none. Will be stored censys file in shodan format, one scan per line, in the path: .../inputDirectory/censys_formated/
 
-        return: none. Will be stored censys file in shodan format in the path: .../inputDirectory/censys_formated/
+        Scans are read and written one at a time, so memory use does not depend on the file size.
         """
 
         # Ufmg ips directory
@@ -295,12 +403,16 @@ class AnalysisShodanCensysData:
             logging.warning(f"Invalid directory: {directory}")
             raise Exception("Directory not valid or not exists")
 
+        if compression not in OUTPUT_COMPRESSIONS:
+            logging.error(f"Invalid compression: {compression}")
+            raise Exception("Compression not valid")
+
         for file in os.scandir(directory):
 
             # Skip dirs and non-json files
             if (
                 not file.is_file()
-                or not file.name.endswith(".json.bz2")
+                or not file.name.endswith((".json.bz2", *JSON_LINES_EXTENSIONS[1:]))
                 or not file.name.lower().startswith("censys")
             ):
                 logging.warning(f"Invalid file: {file.name}. Skipping ...")
@@ -308,40 +420,37 @@ class AnalysisShodanCensysData:
 
             logging.info(f"Opening file: {file}")
 
-            info_Censys_to_Shodan_format: list[dict] = []
-
-            # read all scans
-            with bz2.open(file, "rt") as f:
+            # create new filename and ignoring extension .json.bz2
+            filename_output = (
+                file.name.split(".")[0] + ".formated." + file.name.split(".")[1]
+            )
+            output_path = os.path.join(
+                output_directory_load_Censys,
+                filename_output + OUTPUT_COMPRESSIONS[compression],
+            )
 
-                content = f.read()
+            logging.info(f"Creating new folder: {output_directory_load_Censys}")
+            os.makedirs(output_directory_load_Censys, exist_ok=True)
 
-                scan = json.loads(content)
+            # Write to a partial file first, so an interrupted run never leaves a truncated file to be analyzed
+            partial_path = f"{output_path}.partial"
+            qty = 0
 
-                for line in scan:
+            with open_scan_writer(partial_path, compression) as output:
+                for line in read_scans(file.path):
 
                     for i in line["services"]:
-                        line["services"] = i
-
                         # parse the information using pydantic class
-                        info_scanned = Shodan.parse_row(line)
+                        info_scanned = Shodan.parse_row({**line, "services": i})
 
-                        info_Censys_to_Shodan_format.append(
-                            info_scanned.model_dump(exclude=None, by_alias=True)
+                        output.write(
+                            info_scanned.model_dump_json(by_alias=True).encode() + b"\n"
                         )
-                        info_scanned = {}  # clean the dict
+                        qty += 1
 
-            # create new filename and ignoring extension .json.bz2
-            filename_output = (
-                file.name.split(".")[0] + ".formated." + file.name.split(".")[1]
-            )
-
-            logging.info(f"Creating new folder: {output_directory_load_Censys}")
-            os.makedirs(output_directory_load_Censys, exist_ok=True)
+            os.replace(partial_path, output_path)
 
-            with open(
-                f"{output_directory_load_Censys}{filename_output}.json", "w"
-            ) as file:
-                json.dump(info_Censys_to_Shodan_format, file, indent=6)
+            logging.info(f"Stored {qty} scans in Shodan format in file: {output_path}")
 
     def probe_data_shodan_and_censys(
         self, input_directory_probe_data, output_directory_probe_data
@@ -367,33 +476,30 @@ class AnalysisShodanCensysData:
 
         for file in os.scandir(input_directory_probe_data):
             # Skip dirs and non-json files
-            if not file.is_file() or not file.path.endswith(".json"):
+            if not file.is_file() or get_scan_file_extension(file.name) is None:
                 logging.warning(f"Invalid file: {file.path}. Skipping ...")
                 continue
 
             logging.info(f"Opening file: {file}")
 
-            with open(file.path, "r") as file:
-                objects = ijson.items(file, "item")
+            # Print the value of the 'name' key directly for each dictionary
+            for scan in read_scans(file.path):
 
-                # Print the value of the 'name' key directly for each dictionary
-                for scan in objects:
+                ip = scan["ip_str"]
 
-                    ip = scan["ip_str"]
+                scan_attributes = scan.keys()
 
-                    scan_attributes = scan.keys()
+                cpe = []
+                if "cpe23" in scan:
+                    cpe = scan["cpe23"]
 
-                    cpe = []
-                    if "cpe23" in scan:
-                        cpe = scan["cpe23"]
+                port = scan["port"]
 
-                    port = scan["port"]
+                module = scan["_shodan"]["module"]
 
-                    module = scan["_shodan"]["module"]
-
-                    file_summary.add_info_probe_data(
-                        ip, port, scan_attributes, module, cpe
-                    )
+                file_summary.add_info_probe_data(
+                    ip, port, scan_attributes, module, cpe
+                )
 
             file_summary.dump_info_probe_data(output_directory_probe_data)
 
@@ -420,7 +526,7 @@ class AnalysisShodanCensysData:
         files = [
             file.name
             for file in os.scandir(input_directory)
-            if file.is_file() and file.name.endswith(".json")
+            if file.is_file() and get_scan_file_extension(file.name) is not None
         ]
         sorted_files = sorted(files)
 
@@ -432,9 +538,11 @@ class AnalysisShodanCensysData:
 
         # Reading date by the filename
         initial_date = datetime.strptime(
-            sorted_files[0].split(".")[-2], "%Y%m%d"
+            get_scan_file_date(sorted_files[0]), "%Y%m%d"
+        ).date()
+        final_date = datetime.strptime(
+            get_scan_file_date(sorted_files[-1]), "%Y%m%d"
         ).date()
-        final_date = datetime.strptime(sorted_files[-1].split(".")[-2], "%Y%m%d").date()
 
         for file_name in sorted_files:
 
@@ -443,19 +551,17 @@ class AnalysisShodanCensysData:
             input_path = os.path.join(input_directory, file_name)
 
             index = 0
-            with open(input_path, "r") as file:
-                objects = ijson.items(file, "item")
 
-                # Print the value of the 'name' key directly for each dictionary
-                for scan in objects:
+            # Print the value of the 'name' key directly for each dictionary
+            for scan in read_scans(input_path):
 
-                    ip = scan["ip_str"]
+                ip = scan["ip_str"]
 
-                    timestamp = datetime.strptime(
-                        scan["timestamp"], "%Y-%m-%dT%H:%M:%S.%f"
-                    )
+                timestamp = datetime.strptime(
+                    scan["timestamp"], "%Y-%m-%dT%H:%M:%S.%f"
+                )
 
-                    file_summary.add_info_temporal_scan(ip, timestamp, index)
+                file_summary.add_info_temporal_scan(ip, timestamp, index)
 
             index += 1
             file_summary.update_info_temporal_scan()
@@ -510,14 +616,7 @@ class AnalysisShodanCensysData:
 
             qty = 0
 
-            f = bz2.open(filename, "rt")
-
-            if f == None:
-                logging.warning(f"Invalid file: {filename}. Skipping ...")
-                f.close()
-                continue
-
-            for line in f:
+            for line in open_lines(filename, READER_WORKERS):
                 scan = json.loads(line)
 
                 ip = scan.get(IP_FIELD_IN_SHODAN)
@@ -559,6 +658,7 @@ def return_input_parameters():
         --directoryShodan = used if will be informed Shodan data
         --directoryCensys = used if will be informed Censys data
         --directoryStoreCensysShodanFormat = used if will be parsed Censys data do Shodan format
+        --compressionCensysShodanFormat = compression of the Censys data in Shodan format: none, bz2 or zstd
         --directoryStoreUFMGShodanData = used if will be filtered the UFMG data in Shodan files
         
     --> Functions that will be executed:
@@ -619,6 +719,18 @@ def return_input_parameters():
         required=False,
     )
 
+    parser.add_argument(
+        "--compressionCensysShodanFormat",
+        dest="compressionCensysShodanFormat",
+        action="store",
+        metavar="compression",
+        type=str,
+        choices=list(OUTPUT_COMPRESSIONS.keys()),
+        default="none",
+        help="compression of the Censys data stored in Shodan format (JSON Lines): none, bz2 or zstd (default: none)",
+        required=False,
+    )
+
     parser.add_argument(
         "--ipUFMG",
         dest="ipUFMG",
@@ -658,7 +770,9 @@ def censys_analysis(args, analysis):
 
     logging.info("Starting function: load_censys_in_shodan_format in path")
     analysis.load_censys_in_shodan_format(
-        args.directoryCensys, newFolderCensysInShodanFormat
+        args.directoryCensys,
+        newFolderCensysInShodanFormat,
+        args.compressionCensysShodanFormat,
     )
 
     logging.info("Starting function: probe_data_shodan_and_censys")
@@ -0,0 +1,258 @@
+"""Parallel reader for line-oriented .bz2 dumps (e.g. daily Shodan scans)
+
+A .bz2 file may hold several bz2 streams back to back (pbzip2 and lbzip2
+write one stream per block).  Streams start at byte boundaries, so they
+are found by looking for the stream header and decompressed on several
+cores at the same time.  Lines are always returned in file order.
+
+Files with a single stream cannot be split at byte boundaries.  These
+are decompressed by indexed_bzip2 on several cores when it is installed,
+and by a single stdlib decompressor otherwise.
+
+Dumps that are read many times can be transcoded to zstd once (see
+transcode_to_zstd()).  When a .zst copy newer than the .bz2 file exists,
+open_lines() reads the copy instead, which is much faster to decompress.
+
+Run `python -m modules.bz2reader --help` from the repository root to
+transcode files from the command line."""
+
+from __future__ import annotations
+
+import argparse
+import bz2
+import collections
+import logging
+import multiprocessing
+import os
+import re
+import sys
+from typing import Iterable, Iterator, Optional
+
+try:
+    import indexed_bzip2
+except ImportError:
+    indexed_bzip2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Stream header: "BZh", block size and the magic number of the first block
+STREAM_HEADER = re.compile(rb"BZh[1-9]1AY&SY")
+STREAM_HEADER_SIZE = 10
+
+# Compressed bytes decompressed by each task
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Bytes read at a time when searching for stream headers or reading sequentially
+READ_SIZE = 16 * 1024 * 1024
+
+# Decompression processes are never forked from the caller, which may
+# already run threads (e.g. torch) that make forking unsafe
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def find_stream_offsets(path: str) -> list[int]:
+    """Find the offset of every bz2 stream in a file
+
+    A stream header may also show up by chance inside compressed data.
+    Such false positives are detected when decompressing the chunk that
+    starts at them, see _decompress_range()."""
+    offsets: list[int] = []
+    overlap = STREAM_HEADER_SIZE - 1
+    with open(path, "rb") as file:
+        position = 0
+        tail = b""
+        while block := file.read(READ_SIZE):
+            data = tail + block
+            base = position - len(tail)
+            offsets.extend(base + m.start() for m in STREAM_HEADER.finditer(data))
+            tail = data[-overlap:]
+            position += len(block)
+    # Headers found in the overlap are found twice
+    return sorted(set(offsets))
+
+
+def split_chunks(offsets: list[int], size: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Group consecutive streams in chunks of about chunk_size bytes"""
+    if not offsets or offsets[0] != 0:
+        return [(0, size)]
+    chunks: list[tuple[int, int]] = []
+    start = 0
+    for offset in offsets[1:]:
+        if offset - start >= chunk_size:
+            chunks.append((start, offset))
+            start = offset
+    chunks.append((start, size))
+    return chunks
+
+
+def _decompress_range(path: str, start: int, end: int) -> bytes:
+    """Decompress every bz2 stream in path[start:end]"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    output: list[bytes] = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        output.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError(
+                f"{path}: bz2 stream at offset {end - len(data)} ends past {end}, "
+                "a stream header was found inside compressed data. Read this file with workers=1"
+            )
+        data = decompressor.unused_data
+    return b"".join(output)
+
+
+def _iter_lines(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a sequence of data blocks into lines, keeping line breaks"""
+    remainder = b""
+    for block in blocks:
+        lines = (remainder + block).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if remainder:
+        yield remainder
+
+
+def _iter_file_blocks(file) -> Iterator[bytes]:
+    with file:
+        while block := file.read(READ_SIZE):
+            yield block
+
+
+def _iter_parallel_blocks(
+    path: str, chunks: list[tuple[int, int]], workers: int
+) -> Iterator[bytes]:
+    """Decompress chunks on several processes, returning them in order
+
+    Only a few chunks are in flight at any time, so memory usage does
+    not depend on the size of the file.  Processes are started with
+    POOL_CONTEXT, so the caller's state (e.g. loaded models) is not
+    copied to them."""
+    with POOL_CONTEXT.Pool(workers) as pool:
+        pending: collections.deque = collections.deque()
+        queued = collections.deque(chunks)
+        while queued or pending:
+            while queued and len(pending) < 2 * workers:
+                pending.append(pool.apply_async(_decompress_range, (path, *queued.popleft())))
+            yield pending.popleft().get()
+
+
+def _main_is_importable() -> bool:
+    """Check that new processes can import the caller's main script
+
+    This is not possible when the script was read from stdin, and the
+    processes would fail to start over and over again."""
+    main_path = getattr(sys.modules["__main__"], "__file__", None)
+    return main_path is None or os.path.isfile(main_path)
+
+
+def get_zstd_path(path: str) -> str:
+    """Get the path of the zstd copy of a .bz2 file"""
+    return path.removesuffix(".bz2") + ".zst"
+
+
+def _has_zstd_copy(path: str) -> bool:
+    zstd_path = get_zstd_path(path)
+    return (
+        zstandard is not None
+        and path.endswith(".bz2")
+        and os.path.isfile(zstd_path)
+        and os.stat(zstd_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+    )
+
+
+def open_lines(
+    path: str, workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Read the lines of a .bz2 (or .zst) file, in order
+
+    Lines are returned as bytes, including the line break, so they can
+    be given directly to json.loads() and similar functions.
+
+    workers is the amount of processes used to decompress the file, all
+    CPU cores by default.  Use workers=1 when calling from a process
+    that cannot have children (e.g. a multiprocessing.Pool worker)."""
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if _has_zstd_copy(path):
+        path = get_zstd_path(path)
+
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"zstandard is needed to read {path}")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return _iter_lines(_iter_file_blocks(reader))
+
+    if workers > 1:
+        chunks = split_chunks(find_stream_offsets(path), os.path.getsize(path), chunk_size)
+        if len(chunks) > 1 and _main_is_importable():
+            return _iter_lines(_iter_parallel_blocks(path, chunks, workers))
+        if indexed_bzip2 is not None:
+            file = indexed_bzip2.open(path, parallelization=workers)
+            return _iter_lines(_iter_file_blocks(file))
+        logging.warning(
+            f"indexed_bzip2 is not installed, decompressing {path} on a single core"
+        )
+
+    return _iter_lines(_iter_file_blocks(bz2.open(path, "rb")))
+
+
+def transcode_to_zstd(path: str, level: int = 3, workers: Optional[int] = None) -> str:
+    """Transcode a .bz2 file to zstd, next to the original file
+
+    The copy is written to a temporary file first, so an interrupted
+    transcode never leaves a partial copy behind.  Returns the path of
+    the copy."""
+    if zstandard is None:
+        raise ImportError("zstandard is needed to transcode files to zstd")
+    zstd_path = get_zstd_path(path)
+    partial_path = f"{zstd_path}.partial"
+    compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+    with open(partial_path, "wb") as output, compressor.stream_writer(output) as writer:
+        for line in open_lines(path, workers):
+            writer.write(line)
+    os.replace(partial_path, zstd_path)
+    return zstd_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Transcodes .bz2 dumps to zstd, so later reads with open_lines() are faster."
+    )
+    parser.add_argument("files", nargs="+", help=".bz2 files to transcode")
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=3,
+        help="zstd compression level (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="processes used to decompress each file (default: all CPU cores)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s: %(message)s", level=logging.INFO
+    )
+
+    for path in args.files:
+        if _has_zstd_copy(path):
+            logging.info(f"{path} already has an up to date zstd copy, skipping")
+            continue
+        logging.info(f"Transcoding {path} to {transcode_to_zstd(path, args.level, args.workers)}")
+
+
+if __name__ == "__main__":
+    main()
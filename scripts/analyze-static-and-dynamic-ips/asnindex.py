@@ -0,0 +1,230 @@
+# Needed for analysis
+import gzip
+import socket
+import numpy as np
+
+# Code quality
+from typing import TextIO
+
+# IPv4 addresses
+IPV4_BITS: int = 32
+IPV4_MASK: int = (1 << IPV4_BITS) - 1
+
+
+def parsePrefix(prefix: str) -> tuple[int, int]:
+    """
+    Parses an IPv4 BGP prefix (e.g. `1.2.3.0/24`). Host bits are cleared, as done by pyasn.
+
+    Parameters
+    ----------
+    `prefix`: BGP prefix, as `address/bits`
+
+    Returns
+    -------
+    A tuple in the following order:
+    `start`: first IP address of the prefix, as an integer
+    `bits`: prefix length
+    """
+
+    (address, bits) = prefix.split("/")
+    length: int = int(bits)
+
+    if length < 0 or length > IPV4_BITS:
+        raise ValueError(f"Invalid prefix length: {prefix}")
+
+    mask: int = (IPV4_MASK << (IPV4_BITS - length)) & IPV4_MASK
+
+    return (int.from_bytes(socket.inet_aton(address), "big") & mask, length)
+
+
+class AsnIndex:
+    """
+    Bulk IP to (AS number, BGP prefix) lookups, giving the same results as `pyasn.lookup` (longest prefix match).
+
+    Prefixes are flattened once into sorted, disjoint IP address intervals, each belonging to the most specific prefix
+    that covers it. A sorted array of IPs is then resolved with a single `np.searchsorted` call.
+
+    - Intervals: `starts`, `ends` (inclusive), `intervalPrefixes` (prefix ID of each interval)
+    - Prefixes: `asns` (AS number of each prefix), `prefixes` (prefix of each ID, as a string)
+    """
+
+    def __init__(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        intervalPrefixes: np.ndarray,
+        asns: list[int],
+        prefixes: list[str],
+    ):
+        self.starts: np.ndarray = starts
+        self.ends: np.ndarray = ends
+        self.intervalPrefixes: np.ndarray = intervalPrefixes
+
+        self.asns: list[int] = asns
+        self.prefixes: list[str] = prefixes
+
+    @classmethod
+    def fromFile(cls, filepath: str) -> "AsnIndex":
+        """
+        Builds the index from an IPASN data file (as generated by `pyasn_util_convert.py`), optionally gzipped.
+
+        IPv6 prefixes are ignored. If a prefix is found more than once, the last one is used.
+        """
+
+        if filepath.endswith(".gz"):
+            with gzip.open(filepath, "rt") as file:
+                return cls.fromLines(file)
+
+        with open(filepath, "r") as file:
+            return cls.fromLines(file)
+
+    @classmethod
+    def fromLines(cls, lines: TextIO | list[str]) -> "AsnIndex":
+        """
+        Builds the index from the lines of an IPASN data file: `address/bits<TAB>asn`, comments start with `;`.
+        """
+
+        # (start, bits) -> AS number
+        prefixAsns: dict[tuple[int, int], int] = dict()
+
+        for line in lines:
+            line = line.strip()
+
+            if not line or line.startswith(";"):
+                continue
+
+            (prefix, asn) = line.split("\t")[:2]
+
+            if ":" in prefix:
+                continue
+
+            prefixAsns[parsePrefix(prefix)] = int(asn)
+
+        # Less specific prefixes first, so a prefix always comes before the prefixes nested in it
+        sortedPrefixes: list[tuple[int, int]] = sorted(prefixAsns)
+
+        asns: list[int] = [prefixAsns[key] for key in sortedPrefixes]
+        prefixes: list[str] = [
+            f"{socket.inet_ntoa(start.to_bytes(4, 'big'))}/{bits}"
+            for (start, bits) in sortedPrefixes
+        ]
+
+        starts: list[int] = list()
+        ends: list[int] = list()
+        intervalPrefixes: list[int] = list()
+
+        def addInterval(start: int, end: int, prefixId: int) -> None:
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+                intervalPrefixes.append(prefixId)
+
+        # Prefixes enclosing the current position, innermost last, as (end, prefix ID)
+        stack: list[tuple[int, int]] = list()
+
+        # First IP not assigned to an interval yet
+        position: int = 0
+
+        for prefixId, (start, bits) in enumerate(sortedPrefixes):
+            # Close prefixes that end before this one starts
+            while stack and stack[-1][0] < start:
+                (end, enclosingId) = stack.pop()
+                addInterval(position, end, enclosingId)
+                position = end + 1
+
+            # The enclosing prefix owns every IP up to this prefix
+            if stack:
+                addInterval(position, start - 1, stack[-1][1])
+
+            stack.append((start + (1 << (IPV4_BITS - bits)) - 1, prefixId))
+            position = start
+
+        while stack:
+            (end, enclosingId) = stack.pop()
+            addInterval(position, end, enclosingId)
+            position = end + 1
+
+        return cls(
+            np.array(starts, dtype=np.uint32),
+            np.array(ends, dtype=np.uint32),
+            np.array(intervalPrefixes, dtype=np.int64),
+            asns,
+            prefixes,
+        )
+
+    def getSize(self) -> int:
+        return len(self.prefixes)
+
+    def lookupIntervals(self, ips: np.ndarray) -> np.ndarray:
+        """
+        Finds the interval of every IP address (as integers), -1 if an IP is not covered by any prefix.
+        """
+
+        intervals: np.ndarray = np.searchsorted(self.starts, ips, side="right") - 1
+
+        covered: np.ndarray = intervals >= 0
+        covered[covered] = ips[covered] <= self.ends[intervals[covered]]
+
+        intervals[~covered] = -1
+
+        return intervals
+
+    def lookup(self, ips: np.ndarray) -> np.ndarray:
+        """
+        Finds the prefix ID of every IP address (as integers), -1 if an IP is not covered by any prefix.
+        """
+
+        intervals: np.ndarray = self.lookupIntervals(ips)
+
+        prefixIds: np.ndarray = np.full(len(intervals), -1, dtype=np.int64)
+        prefixIds[intervals >= 0] = self.intervalPrefixes[intervals[intervals >= 0]]
+
+        return prefixIds
+
+    def groupSortedIps(self, ips: np.ndarray) -> dict[tuple[int, str], np.ndarray]:
+        """
+        Groups a sorted array of IP addresses (as integers) per (AS number, prefix).
+
+        Intervals are disjoint and sorted, so the IPs of each interval are a contiguous range of `ips`. A prefix is split
+        in several intervals only when more specific prefixes are nested in it.
+
+        Parameters
+        ----------
+        `ips`: sorted IP addresses
+
+        Returns
+        -------
+        `groups`: indices of `ips` (sorted), per (AS number, prefix). Groups are ordered by their first IP, IPs not
+        covered by any prefix are left out
+        """
+
+        groups: dict[tuple[int, str], np.ndarray] = dict()
+
+        if len(ips) == 0:
+            return groups
+
+        intervals: np.ndarray = self.lookupIntervals(ips)
+
+        # Start of every run of IPs in the same interval
+        runStarts: np.ndarray = np.flatnonzero(
+            np.concatenate(([True], intervals[1:] != intervals[:-1]))
+        )
+        runEnds: np.ndarray = np.append(runStarts[1:], len(intervals))
+
+        # Contiguous ranges of indices, per prefix ID
+        ranges: dict[int, list[tuple[int, int]]] = dict()
+
+        for lo, hi, interval in zip(
+            runStarts.tolist(), runEnds.tolist(), intervals[runStarts].tolist()
+        ):
+            if interval < 0:
+                continue
+
+            ranges.setdefault(int(self.intervalPrefixes[interval]), list()).append((lo, hi))
+
+        for prefixId, prefixRanges in ranges.items():
+            groups[(self.asns[prefixId], self.prefixes[prefixId])] = np.concatenate(
+                [np.arange(lo, hi, dtype=np.int64) for lo, hi in prefixRanges]
+            )
+
+        return groups
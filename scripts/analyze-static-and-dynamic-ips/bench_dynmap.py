@@ -0,0 +1,343 @@
+# Needed for analysis
+import os
+import json
+import shlex
+import importlib.util
+
+# Code quality
+import logging
+import argparse
+import pytest
+
+# Code consistency
+from typing import Any
+
+# DynMap stages
+import dynmap
+
+# Compact input data
+from ipdata import CACHE_DIRNAME, IpData, isCacheAvailable
+
+# Synthetic input data
+from synthetic import (
+    addGeneratorArguments,
+    generateDataset,
+    getGeneratorParameters,
+    validateArgs as validateGeneratorArgs,
+)
+
+# Amount of IP addresses of every benchmark dataset, by default
+BENCHMARK_SCALES: list[int] = [10000, 100000, 1000000]
+
+# Benchmark cases use the `benchmark` fixture of pytest-benchmark
+pytestmark = pytest.mark.skipif(
+    importlib.util.find_spec("pytest_benchmark") is None,
+    reason="pytest-benchmark is not installed",
+)
+
+
+def addBenchmarkArguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the parameters of the benchmark suite to a parser, shared by the suite and the benchmark script.
+    """
+
+    parser.add_argument(
+        "--scales",
+        type=int,
+        dest="scales",
+        metavar="IPS",
+        nargs="+",
+        action="store",
+        default=BENCHMARK_SCALES,
+        help="amount of IP addresses of every benchmark dataset (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-d",
+        "--data-folder",
+        type=str,
+        dest="dataFolder",
+        metavar="DATA_FOLDER",
+        action="store",
+        default="./benchmark_data",
+        help="folder where benchmark datasets are saved. Datasets are reused while their generator parameters are the same (default: %(default)s)",
+    )
+
+    # DynMap parameters, as in dynmap.py
+    parser.add_argument(
+        "-b",
+        "--min-block-size",
+        type=int,
+        dest="minBlockSize",
+        metavar="MIN_BLOCK_SIZE",
+        action="store",
+        default=8,
+        help="minimum block size (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-g",
+        "--max-gap-size",
+        type=int,
+        dest="maxGapSize",
+        metavar="MAX_GAP_SIZE",
+        action="store",
+        default=8,
+        help="maximum gap size (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-t",
+        "--entropy-smoothing-threshold",
+        type=float,
+        dest="entropySmoothingThreshold",
+        metavar="THRESHOLD",
+        action="store",
+        default=0.5,
+        help="entropy smoothing threshold (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--median-filter-window-size",
+        type=int,
+        dest="medianFilterWindowSize",
+        metavar="WINDOW_SIZE",
+        action="store",
+        default=5,
+        help="median filter window size (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-e",
+        "--entropy-engine",
+        type=str,
+        dest="entropyEngine",
+        metavar="ENGINE",
+        action="store",
+        choices=list(dynmap.USAGE_ENTROPY_ENGINES.keys()),
+        default="sparse",
+        help=f"engine used to compute IP usage entropies. Available options: {', '.join(dynmap.USAGE_ENTROPY_ENGINES.keys())} (default: %(default)s)",
+    )
+
+    # Synthetic data parameters, as in synthetic.py (the amount of IP addresses is given by --scales)
+    addGeneratorArguments(parser.add_argument_group("synthetic data"))
+
+
+def validateArgs(args: argparse.Namespace) -> None:
+    """
+    Validates the parameters of the benchmark suite.
+
+    Exits if any parameter is invalid.
+
+    Parameters
+    ----------
+    `args`: benchmark parameters
+    """
+
+    for ips in args.scales:
+        validateGeneratorArgs(getScaleArgs(args, ips))
+
+    dynmap.validateParameters(args)
+
+
+def parseBenchmarkArgs(argv: list[str]) -> argparse.Namespace:
+    """
+    Parses and validates the parameters of the benchmark suite, as given to `--dynmap-benchmark-args`.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="bench_dynmap.py",
+        description="Parameters of the DynMap benchmark suite.",
+    )
+    addBenchmarkArguments(parser)
+
+    args: argparse.Namespace = parser.parse_args(argv)
+    validateArgs(args)
+
+    return args
+
+
+def getBenchmarkArgs(config: pytest.Config) -> argparse.Namespace:
+    # Invalid parameters are logged as in the scripts, then pytest stops without running any case
+    try:
+        return parseBenchmarkArgs(shlex.split(config.getoption("dynmapBenchmarkArgs")))
+    except SystemExit:
+        raise pytest.UsageError("Invalid --dynmap-benchmark-args, see the errors above")
+
+
+def getDynmapArgs(args: argparse.Namespace, cacheFolder: str) -> argparse.Namespace:
+    """
+    Builds DynMap command line arguments for a benchmark dataset. Stages are run on a single process, so every stage
+    is timed on its own.
+    """
+
+    return dynmap.initParser().parse_args(
+        [
+            "--cache-folder",
+            cacheFolder,
+            "--min-block-size",
+            str(args.minBlockSize),
+            "--max-gap-size",
+            str(args.maxGapSize),
+            "--entropy-smoothing-threshold",
+            str(args.entropySmoothingThreshold),
+            "--median-filter-window-size",
+            str(args.medianFilterWindowSize),
+            "--entropy-engine",
+            args.entropyEngine,
+            "--workers",
+            "1",
+        ]
+    )
+
+
+def getScaleArgs(args: argparse.Namespace, ips: int) -> argparse.Namespace:
+    """
+    Gets the generator parameters of the benchmark dataset with `ips` IP addresses.
+    """
+
+    return argparse.Namespace(**{**vars(args), "ips": ips})
+
+
+def prepareDataset(args: argparse.Namespace, ips: int) -> str:
+    """
+    Gets the cache folder of the benchmark dataset with `ips` IP addresses, generating it if needed.
+
+    Parameters
+    ----------
+    `args`: benchmark parameters
+    `ips`: amount of IP addresses of the dataset
+
+    Returns
+    -------
+    `cacheFolder`: cache folder of the dataset
+    """
+
+    scaleArgs: argparse.Namespace = getScaleArgs(args, ips)
+    parameters: dict[str, Any] = getGeneratorParameters(scaleArgs)
+
+    cacheFolder: str = os.path.join(args.dataFolder, f"ips_{ips}_seed_{args.seed}")
+
+    # Datasets are deterministic, so a dataset generated with the same parameters is reused
+    if isCacheAvailable(cacheFolder):
+        metadata: dict[str, Any] = json.load(
+            open(os.path.join(cacheFolder, CACHE_DIRNAME, "metadata.json"))
+        )
+
+        if metadata.get("generator") == parameters:
+            logging.info(f"Reusing benchmark dataset at {cacheFolder}/")
+            return cacheFolder
+
+    logging.info(f"Generating benchmark dataset with {ips} IP addresses")
+
+    generateDataset(scaleArgs, cacheFolder)
+
+    return cacheFolder
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    # Every case runs once per scale, datasets are only generated (or loaded) once per scale
+    if "ips" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "ips",
+            getBenchmarkArgs(metafunc.config).scales,
+            ids=lambda ips: f"ips_{ips}",
+            scope="module",
+        )
+
+
+@pytest.fixture(scope="session")
+def benchmarkArgs(pytestconfig: pytest.Config) -> argparse.Namespace:
+    return getBenchmarkArgs(pytestconfig)
+
+
+@pytest.fixture(scope="module")
+def cacheFolder(benchmarkArgs: argparse.Namespace, ips: int) -> str:
+    return prepareDataset(benchmarkArgs, ips)
+
+
+@pytest.fixture(scope="module")
+def stageInputs(benchmarkArgs: argparse.Namespace, cacheFolder: str) -> dict[str, Any]:
+    """
+    Runs every stage once, so every case times a single stage on the results of the stages before it.
+    """
+
+    dynmapArgs: argparse.Namespace = getDynmapArgs(benchmarkArgs, cacheFolder)
+    data: IpData = IpData.fromCache(cacheFolder)
+
+    ipsPerAS = dynmap.findIpsPerAS(dynmapArgs, data)
+    blocks: list[dynmap.IP_Block] = dynmap.buildAllBlocks(dynmapArgs, data, ipsPerAS)
+    combinedEntropy = dynmap.calculateCombinedEntropies(dynmapArgs, data, blocks)
+
+    return {
+        "args": dynmapArgs,
+        "data": data,
+        "ipsPerAS": ipsPerAS,
+        "blocks": blocks,
+        "combinedEntropy": combinedEntropy,
+        "blockEntropies": dynmap.smoothAllBlocks(
+            dynmapArgs, data, blocks, combinedEntropy
+        ),
+    }
+
+
+def test_load_input(benchmark, cacheFolder: str) -> None:
+    data: IpData = benchmark(IpData.fromCache, cacheFolder)
+
+    benchmark.extra_info["ips"] = data.getSize()
+    benchmark.extra_info["observations"] = len(data.seriesTimestamps)
+    benchmark.extra_info["fingerprints"] = data.totalFingerprints
+
+
+def test_asn_lookup(benchmark, stageInputs: dict[str, Any]) -> None:
+    benchmark(dynmap.findIpsPerAS, stageInputs["args"], stageInputs["data"])
+
+
+def test_block_build(benchmark, stageInputs: dict[str, Any]) -> None:
+    benchmark(
+        dynmap.buildAllBlocks,
+        stageInputs["args"],
+        stageInputs["data"],
+        stageInputs["ipsPerAS"],
+    )
+
+
+def test_entropy(benchmark, stageInputs: dict[str, Any]) -> None:
+    # Block types are set again on every run, always to the same values
+    benchmark(
+        dynmap.calculateCombinedEntropies,
+        stageInputs["args"],
+        stageInputs["data"],
+        stageInputs["blocks"],
+    )
+
+
+def test_smoothing(benchmark, stageInputs: dict[str, Any]) -> None:
+    benchmark(
+        dynmap.smoothAllBlocks,
+        stageInputs["args"],
+        stageInputs["data"],
+        stageInputs["blocks"],
+        stageInputs["combinedEntropy"],
+    )
+
+
+def test_sub_blocks(benchmark, stageInputs: dict[str, Any]) -> None:
+    subBlocks: list[list[dynmap.IP_Block]] = benchmark(
+        dynmap.findAllSubBlocks,
+        stageInputs["args"],
+        stageInputs["data"],
+        stageInputs["blocks"],
+        stageInputs["blockEntropies"],
+    )
+
+    # Amount of IP addresses of each type found, to check that results are reproducible
+    (dynamicIps, proxyIps, clusterIps) = dynmap.collectTypedIps(
+        [subBlock for found in subBlocks for subBlock in found]
+    )
+
+    benchmark.extra_info["sub_blocks"] = sum(map(len, subBlocks))
+    benchmark.extra_info["dynamic_ips"] = dynmap.countRangeIps(dynamicIps)
+    benchmark.extra_info["proxy_ips"] = dynmap.countRangeIps(proxyIps)
+    benchmark.extra_info["cluster_ips"] = dynmap.countRangeIps(clusterIps)
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+
+# Needed for analysis
+import os
+import json
+import time
+import random
+import tempfile
+import importlib
+import platform
+import datetime as dt
+
+# Code quality
+import logging
+import argparse
+
+# Code consistency
+from typing import Any, Callable, Iterator
+
+# JSON decoding
+from jsondecoder import decodeBanners, getAvailableBackends, getBackend
+
+# Module data and extraction, the pre-processing script is not a valid module name
+preprocess = importlib.import_module("preprocess-shodan")
+
+# Share of synthetic banners without the fields of their module (e.g. no certificate), as found in Shodan scans
+MISSING_FIELDS_RATE: float = 0.03
+
+
+def initParser(modules: list[str]) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Banner extraction micro-benchmark. Times the per-banner cost of extracting fingerprints and domains for every supported Shodan module, fully offline."
+    )
+
+    parser.add_argument(
+        "-m",
+        "--modules",
+        type=str,
+        dest="modules",
+        metavar="MODULE",
+        nargs="+",
+        choices=modules,
+        default=modules,
+        help=f"modules to benchmark. Available options: {', '.join(modules)} (default: all)",
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        dest="inputFile",
+        metavar="FILE",
+        action="store",
+        default=None,
+        help="Shodan scan file (.json or .json.bz2) to take banners from. If not specified, synthetic banners are generated",
+    )
+
+    parser.add_argument(
+        "-n",
+        "--banners",
+        type=int,
+        dest="banners",
+        metavar="BANNERS",
+        action="store",
+        default=100000,
+        help="amount of banners per module (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        dest="repeat",
+        metavar="REPEAT",
+        action="store",
+        default=5,
+        help="amount of runs, the minimum time is reported (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--json-backend",
+        type=str,
+        dest="jsonBackend",
+        action="store",
+        choices=["auto", *getAvailableBackends().keys()],
+        default="auto",
+        help="JSON backend used to decode banners when timing the whole file extraction (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        dest="outputFile",
+        metavar="FILE",
+        action="store",
+        default=None,
+        help="file where the benchmark report is saved as JSON. If not specified, the report is only printed",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        dest="seed",
+        metavar="SEED",
+        action="store",
+        default=0,
+        help="random seed of the synthetic banners (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--logfile",
+        type=str,
+        dest="logfile",
+        metavar="LOGFILE",
+        action="store",
+        default=None,
+        help="file to store log outputs. If not specified, logs will be printed on screen",
+    )
+
+    parser.add_argument(
+        "-l",
+        "--loglevel",
+        type=str,
+        dest="loglevel",
+        metavar="LOGLEVEL",
+        action="store",
+        choices=["DEBUG", "INFO", "WARN", "ERROR", "FATAL"],
+        default="INFO",
+        help="log level. Available options: DEBUG, INFO, WARN, ERROR, FATAL (default: %(default)s)",
+    )
+
+    return parser
+
+
+def generateBanner(
+    rng: random.Random, moduleData: preprocess.ModuleData, index: int
+) -> dict[str, Any]:
+    """
+    Generates a synthetic Shodan banner of a module, with the fields usually found in real banners.
+    """
+
+    timestamp: dt.datetime = dt.datetime(2024, 3, 1) + dt.timedelta(
+        seconds=rng.randrange(86400), microseconds=rng.randrange(1000000)
+    )
+
+    banner: dict[str, Any] = {
+        "ip_str": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+        "port": 22 if moduleData.alias == "ssh" else 443,
+        "timestamp": timestamp.isoformat(),
+        "_shodan": {
+            "module": rng.choice(sorted(moduleData.moduleNames)),
+            "id": f"{rng.getrandbits(128):032x}",
+            "crawler": f"{rng.getrandbits(160):040x}",
+        },
+        "hostnames": [f"host{index}.example.com"],
+        "domains": [f"example{rng.randrange(1000)}.com"],
+        "data": "x" * rng.randrange(100, 400),
+    }
+
+    if rng.random() < MISSING_FIELDS_RATE:
+        return banner
+
+    # Fingerprint and domain fields of every supported module, other modules only get common fields
+    if moduleData.alias == "https":
+        banner["ssl"] = {
+            "cert": {
+                "fingerprint": {
+                    "sha256": f"{rng.getrandbits(256):064x}",
+                    "sha1": f"{rng.getrandbits(160):040x}",
+                },
+                "subject": {"CN": f"host{index}.example.com"},
+                "issuer": {"CN": "Example CA", "O": "Example"},
+                "serial": rng.getrandbits(64),
+            },
+            "versions": ["TLSv1.2", "TLSv1.3"],
+        }
+    elif moduleData.alias == "ssh":
+        banner["ssh"] = {
+            "fingerprint": ":".join(f"{rng.randrange(256):02x}" for _ in range(16)),
+            "type": "ssh-ed25519",
+            "key": f"{rng.getrandbits(256):064x}",
+        }
+
+    return banner
+
+
+def loadBanners(
+    args: argparse.Namespace, moduleData: preprocess.ModuleData
+) -> list[dict[str, Any]]:
+    """
+    Gets the benchmark banners of a module: the first `banners` banners of the module in the input file, or synthetic
+    banners if no input file is given.
+    """
+
+    if args.inputFile is None:
+        rng: random.Random = random.Random(args.seed)
+
+        return [generateBanner(rng, moduleData, i) for i in range(args.banners)]
+
+    banners: list[dict[str, Any]] = list()
+    scans: Iterator[dict[str, Any]] = decodeBanners(
+        args.inputFile, list(moduleData.moduleNames), args.jsonBackend
+    )
+
+    for scan in scans:
+        if scan.get("_shodan", {}).get("module") in moduleData.moduleNames:
+            banners.append(scan)
+
+            if len(banners) == args.banners:
+                break
+
+    return banners
+
+
+def extractByWalking(
+    moduleData: preprocess.ModuleData,
+) -> Callable[[dict[str, Any]], tuple[str, str] | None]:
+    """
+    Reference extractor that walks the field paths of a module for every banner, as done before extractors were
+    compiled. Only used as a baseline.
+    """
+
+    def getField(scan: dict[str, Any], field: list[str]) -> Any:
+        data = scan
+
+        for key in field:
+            data = data.get(key)
+
+            if data is None:
+                return None
+
+        return data
+
+    def extract(scan: dict[str, Any]) -> tuple[str, str] | None:
+        domain = getField(scan, moduleData.domainField)
+
+        if domain is not None and moduleData.domainExtractor is not None:
+            domain = moduleData.domainExtractor(domain)
+
+        fingerprint = getField(scan, moduleData.fingerprintField)
+
+        if domain is None or fingerprint is None:
+            return None
+
+        return (fingerprint, domain)
+
+    return extract
+
+
+def timeExtractor(
+    extractor: Callable[[dict[str, Any]], tuple[str, str] | None],
+    banners: list[dict[str, Any]],
+    repeat: int,
+) -> tuple[float, int]:
+    """
+    Times an extractor over every banner.
+
+    Returns
+    -------
+    A tuple in the following order:
+    `seconds`: minimum time of all runs
+    `extracted`: amount of banners with both fields available
+    """
+
+    times: list[float] = list()
+
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        extracted: int = sum(1 for banner in banners if extractor(banner) is not None)
+        times.append(time.perf_counter() - start)
+
+    return (min(times), extracted)
+
+
+def timeFileExtraction(
+    args: argparse.Namespace,
+    moduleData: preprocess.ModuleData,
+    banners: list[dict[str, Any]],
+) -> float:
+    """
+    Times the extraction of a whole file with the banners (see `extractDataFromFile`), including JSON decoding.
+
+    Returns
+    -------
+    `seconds`: minimum time of all runs
+    """
+
+    times: list[float] = list()
+
+    with tempfile.TemporaryDirectory() as folder:
+        filepath: str = os.path.join(folder, "banners.json")
+
+        with open(filepath, "w") as file:
+            json.dump(banners, file)
+
+        # Extraction logs every file it loads, its messages are left out of the timings
+        logging.disable(logging.INFO)
+
+        for _ in range(args.repeat):
+            start: float = time.perf_counter()
+            preprocess.extractDataFromFile(filepath, [moduleData], args.jsonBackend)
+            times.append(time.perf_counter() - start)
+
+        logging.disable(logging.NOTSET)
+
+    return min(times)
+
+
+def runModule(args: argparse.Namespace, moduleData: preprocess.ModuleData) -> dict[str, Any]:
+    """
+    Times every extraction path of a module.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `moduleData`: module
+
+    Returns
+    -------
+    `result`: amount of banners and per-banner cost of every extraction path, in nanoseconds
+    """
+
+    banners: list[dict[str, Any]] = loadBanners(args, moduleData)
+
+    if not banners:
+        logging.warning(f"No {moduleData.alias} banners found, skipping")
+        return {"module": moduleData.alias, "banners": 0}
+
+    logging.info(f"Timing {len(banners)} {moduleData.alias} banners")
+
+    (walkSeconds, walkExtracted) = timeExtractor(
+        extractByWalking(moduleData), banners, args.repeat
+    )
+    (compiledSeconds, compiledExtracted) = timeExtractor(
+        moduleData.extract, banners, args.repeat
+    )
+
+    # Both extractors must agree, otherwise timings are meaningless
+    if walkExtracted != compiledExtracted:
+        logging.error(
+            f"Extractors disagree on {moduleData.alias} banners: {walkExtracted} walked, {compiledExtracted} compiled"
+        )
+        exit(6)
+
+    fileSeconds: float = timeFileExtraction(args, moduleData, banners)
+
+    return {
+        "module": moduleData.alias,
+        "banners": len(banners),
+        "extracted": compiledExtracted,
+        "walk_ns_per_banner": walkSeconds / len(banners) * 1e9,
+        "compiled_ns_per_banner": compiledSeconds / len(banners) * 1e9,
+        "file_ns_per_banner": fileSeconds / len(banners) * 1e9,
+    }
+
+
+def printReport(results: list[dict[str, Any]]) -> None:
+    """
+    Prints the per-banner cost of every extraction path, one row per module.
+    """
+
+    print(
+        f"{'module':>8}{'banners':>10}{'walk ns':>12}{'compiled ns':>14}{'speedup':>10}{'file ns':>12}"
+    )
+
+    for result in results:
+        if result["banners"] == 0:
+            continue
+
+        print(
+            f"{result['module']:>8}{result['banners']:>10}"
+            f"{result['walk_ns_per_banner']:>12.0f}{result['compiled_ns_per_banner']:>14.0f}"
+            f"{result['walk_ns_per_banner'] / result['compiled_ns_per_banner']:>9.2f}x"
+            f"{result['file_ns_per_banner']:>12.0f}"
+        )
+
+
+# Start here
+if __name__ == "__main__":
+    # Init supported modules
+    supportedModules: dict[str, preprocess.ModuleData] = (
+        preprocess.initSupportedModules()
+    )
+
+    # Get args
+    parser = initParser(list(supportedModules.keys()))
+    args = parser.parse_args()
+
+    # Set up log
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s: %(message)s",
+        datefmt="%m/%d/%Y %I:%M:%S %p",
+        level=getattr(logging, args.loglevel),
+        filename=args.logfile,
+        encoding="utf-8",
+    )
+
+    if args.banners < 1 or args.repeat < 1:
+        logging.error(f"At least one banner and one run are needed")
+        exit(4)
+
+    if args.inputFile is not None and not os.path.isfile(args.inputFile):
+        logging.error(f"Input file '{args.inputFile}' not found")
+        exit(3)
+
+    results: list[dict[str, Any]] = [
+        runModule(args, supportedModules[alias]) for alias in dict.fromkeys(args.modules)
+    ]
+
+    if args.outputFile is not None:
+        with open(args.outputFile, "w") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "json_backend": getBackend(args.jsonBackend)[0],
+                    "input": args.inputFile or "synthetic",
+                    "modules": results,
+                },
+                file,
+                indent=4,
+            )
+
+        logging.info(f"Benchmark report has been written to {args.outputFile}")
+
+    printReport(results)
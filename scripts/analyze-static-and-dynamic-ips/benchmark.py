@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Needed for analysis
+import os
+import sys
+import shlex
+import importlib.util
+
+# Code quality
+import logging
+import argparse
+import pytest
+
+# Benchmark suite
+from bench_dynmap import addBenchmarkArguments, parseBenchmarkArgs
+
+# Path of the benchmark suite, next to this script
+SUITE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_dynmap.py")
+
+
+def addScriptArguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the arguments of this script that are not parameters of the benchmark suite.
+    """
+
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        dest="repeat",
+        metavar="REPEAT",
+        action="store",
+        default=3,
+        help="minimum amount of runs of every stage at every scale (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        dest="outputFile",
+        metavar="FILE",
+        action="store",
+        default="dynmap_benchmark.json",
+        help="file where the pytest-benchmark report is saved as JSON (default: %(default)s)",
+    )
+
+
+def initParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="DynMap benchmark. Runs the benchmark suite (bench_dynmap.py) with pytest-benchmark, timing every stage of DynMap on synthetic input data (see synthetic.py) at several scales, fully offline."
+    )
+
+    addScriptArguments(parser)
+    addBenchmarkArguments(parser)
+
+    return parser
+
+
+def getSuiteArgv(argv: list[str]) -> list[str]:
+    """
+    Gets the arguments given to the benchmark suite, every argument but the ones of this script.
+    """
+
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    addScriptArguments(parser)
+
+    return parser.parse_known_args(argv)[1]
+
+
+# Start here
+if __name__ == "__main__":
+    # Get args
+    parser = initParser()
+    args = parser.parse_args()
+
+    # Set up log
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s: %(message)s",
+        datefmt="%m/%d/%Y %I:%M:%S %p",
+        level=logging.INFO,
+    )
+
+    if importlib.util.find_spec("pytest_benchmark") is None:
+        logging.error(f"pytest-benchmark is needed to run the benchmark suite")
+        exit(3)
+
+    if args.repeat < 1:
+        logging.error(f"At least one run is needed")
+        exit(4)
+
+    suiteArgv: list[str] = getSuiteArgv(sys.argv[1:])
+
+    # Exits here if any parameter is invalid, instead of once per benchmark case
+    parseBenchmarkArgs(suiteArgv)
+
+    exit(
+        pytest.main(
+            [
+                SUITE_PATH,
+                "-q",
+                f"--dynmap-benchmark-args={shlex.join(suiteArgv)}",
+                f"--benchmark-min-rounds={args.repeat}",
+                "--benchmark-group-by=param:ips",
+                "--benchmark-sort=name",
+                f"--benchmark-json={args.outputFile}",
+            ]
+        )
+    )
@@ -0,0 +1,114 @@
+# Needed for analysis
+import os
+import hashlib
+import numpy as np
+
+# Code consistency
+from typing import Any
+
+# Checkpoints with another version are ignored
+CHECKPOINT_VERSION: int = 1
+
+# Files are hashed in chunks, so large columns are never loaded at once
+HASH_CHUNK_SIZE: int = 1 << 24
+
+
+def hashInputFiles(filepaths: list[str]) -> str:
+    """
+    Hashes the content of the input files of a run (e.g. the columnar cache and IPASN.dat), in the given order.
+
+    Parameters
+    ----------
+    `filepaths`: paths to the input files
+
+    Returns
+    -------
+    `inputHash`: BLAKE2b hash of every file, as a hex string
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    for filepath in filepaths:
+        digest.update(os.path.basename(filepath).encode("utf-8") + b"\0")
+
+        with open(filepath, "rb") as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """
+    Stage checkpoints of a DynMap run, saved as uncompressed NumPy archives (.npz) so a restarted run can skip the
+    stages it already completed.
+
+    Checkpoints are kept in a subfolder per input hash (see `hashInputFiles`), so changing the input data never reuses
+    old checkpoints. Every checkpoint is named after its stage and the parameters it depends on (e.g.
+    `blocks_b8_g8.npz`), so runs with other parameters reuse every stage that does not depend on them.
+
+    Checkpoints are written to a temporary file and then renamed, so a run killed while saving never leaves a partial
+    checkpoint behind.
+
+    A disabled store (the default) never loads nor saves anything.
+    """
+
+    def __init__(self, folder: str | None = None, inputHash: str | None = None):
+        self.folder: str | None = (
+            os.path.join(folder, inputHash) if folder is not None else None
+        )
+        self.enabled: bool = self.folder is not None
+
+    def getPath(self, stage: str, parameters: dict[str, Any]) -> str:
+        """
+        Gets the path to the checkpoint of a stage, e.g. `smoothing_b8_g8_t0.5_w5.npz`.
+        """
+
+        name: str = "_".join(
+            [stage, *(f"{key}{value}" for key, value in parameters.items())]
+        )
+
+        return os.path.join(self.folder, f"{name}.npz")
+
+    def load(
+        self, stage: str, parameters: dict[str, Any]
+    ) -> dict[str, np.ndarray] | None:
+        """
+        Loads the checkpoint of a stage, None if it is not available (or the store is disabled).
+        """
+
+        if not self.enabled:
+            return None
+
+        filepath: str = self.getPath(stage, parameters)
+
+        if not os.path.isfile(filepath):
+            return None
+
+        with np.load(filepath, allow_pickle=False) as archive:
+            arrays: dict[str, np.ndarray] = {key: archive[key] for key in archive.files}
+
+        if int(arrays.pop("version", -1)) != CHECKPOINT_VERSION:
+            return None
+
+        return arrays
+
+    def save(
+        self, stage: str, parameters: dict[str, Any], arrays: dict[str, np.ndarray]
+    ) -> None:
+        """
+        Saves the checkpoint of a stage. Does nothing if the store is disabled.
+        """
+
+        if not self.enabled:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        filepath: str = self.getPath(stage, parameters)
+        temporaryPath: str = f"{filepath}.{os.getpid()}.tmp"
+
+        with open(temporaryPath, "wb") as file:
+            np.savez(file, version=np.int64(CHECKPOINT_VERSION), **arrays)
+
+        os.replace(temporaryPath, filepath)
@@ -0,0 +1,11 @@
+def pytest_addoption(parser) -> None:
+    # Parameters of the DynMap benchmark suite (see bench_dynmap.py and benchmark.py)
+    parser.addoption(
+        "--dynmap-benchmark-args",
+        type=str,
+        dest="dynmapBenchmarkArgs",
+        metavar="ARGS",
+        action="store",
+        default="",
+        help='parameters of the DynMap benchmark suite, e.g. "--scales 10000 -e sets" (see bench_dynmap.py)',
+    )
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 
 # Needed for analysis
+import csv
 import math
-import statistics
 import pathlib
-import pyasn
-import ipaddress
+import numpy as np
+import scipy.sparse
 import datetime as dt
 import subprocess
-from collections import defaultdict
+import multiprocessing
+from itertools import product
+from collections import defaultdict, deque
 
 # Code quality
 import pickle
@@ -16,13 +18,42 @@ import logging
 import argparse
 
 # Code consistency
-from typing import Any
-
-# IP address time series
-IpTimeSeries = list[tuple[dt.datetime, str, int, str]]
-"""
-List of time series entries, each as a tuple (timestamp, fingerprint, port, domain)
-"""
+from typing import Any, Callable
+
+# Compact input data
+from ipdata import (
+    CACHE_DIRNAME,
+    IpData,
+    IpTimeSeries,
+    gatherSlices,
+    getCacheColumns,
+    ipToStr,
+    isCacheAvailable,
+    loadMetadata,
+    rangesToCidrs,
+)
+
+# Bulk AS number lookups
+from asnindex import AsnIndex
+
+# Structured trace
+from tracesink import TraceSink
+
+# Stage timings
+from profiler import StageProfiler
+
+# Stage checkpoints
+from checkpoints import CheckpointStore, hashInputFiles
+
+# Range output
+from ipranges import (
+    RANGE_FORMATS,
+    RANGE_TYPES,
+    SWEEP_COLUMNS,
+    buildRangeRow,
+    getAvailableFormats,
+    saveRanges,
+)
 
 
 class IP_Block:
@@ -33,38 +64,83 @@ class IP_Block:
     Present IPs are called "true" IPs.
 
     A block also has a type, which is used to classify the block as dynamic, static, proxy, cluster, etc.
+
+    IP addresses are kept as integers (true IPs as a sorted uint32 array), strings are only built when printed.
     """
 
-    def __init__(self):
-        self.type: str = ""
-        self.start: int = 0
-        self.end: int = 0
-        self.startStr: str = ""
-        self.endStr: str = ""
+    __slots__ = (
+        "type",
+        "start",
+        "end",
+        "trueIps",
+        "asn",
+        "prefix",
+        "entropyStats",
+    )
+
+    def __init__(
+        self,
+        start: int = 0,
+        end: int = 0,
+        trueIps: np.ndarray | None = None,
+        type: str = "",
+        asn: int | None = None,
+        prefix: str | None = None,
+    ):
+        self.type: str = type
+        self.start: int = start
+        self.end: int = end
+
+        self.trueIps: np.ndarray = (
+            np.zeros(0, dtype=np.uint32) if trueIps is None else trueIps
+        )
+
+        # AS number and BGP prefix the block was built from
+        self.asn: int | None = asn
+        self.prefix: str | None = prefix
 
-        self.trueIps: list[str] = list()
+        # Smoothed entropy of the IPs in the block (min, mean, max), only known for sub blocks
+        self.entropyStats: tuple[float, float, float] | None = None
+
+    @property
+    def startStr(self) -> str:
+        return ipToStr(self.start)
+
+    @property
+    def endStr(self) -> str:
+        return ipToStr(self.end)
 
     def setType(self, type: str):
         self.type = type
 
     def setStart(self, ip: int):
         self.start = ip
-        self.startStr = str(ipaddress.IPv4Address(ip))
 
     def setEnd(self, ip: int):
         self.end = ip
-        self.endStr = str(ipaddress.IPv4Address(ip))
 
-    def addTrueIp(self, ip: int):
-        self.trueIps.append(str(ipaddress.IPv4Address(ip)))
+    def setTrueIps(self, ips: np.ndarray):
+        self.trueIps = ips
+
+    def setOrigin(self, asn: int, prefix: str):
+        self.asn = asn
+        self.prefix = prefix
+
+    def setEntropyStats(self, entropy: np.ndarray):
+        self.entropyStats = (
+            float(entropy.min()),
+            float(entropy.mean()),
+            float(entropy.max()),
+        )
 
-    def getTrueIps(self) -> list[str]:
+    def getTrueIps(self) -> np.ndarray:
         return self.trueIps
 
-    def getFullIps(self) -> list[str]:
-        return [
-            str(ipaddress.IPv4Address(ip)) for ip in range(self.start, self.end + 1)
-        ]
+    def getFullIps(self) -> range:
+        return range(self.start, self.end + 1)
+
+    def getCidrs(self) -> list[str]:
+        return rangesToCidrs([(self.start, self.end)])
 
     def getSize(self):
         return self.end - self.start + 1
@@ -88,6 +164,18 @@ def initParser() -> argparse.ArgumentParser:
         help="folder to search for previously cached input data. If cached input data is not available, you will need to preprocess your data source first. (default: %(default)s)",
     )
 
+    parser.add_argument(
+        "-m",
+        "--modules",
+        type=str,
+        dest="modules",
+        metavar="MODULE",
+        nargs="+",
+        action="store",
+        default=None,
+        help="modules whose input data is analyzed, as saved by a multi-module pre-processing run (e.g. cache/https and cache/ssh). Several modules are analyzed together, as a single dataset (default: input data saved directly in the cache folder)",
+    )
+
     parser.add_argument(
         "-b",
         "--min-block-size",
@@ -130,13 +218,165 @@ def initParser() -> argparse.ArgumentParser:
         help="median filter window size. This controls the amount of neighbors used when smoothing IP addresses. Setting this to 1 will disable the median filter (default: %(default)s)",
     )
 
+    parser.add_argument(
+        "-e",
+        "--entropy-engine",
+        type=str,
+        dest="entropyEngine",
+        metavar="ENGINE",
+        action="store",
+        choices=USAGE_ENTROPY_ENGINES.keys(),
+        default="sets",
+        help=f"engine used to compute IP usage entropies. 'sparse' computes all pairwise fingerprint intersections of a block with a single sparse matrix product and is much faster on large blocks. Available options: {', '.join(USAGE_ENTROPY_ENGINES.keys())} (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--sweep-block-sizes",
+        type=int,
+        nargs="+",
+        dest="sweepBlockSizes",
+        metavar="SIZE",
+        action="store",
+        default=None,
+        help="run a parameter sweep over these minimum IP block sizes (default: only the value of --min-block-size)",
+    )
+
+    parser.add_argument(
+        "--sweep-gap-sizes",
+        type=int,
+        nargs="+",
+        dest="sweepGapSizes",
+        metavar="SIZE",
+        action="store",
+        default=None,
+        help="run a parameter sweep over these maximum gap sizes (default: only the value of --max-gap-size)",
+    )
+
+    parser.add_argument(
+        "--sweep-thresholds",
+        type=float,
+        nargs="+",
+        dest="sweepThresholds",
+        metavar="THRESHOLD",
+        action="store",
+        default=None,
+        help="run a parameter sweep over these entropy smoothing thresholds (default: only the value of --entropy-smoothing-threshold)",
+    )
+
+    parser.add_argument(
+        "--sweep-window-sizes",
+        type=int,
+        nargs="+",
+        dest="sweepWindowSizes",
+        metavar="WINDOWSIZE",
+        action="store",
+        default=None,
+        help="run a parameter sweep over these median filter window sizes (default: only the value of --median-filter-window-size)",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        dest="workers",
+        action="store",
+        default=max(1, multiprocessing.cpu_count() - 2),
+        help="amount of worker processes. Blocks (or parameter combinations, in a parameter sweep) are processed in parallel, results do not depend on the amount of workers (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        dest="traceFile",
+        metavar="FILE",
+        action="store",
+        default=None,
+        help="if given, diagnostics of every traced block, sub block and IP are written to this file as gzipped JSON Lines, e.g. dynmap_trace.jsonl.gz. Not used in parameter sweeps (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--trace-asns",
+        type=int,
+        dest="traceAsns",
+        metavar="ASN",
+        nargs="+",
+        default=None,
+        help="only trace blocks of these AS numbers (default: every AS)",
+    )
+
+    parser.add_argument(
+        "--trace-prefixes",
+        type=str,
+        dest="tracePrefixes",
+        metavar="PREFIX",
+        nargs="+",
+        default=None,
+        help="only trace blocks of these BGP prefixes, e.g. 1.2.0.0/16 (default: every prefix)",
+    )
+
+    parser.add_argument(
+        "--trace-sample-rate",
+        type=float,
+        dest="traceSampleRate",
+        metavar="RATE",
+        action="store",
+        default=1.0,
+        help="fraction of the blocks to trace, sampled by their first IP address, so the same blocks are traced on every run (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--trace-time-series",
+        dest="shouldTraceTimeSeries",
+        action="store_true",
+        default=False,
+        help="if enabled, the time series of every traced IP is also written to the trace file (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        dest="profileFile",
+        metavar="FILE",
+        nargs="?",
+        const="dynmap_profile.json",
+        default=None,
+        help="if enabled, the wall time, CPU time, peak memory and item counts of every stage are written to a JSON report (default file: %(const)s)",
+    )
+
+    parser.add_argument(
+        "--checkpoints",
+        dest="shouldCheckpoint",
+        action="store_true",
+        default=False,
+        help="if enabled, blocks, combined entropies and smoothed entropies are saved to the checkpoints/ subfolder of the cache folder, and a restarted run skips the stages already saved for the same input data and parameters (default: %(default)s)",
+    )
+
     parser.add_argument(
         "-s",
         "--save-ips",
         dest="shouldSaveIps",
         action="store_true",
         default=False,
-        help="if enabled, will save dynamic IP addresses found as a .pickle file (default: %(default)s)",
+        help="if enabled, will save dynamic IP addresses found, in the format given by --output-format (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--save-cidrs",
+        dest="shouldSaveCidrs",
+        action="store_true",
+        default=False,
+        help="if enabled, IP addresses found are saved as CIDR blocks instead of individual addresses. Used with --save-ips (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output-format",
+        type=str,
+        dest="outputFormat",
+        metavar="FORMAT",
+        action="store",
+        default="pickle",
+        choices=["pickle", *RANGE_FORMATS],
+        help="format of the output saved with --save-ips. jsonl and parquet save one row per IP range found, with its CIDR blocks, AS number, prefix, type and entropy. Options: %(choices)s (default: %(default)s)",
     )
 
     parser.add_argument(
@@ -164,55 +404,343 @@ def initParser() -> argparse.ArgumentParser:
     return parser
 
 
-def calculateDomainNameEntropy(timeSeries: IpTimeSeries) -> float:
+def calculateDomainNameEntropies(data: IpData, blockIdx: np.ndarray) -> np.ndarray:
     """
-    Calculates the "entropy" of domain names in a time series.
+    Calculates the "entropy" of domain names in the time series of several IP addresses.
 
     The entropy is calculated as the ratio of unique domain names and unique fingerprints.
     The ratio is calculated on a port by port basis, and the smallest ratio is returned.
 
+    Unique domains and fingerprints per port are precomputed for every IP (see `ipdata.summarizeIps`), so time series
+    are never visited.
+
     Parameters
     ----------
-    `timeSeries`: a time series for a given IP address.
+    `data`: input data.
+    `blockIdx`: indices of the IP addresses in the input data.
 
     Returns
     -------
-    `ratio`: the smallest domain to fingerprint ratio found in the time series as described above.
+    `ratios`: the smallest domain to fingerprint ratio found in the time series of each IP as described above.
     """
 
+    (portOffsets, fingerprintCounts) = gatherSlices(
+        data.portOffsets, data.portFingerprintCounts, blockIdx
+    )
+    (_, domainCounts) = gatherSlices(data.portOffsets, data.portDomainCounts, blockIdx)
+
     # Using float(inf) leads to some issues, so we are using this instead
-    smallestRatio: float = 3.0
+    ratios: np.ndarray = np.full(len(fingerprintCounts), 3.0)
 
-    # Default dict magic
-    uniqueDomainsAndFingerprints: dict[int, tuple[set[str], set[tuple]]] = defaultdict(
-        lambda: (set(), set())
+    # Discard ports with just one domain, since there are no changes (this port has static behavior)
+    hasChanges: np.ndarray = domainCounts != 1
+
+    # Clamp (should not happen, but just in case)
+    ratios[hasChanges] = np.minimum(
+        domainCounts[hasChanges] / fingerprintCounts[hasChanges], 1.0
     )
 
-    for _, fingerprint, port, domain in timeSeries:
-        uniqueDomainsAndFingerprints[port][0].add(fingerprint)
-        uniqueDomainsAndFingerprints[port][1].add(domain)
+    # Smallest ratio of every IP, every IP has at least one port
+    smallestRatios: np.ndarray = np.full(len(blockIdx), 3.0)
 
-    for fingerprints, domains in uniqueDomainsAndFingerprints.values():
-        # Discard ports with just one domain, since there are no changes (this port has static behavior)
-        if len(domains) == 1:
-            continue
+    if len(ratios) > 0:
+        smallestRatios = np.minimum.reduceat(ratios, portOffsets[:-1])
+
+    # If the smallest ratio was not updated, it will be 3.0, so return 0.0
+    return np.where(smallestRatios < 2.0, smallestRatios, 0.0)
+
+
+def calculateUsageEntropiesSets(
+    data: IpData, blockIdx: np.ndarray, blockSize: int
+) -> tuple[list[float], list[float]]:
+    """
+    Calculates the IP usage entropies of every true IP in a block using set intersections.
+
+    Every IP is compared with every other IP in the block, so this is O(n^2) set operations per block.
+
+    Adapted from: 'How Dynamic are IP Addresses?' (https://dl.acm.org/doi/abs/10.1145/1282380.1282415) Section 4.3
+
+    Parameters
+    ----------
+    `data`: input data.
+    `blockIdx`: indices of the true IP addresses of the block in the input data.
+    `blockSize`: the size of the block (including IPs that are not true IPs).
+
+    Returns
+    -------
+    A tuple in the following order, both aligned with `blockIdx`:
+    `nue`: normalized IP usage entropy of each IP.
+    `nsue`: normalized sample IP usage entropy of each IP.
+    """
+
+    nueValues: list[float] = list()
+    nsueValues: list[float] = list()
+
+    fingerprintSets: list[set[int]] = [
+        set(data.getIpFingerprints(idx).tolist()) for idx in blockIdx.tolist()
+    ]
+
+    # We want to know the probability of fingerprints from an IPj from block A
+    # to appear in other IPs from the same block
+    for j, fingerprints in enumerate(fingerprintSets):
+        entropy: float = 0.0
+
+        # We don't build the matrix Aj directly, instead we precalculate the sum of every column
+        # Please refer to the section 4.3 of the paper mentioned above
+        Aj: list[int] = [
+            len(otherFingerprints.intersection(fingerprints))
+            for k, otherFingerprints in enumerate(fingerprintSets)
+            if k != j
+        ]
+        zj: int = sum(Aj)
+
+        # Terms are accumulated one by one from left to right, as done by the sparse engine
+        for ak in Aj:
+            if ak > 0:
+                entropy -= (ak / zj) * math.log2((ak / zj))
+
+        # Normalized IP Usage Entropy and Normalized Sample IP Usage Entropy
+        nueValues.append(entropy / math.log2(blockSize))
+        nsueValues.append(
+            entropy / math.log2(sum(ak > 0 for ak in Aj) + 1 + int(zj == 0))
+        )
+
+    return (nueValues, nsueValues)
+
+
+# Largest amount of pairwise intersections computed at once by the sparse engine, so blocks where many IPs share
+# a fingerprint (e.g. a vendor default certificate across a provider pool) never build the whole product
+ENTROPY_BATCH_ENTRIES: int = 1 << 20
+
+
+def calculateUsageEntropiesSparse(
+    data: IpData,
+    blockIdx: np.ndarray,
+    blockSize: int,
+    batchEntries: int = ENTROPY_BATCH_ENTRIES,
+) -> tuple[list[float], list[float]]:
+    """
+    Calculates the IP usage entropies of every true IP in a block using sparse matrix operations.
+
+    Fingerprints are encoded as a sparse IP x fingerprint incidence matrix M, so every pairwise
+    intersection size |F(i) ∩ F(j)| is an entry of M @ M.T. The product is computed in batches of
+    rows with at most about `batchEntries` entries, and every batch is reduced to entropies before
+    the next one, so memory use does not grow with the square of the block size.
+
+    Results are identical to `calculateUsageEntropiesSets`: in both engines terms are accumulated
+    one by one from left to right in the same order (never with a compensated sum such as `math.fsum`
+    or `sum()` from Python 3.12 on) and logarithms are taken with `math.log2`.
+
+    Parameters
+    ----------
+    `data`: input data.
+    `blockIdx`: indices of the true IP addresses of the block in the input data.
+    `blockSize`: the size of the block (including IPs that are not true IPs).
+    `batchEntries`: largest amount of pairwise intersections computed at once.
+
+    Returns
+    -------
+    A tuple in the following order, both aligned with `blockIdx`:
+    `nue`: normalized IP usage entropy of each IP.
+    `nsue`: normalized sample IP usage entropy of each IP.
+    """
+
+    totalIps: int = len(blockIdx)
+
+    # The unique fingerprints per IP are already stored in CSR form, so the incidence matrix is just a gather
+    (offsets, fingerprintIds) = gatherSlices(
+        data.fingerprintOffsets, data.fingerprintIds, blockIdx
+    )
+
+    # Columns are renumbered to the fingerprints of the block, which keeps their order
+    (blockFingerprints, columns) = np.unique(fingerprintIds, return_inverse=True)
+
+    incidence = scipy.sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.int64), columns.reshape(-1), offsets),
+        shape=(totalIps, len(blockFingerprints)),
+    )
+    transposed = incidence.T.tocsr()
+
+    # Row j of the product has at most as many entries as IPs sharing each fingerprint of IPj, summed
+    fingerprintIps: np.ndarray = np.bincount(
+        columns.reshape(-1), minlength=len(blockFingerprints)
+    )
+    rowEntries: np.ndarray = np.add.reduceat(
+        np.append(fingerprintIps[columns.reshape(-1)], 0), offsets[:-1]
+    ) * (np.diff(offsets) > 0)
+
+    # Batches of consecutive rows, every batch has at least one row
+    batchBounds: list[int] = [0]
+    batchSize: int = 0
+
+    for row, entries in enumerate(rowEntries.tolist()):
+        if batchSize > 0 and batchSize + entries > batchEntries:
+            batchBounds.append(row)
+            batchSize = 0
+
+        batchSize += entries
+
+    batchBounds.append(totalIps)
+
+    entropy: np.ndarray = np.zeros(totalIps, dtype=np.float64)
+    nonZeroAk: np.ndarray = np.zeros(totalIps, dtype=np.int64)
+    zj: np.ndarray = np.zeros(totalIps, dtype=np.int64)
+
+    for firstRow, lastRow in zip(batchBounds[:-1], batchBounds[1:]):
+        batchIps: int = lastRow - firstRow
+
+        # Entry (j, k) is the amount of fingerprints shared by IPj and IPk
+        intersections = (incidence[firstRow:lastRow] @ transposed).tocsr()
+        intersections.eliminate_zeros()
+        intersections.sort_indices()
+
+        # Drop the diagonal (an IP is never compared to itself), what is left are the non zero ak of every Aj
+        rowOfEntry: np.ndarray = np.repeat(
+            np.arange(batchIps), np.diff(intersections.indptr)
+        )
+        offDiagonal: np.ndarray = intersections.indices != rowOfEntry + firstRow
+
+        ak: np.ndarray = intersections.data[offDiagonal]
+        akRow: np.ndarray = rowOfEntry[offDiagonal]
+
+        batchNonZeroAk: np.ndarray = np.bincount(akRow, minlength=batchIps)
+        rowOffsets: np.ndarray = np.concatenate(([0], np.cumsum(batchNonZeroAk)))
+
+        batchZj: np.ndarray = np.zeros(batchIps, dtype=np.int64)
+        np.add.at(batchZj, akRow, ak)
+
+        # Same terms as (ak / zj) * log2(ak / zj), numpy's log2 may differ from math.log2 in the last bit
+        # so logarithms are taken with math.log2 over the (few) distinct probabilities
+        probabilities: np.ndarray = ak / batchZj[akRow]
+        uniqueProbabilities, inverse = np.unique(probabilities, return_inverse=True)
+        logs: np.ndarray = np.array(
+            [math.log2(p) for p in uniqueProbabilities.tolist()], dtype=np.float64
+        )
+        terms: np.ndarray = probabilities * logs[inverse.reshape(-1)]
+
+        # Summation must be sequential (cumsum) to match the order used by the sets engine
+        for row in np.flatnonzero(batchNonZeroAk).tolist():
+            entropy[firstRow + row] = -np.cumsum(
+                terms[rowOffsets[row] : rowOffsets[row + 1]]
+            )[-1]
+
+        nonZeroAk[firstRow:lastRow] = batchNonZeroAk
+        zj[firstRow:lastRow] = batchZj
+
+    # Normalized IP Usage Entropy and Normalized Sample IP Usage Entropy
+    nueValues: np.ndarray = entropy / math.log2(blockSize)
+    nsueValues: np.ndarray = entropy / np.array(
+        [
+            math.log2(count + 1 + int(z == 0))
+            for count, z in zip(nonZeroAk.tolist(), zj.tolist())
+        ],
+        dtype=np.float64,
+    )
+
+    return (nueValues.tolist(), nsueValues.tolist())
+
+
+# Available engines for IP usage entropy computation
+USAGE_ENTROPY_ENGINES: dict[str, Callable[..., tuple[list[float], list[float]]]] = {
+    "sets": calculateUsageEntropiesSets,
+    "sparse": calculateUsageEntropiesSparse,
+}
+
+
+def findBlockBounds(
+    ips: np.ndarray,
+    fingerprintCounts: np.ndarray,
+    groupStarts: np.ndarray,
+    minBlockSize: int,
+    maxGapSize: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the IP blocks of several groups of contiguous IP addresses (e.g. one group per AS) at once.
+
+    Same rules as `buildBlocksSequential`: a block starts at the first IP of its group or at the first IP after a
+    significant gap, IPs with only one fingerprint are gaps (except the first IP of a group), and blocks never span
+    groups.
+
+    Parameters
+    ----------
+    `ips`: IP addresses as integers, sorted within each group
+    `fingerprintCounts`: the amount of unique fingerprints of each IP address in `ips`
+    `groupStarts`: index of the first IP of each group in `ips`, sorted (must include 0 if `ips` is not empty)
+    `minBlockSize`: minimum block size
+    `maxGapSize`: maximum gap size
+
+    Returns
+    -------
+    A tuple in the following order:
+    `trueIdx`: indices (in `ips`) of every IP that is not a gap, in order
+    `blockFirst`: index (in `trueIdx`) of the first IP of each block
+    `blockLast`: index (in `trueIdx`) of the last IP of each block
+    """
+
+    # The first IP of a group always starts a block, even if it has only one fingerprint
+    isTrueIp: np.ndarray = fingerprintCounts > 1
+    isTrueIp[groupStarts] = True
+
+    trueIdx: np.ndarray = np.flatnonzero(isTrueIp)
+    trueIps: np.ndarray = ips[trueIdx].astype(np.int64)
 
-        ratio: float = len(domains) / len(fingerprints)
+    # A significant gap between two consecutive true IPs ends a block
+    startsBlock: np.ndarray = np.ones(len(trueIdx), dtype=bool)
+    startsBlock[1:] = trueIps[1:] - trueIps[:-1] + 1 > maxGapSize
+    startsBlock[np.searchsorted(trueIdx, groupStarts)] = True
 
-        # Clamp (should not happen, but just in case)
-        if ratio > 1.0:
-            ratio = 1.0
+    blockFirst: np.ndarray = np.flatnonzero(startsBlock)
+    blockLast: np.ndarray = (
+        np.append(blockFirst[1:], len(trueIdx))[: len(blockFirst)] - 1
+    )
 
-        smallestRatio = min(smallestRatio, ratio)
+    isValid: np.ndarray = trueIps[blockLast] - trueIps[blockFirst] + 1 >= minBlockSize
 
-    # If smallestRatio was not updated, it will be 3.0, so return 0.0
-    return smallestRatio if smallestRatio < 2.0 else 0.0
+    return (trueIdx, blockFirst[isValid], blockLast[isValid])
 
 
 def buildBlocks(
+    args: argparse.Namespace,
+    contiguousIps: np.ndarray,
+    fingerprintCounts: np.ndarray,
+) -> list[IP_Block]:
+    """
+    Build IP blocks (non-overlapping) from a sorted array of contiguous IP addresses.
+
+    Gaps and block boundaries are found with array operations (see `findBlockBounds`), the result is identical to
+    `buildBlocksSequential`.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `contiguousIps`: a sorted array of contiguous IP addresses as integers.
+    `fingerprintCounts`: the amount of unique fingerprints of each IP address in `contiguousIps`.
+
+    Returns
+    -------
+    `IP_Blocks`: a list of IP blocks found in the array of contiguous IP addresses.
+    """
+
+    (trueIdx, blockFirst, blockLast) = findBlockBounds(
+        contiguousIps,
+        fingerprintCounts,
+        np.zeros(min(len(contiguousIps), 1), dtype=np.int64),
+        args.minBlockSize,
+        args.maxGapSize,
+    )
+
+    trueIps: np.ndarray = contiguousIps[trueIdx]
+
+    return [
+        IP_Block(int(trueIps[first]), int(trueIps[last]), trueIps[first : last + 1])
+        for first, last in zip(blockFirst.tolist(), blockLast.tolist())
+    ]
+
+
+def buildBlocksSequential(
     args: argparse.Namespace,
     contiguousIps: list[int],
-    fingerprintsPerIp: dict[str, set[str]],
+    fingerprintCounts: list[int],
 ) -> list[IP_Block]:
     """
     Build IP blocks (non-overlapping) from a list of contiguous IP addresses.
@@ -227,11 +755,14 @@ def buildBlocks(
 
     Adapted from: 'How Dynamic are IP Addresses?' (https://dl.acm.org/doi/abs/10.1145/1282380.1282415) Section 4.2
 
+    Reference implementation, scanning IPs one at a time. DynMap uses `buildBlocks`, which gives identical results
+    (see `test_blocks.py`).
+
     Parameters
     ----------
     `args`: command line arguments
-    `contiguousIps`: a list of contiguous IP addresses as integers.
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address.
+    `contiguousIps`: a sorted list of contiguous IP addresses as integers.
+    `fingerprintCounts`: the amount of unique fingerprints of each IP address in `contiguousIps`.
 
     Returns
     -------
@@ -244,13 +775,11 @@ def buildBlocks(
 
     # Scan list sequentially, trying to build the biggest possible blocks
     while currentIdx < len(contiguousIps):
-        block: IP_Block = IP_Block()
+        startIp: int = contiguousIps[currentIdx]
+        lastIp: int = startIp
 
-        lastIp: int = contiguousIps[currentIdx]
-
-        block.setStart(lastIp)
-        block.setEnd(lastIp)
-        block.addTrueIp(lastIp)
+        # True IPs are only stored if the block is kept
+        trueIps: list[int] = [startIp]
 
         currentIdx += 1
 
@@ -268,9 +797,7 @@ def buildBlocks(
         while currentIdx < len(contiguousIps):
             currentIp: int = contiguousIps[currentIdx]
 
-            hasJustOneFingerprint: bool = (
-                len(fingerprintsPerIp[str(ipaddress.IPv4Address(currentIp))]) <= 1
-            )
+            hasJustOneFingerprint: bool = fingerprintCounts[currentIdx] <= 1
 
             if hasJustOneFingerprint:
                 # Skip this IP, since it is considered a gap
@@ -284,16 +811,17 @@ def buildBlocks(
                 break
 
             # Gap is tolerable, so add IP to the block and get next IP
-            block.addTrueIp(currentIp)
-            block.setEnd(currentIp)
+            trueIps.append(currentIp)
 
             lastIp = currentIp
             currentIdx += 1
 
         # We can finish this block or discard it
         # Either way, we advance to start a new block
-        if block.getSize() >= args.minBlockSize:
-            blocksFound.append(block)
+        if lastIp - startIp + 1 >= args.minBlockSize:
+            blocksFound.append(
+                IP_Block(startIp, lastIp, np.array(trueIps, dtype=np.uint32))
+            )
 
     return blocksFound
 
@@ -301,8 +829,8 @@ def buildBlocks(
 def findSubBlocks(
     args: argparse.Namespace,
     block: IP_Block,
-    entropy: dict[str, float],
-    fingerprintsPerIp: dict[str, set[str]],
+    entropy: np.ndarray,
+    data: IpData,
 ) -> list[IP_Block]:
     """
     Finds sub blocks (non-overlapping) within a given IP block.
@@ -314,8 +842,8 @@ def findSubBlocks(
     ----------
     `args`: command line arguments
     `block`: the IP block to analyze.
-    `entropy`: a dict of normalized sample IP usage entropy values per IP address.
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address.
+    `entropy`: normalized sample IP usage entropy of every IP address in the block (dense, indexed by offset in the block).
+    `data`: input data.
 
     Returns
     -------
@@ -324,391 +852,1655 @@ def findSubBlocks(
 
     subBlocksFound: list[IP_Block] = list()
 
-    currentIdx: int = 0
-    blockFullIps: list[str] = block.getFullIps()
+    # Sub blocks are the runs of IPs that are not "dips" (aka entropy < smoothing threshold)
+    isGoodIp: np.ndarray = ~(np.abs(entropy) < args.entropySmoothingThreshold)
 
-    # Scan list sequentially, discarding "dips" (aka entropy < smoothing threshold)
-    while currentIdx < block.getSize():
-        currentIp: str = blockFullIps[currentIdx]
+    edges: np.ndarray = np.diff(isGoodIp.astype(np.int8), prepend=0, append=0)
+    runStarts: np.ndarray = np.flatnonzero(edges == 1) + block.start
+    runEnds: np.ndarray = np.flatnonzero(edges == -1) - 1 + block.start
 
-        # Skip low entropy IPs until we find a good IP
-        if abs(entropy[currentIp]) < args.entropySmoothingThreshold:
-            currentIdx += 1
-            continue
+    for start, end in zip(runStarts.tolist(), runEnds.tolist()):
+        # An IP is considered "true" if it was originally seen on the initial scan
+        (lo, hi) = data.getRange(start, end)
 
-        subBlock: IP_Block = IP_Block()
-        subBlock.setType(block.type)
+        subBlock: IP_Block = IP_Block(
+            start, end, data.ips[lo:hi], block.type, block.asn, block.prefix
+        )
+        subBlock.setEntropyStats(
+            entropy[start - block.start : end - block.start + 1]
+        )
 
-        # Block start
-        initialIp: int = int(ipaddress.IPv4Address(currentIp))
+        subBlocksFound.append(subBlock)
 
-        subBlock.setStart(initialIp)
-        subBlock.setEnd(initialIp)
+    return subBlocksFound
 
-        # An IP is considered "true" if it was originally seen on the initial scan
-        if currentIp in fingerprintsPerIp.keys():
-            subBlock.addTrueIp(initialIp)
 
-        currentIdx += 1
+def smoothEntropies(entropy: np.ndarray, threshold: float, windowSize: int) -> None:
+    """
+    Applies a median filter to the IP addresses of a block with entropy lower than `threshold` ("dips"), in place.
 
-        while currentIdx < block.getSize():
-            currentIp: str = blockFullIps[currentIdx]
-            currentIpInt: int = int(ipaddress.IPv4Address(currentIp))
+    IP addresses are smoothed from left to right, and every median sees the already smoothed values to its left.
+    Dips only change at their own turn, so they are known beforehand. A dip without other dips in the left half of
+    its window only sees original values, so these are smoothed all at once. The remaining dips are smoothed
+    sequentially. The result is identical to smoothing every IP address sequentially.
 
-            # An IP with low entropy has been found
-            # Finish this block and advance
-            if abs(entropy[currentIp]) < args.entropySmoothingThreshold:
-                currentIdx += 1
-                break
+    Parameters
+    ----------
+    `entropy`: entropy of every IP address in the block (dense, indexed by offset in the block)
+    `threshold`: entropy smoothing threshold
+    `windowSize`: median filter window size, must be odd
+    """
+
+    halfWindow: int = windowSize // 2
 
-            # Add IP to the block and get next IP
-            subBlock.setEnd(currentIpInt)
+    # Only IPs with a full window are smoothed
+    dips: np.ndarray = (
+        np.flatnonzero(entropy[halfWindow : len(entropy) - halfWindow] < threshold)
+        + halfWindow
+    )
 
-            if currentIp in fingerprintsPerIp.keys():
-                subBlock.addTrueIp(currentIpInt)
+    if windowSize == 1 or len(dips) == 0:
+        return
 
-            currentIdx += 1
+    # A dip depends on the previous one if it is inside its window
+    independent: np.ndarray = np.ones(len(dips), dtype=bool)
+    independent[1:] = np.diff(dips) > halfWindow
 
-        subBlocksFound.append(subBlock)
+    # Windows are odd, so the median is always the middle value and is exact
+    independentDips: np.ndarray = dips[independent]
+    windows: np.ndarray = np.lib.stride_tricks.sliding_window_view(entropy, windowSize)
 
-    return subBlocksFound
+    entropy[independentDips] = np.median(windows[independentDips - halfWindow], axis=1)
 
+    # Dependent dips are only affected by dips to their left, which are already smoothed
+    values: list[float] = entropy.tolist()
 
-def getBlockUniqueDataAmount(
-    blockIps: list[str], timeSeries: dict[str, IpTimeSeries]
-) -> tuple[int, int]:
+    for idx in dips[~independent].tolist():
+        values[idx] = sorted(values[idx - halfWindow : idx + halfWindow + 1])[halfWindow]
+
+    entropy[:] = values
+
+
+def findOverlappingBlocks(blocks: list[IP_Block]) -> set[int]:
     """
-    Calculates the amount of unique domains and fingerprints found in a block.
+    Finds blocks whose IP address ranges overlap with another block.
+
+    Blocks of the same AS never overlap, but a block may have gaps with IPs of another AS (e.g. a more specific prefix).
 
     Parameters
     ----------
-    `blockIps`: a list of IP addresses in the block.
-    `timeSeries`: a dict of a timeseries for each IP address.
+    `blocks`: IP blocks
 
     Returns
     -------
-    A tuple in the following order:
-    `uniqueDomains`: amount of unique domains found in the block.
-    `uniqueFingerprints`: amount of unique fingerprints found in the block.
+    `overlapping`: indices of the blocks that overlap with at least one other block
     """
 
-    allDomains: set[str] = set()
-    allFingerprints: set[str] = set()
+    overlapping: set[int] = set()
 
-    for ip in blockIps:
-        for _, fingerprint, _, domain in timeSeries[ip]:
-            allDomains.add(domain)
-            allFingerprints.add(fingerprint)
+    # Block with the highest end IP seen so far, in order of start IP
+    lastIdx: int = -1
 
-    return len(allDomains), len(allFingerprints)
+    for idx in sorted(range(len(blocks)), key=lambda i: blocks[i].start):
+        if lastIdx >= 0 and blocks[idx].start <= blocks[lastIdx].end:
+            overlapping.update((idx, lastIdx))
 
+        if lastIdx < 0 or blocks[idx].end > blocks[lastIdx].end:
+            lastIdx = idx
 
-def getCombinedEntropyAndType(
-    usageEntropy: float,
-    domainEntropy: float,
-    uniqueBlockDomains: int,
-    uniqueBlockFingerprints: int,
-    blockTrueSize: int,
-) -> tuple[float, str]:
-    """
-    Combines IP usage and domain entropies into a single metric and determines the type of an IP address.
+    return overlapping
 
-    A set of special rules is applied to achieve this result. This function is the core of DynMap.
+
+def gatherBlockEntropy(
+    block: IP_Block,
+    data: IpData,
+    trueEntropy: np.ndarray,
+    gapEntropy: dict[int, float] | None = None,
+) -> np.ndarray:
+    """
+    Gathers the entropy of every IP address in a block as a dense array, indexed by offset in the block.
 
     Parameters
     ----------
-    `usageEntropy`: the normalized sample IP usage entropy.
-    `domainEntropy`: the domain entropy.
-    `uniqueBlockDomains`: the amount of unique domains found in the block.
-    `uniqueBlockFingerprints`: the amount of unique fingerprints found in the block.
-    `blockTrueSize`: the true size of the block (amount of IPs that are present in the original Shodan scans).
+    `block`: IP block
+    `data`: input data
+    `trueEntropy`: entropy of every IP address in the input data (0 for IPs without entropy)
+    `gapEntropy`: entropy of IP addresses not in the input data, only needed for overlapping blocks
 
     Returns
     -------
-    A tuple in the following order:
-    `combinedEntropy`: the combined entropy of the IP address.
+    `entropy`: entropy of every IP address in the block, 0 for IPs without entropy
+    """
+
+    entropy: np.ndarray = np.zeros(block.getSize(), dtype=np.float64)
+
+    (lo, hi) = data.getRange(block.start, block.end)
+
+    entropy[data.ips[lo:hi].astype(np.int64) - block.start] = trueEntropy[lo:hi]
+
+    if gapEntropy:
+        for offset, ip in enumerate(block.getFullIps()):
+            if ip in gapEntropy:
+                entropy[offset] = gapEntropy[ip]
+
+    return entropy
+
+
+def scatterBlockEntropy(
+    block: IP_Block,
+    data: IpData,
+    entropy: np.ndarray,
+    trueEntropy: np.ndarray,
+    gapEntropy: dict[int, float] | None = None,
+) -> None:
+    """
+    Stores the dense entropy of a block (see `gatherBlockEntropy`) back into the entropy of every IP address.
+
+    Parameters
+    ----------
+    `block`: IP block
+    `data`: input data
+    `entropy`: entropy of every IP address in the block
+    `trueEntropy`: entropy of every IP address in the input data, updated in place
+    `gapEntropy`: entropy of IP addresses not in the input data, updated in place. Only needed for overlapping blocks
+    """
+
+    (lo, hi) = data.getRange(block.start, block.end)
+
+    offsets: np.ndarray = data.ips[lo:hi].astype(np.int64) - block.start
+    trueEntropy[lo:hi] = entropy[offsets]
+
+    if gapEntropy is not None:
+        isGap: np.ndarray = np.ones(block.getSize(), dtype=bool)
+        isGap[offsets] = False
+
+        for offset in np.flatnonzero(isGap).tolist():
+            gapEntropy[block.start + offset] = float(entropy[offset])
+
+
+def getBlockUniqueDataAmount(data: IpData, blockIdx: np.ndarray) -> tuple[int, int]:
+    """
+    Calculates the amount of unique domains and fingerprints found in a block.
+
+    Parameters
+    ----------
+    `data`: input data.
+    `blockIdx`: indices of the IP addresses of the block in the input data.
+
+    Returns
+    -------
+    A tuple in the following order:
+    `uniqueDomains`: amount of unique domains found in the block.
+    `uniqueFingerprints`: amount of unique fingerprints found in the block.
+    """
+
+    # Unique domains and fingerprints of every IP are precomputed, so time series are never visited
+    (_, allFingerprints) = gatherSlices(
+        data.fingerprintOffsets, data.fingerprintIds, blockIdx
+    )
+    (_, allDomains) = gatherSlices(data.domainOffsets, data.domainIds, blockIdx)
+
+    return len(np.unique(allDomains)), len(np.unique(allFingerprints))
+
+
+def getCombinedEntropyAndType(
+    usageEntropy: float,
+    domainEntropy: float,
+    uniqueBlockDomains: int,
+    uniqueBlockFingerprints: int,
+    blockTrueSize: int,
+) -> tuple[float, str]:
+    """
+    Combines IP usage and domain entropies into a single metric and determines the type of an IP address.
+
+    A set of special rules is applied to achieve this result. This function is the core of DynMap.
+
+    Parameters
+    ----------
+    `usageEntropy`: the normalized sample IP usage entropy.
+    `domainEntropy`: the domain entropy.
+    `uniqueBlockDomains`: the amount of unique domains found in the block.
+    `uniqueBlockFingerprints`: the amount of unique fingerprints found in the block.
+    `blockTrueSize`: the true size of the block (amount of IPs that are present in the original Shodan scans).
+
+    Returns
+    -------
+    A tuple in the following order:
+    `combinedEntropy`: the combined entropy of the IP address.
     `type`: the type of the IP address (dynamic, static, proxy, cluster, outlier).
     """
 
-    # CASE 1: If both entropies are too low, this IP is likely static
-    # We will just average entropies, this IP WILL BE DISCARDED when building sub blocks
-    # We set type to static
-    if usageEntropy < 0.2 and domainEntropy < 0.2:
-        return ((usageEntropy + domainEntropy) / 2, "static")
+    # CASE 1: If both entropies are too low, this IP is likely static
+    # We will just average entropies, this IP WILL BE DISCARDED when building sub blocks
+    # We set type to static
+    if usageEntropy < 0.2 and domainEntropy < 0.2:
+        return ((usageEntropy + domainEntropy) / 2, "static")
+
+    # CASE 2: If both entropies are high, this IP is likely dynamic
+    # So we average entropies and set type to dynamic
+    if usageEntropy > 0.8 and domainEntropy > 0.8:
+        return ((usageEntropy + domainEntropy) / 2, "dynamic")
+
+    # Special cases
+    # CASE 3: Usage entropy is too low but domain entropy is high
+    # This IP is likely dynamic if there are enough domain changes, so we set its combined entropy to high
+    if usageEntropy < 0.2 and domainEntropy > 0.8:
+        return (domainEntropy, "dynamic")
+
+    # CASE 4: Usage entropy is high but domain entropy is too low
+    # We will check whether or not this IP has a lot of fingerprints and domains
+    # This IP might be part of a cluster or a proxy block
+    if usageEntropy > 0.8 and domainEntropy < 0.2:
+        fgRatio: float = uniqueBlockFingerprints / blockTrueSize
+        dmRatio: float = uniqueBlockDomains / blockTrueSize
+
+        # CASE 4.1: Lots of fingerprints and domains ACROSS THE WHOLE BLOCK,
+        # this IP is likely dynamic and part of a host provider or something similar
+        if fgRatio > 0.5 and dmRatio > 0.5:
+            return (usageEntropy, "dynamic")
+
+        if dmRatio <= 0.5:
+            # CASE 4.2 and 4.3: Few domains ACROSS THE WHOLE BLOCK,
+            # If the amount of fingerprints is significant for this block size,
+            # this IP might be part of a cluster, otherwise it might be a proxy IP
+            if fgRatio >= 0.5:
+                return (usageEntropy, "cluster")
+            else:
+                return (usageEntropy, "proxy")
+
+        # CASE 4.4: Few fingerprints ACROSS THE WHOLE BLOCK, but lots of domains
+        # This should not happen, but if it does, we will consider this IP an outlier and ignore it
+        return (usageEntropy, "outlier")
+
+    # CASE 5: If an IP doesn't fall into any category stated above, we may have an IP that is not
+    # sufficiently dynamic nor static, so we average entropies and let the smoothing and
+    # sub block processes decide whether or not to include this IP in the resulting dynamic IPs
+    return ((usageEntropy + domainEntropy) / 2, "dynamic")
+
+
+def findDynamicIps(args: argparse.Namespace, data: IpData) -> list[IP_Block]:
+    """
+    Analyzes a collection of IP addresses and applies a set of rules searching for dynamic IP addresses.
+
+    If the log level is set to `DEBUG`, a trace of blocks found will be logged,
+    as well as detailed information about the IPs found in each block.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+
+    Returns
+    -------
+    `subBlocks`: sub blocks found, in block order. Use `collectTypedIps` to get the IP addresses of each type
+    """
+
+    # Completed stages are loaded from checkpoints, if enabled (see --checkpoints)
+    blocks: list[IP_Block] | None = loadBlocksCheckpoint(args)
+
+    if blocks is None:
+        with profiler.stage("asn_lookup") as items:
+            ipsPerAS: dict[tuple[int, str], np.ndarray] = findIpsPerAS(args, data)
+
+            items["ips"] = data.getSize()
+            items["prefixes"] = len(ipsPerAS)
+
+        with profiler.stage("block_build") as items:
+            blocks = buildAllBlocks(args, data, ipsPerAS)
+
+            items["blocks"] = len(blocks)
+            items["block_true_ips"] = sum(block.getTrueSize() for block in blocks)
+
+        saveBlocksCheckpoint(args, blocks)
+
+    combinedEntropy: np.ndarray | None = loadEntropyCheckpoint(args, data, blocks)
+    blockEntropies: list[np.ndarray] | None = None
+
+    if combinedEntropy is not None:
+        blockEntropies = loadSmoothingCheckpoint(args, blocks)
+
+    subBlocks: list[list[IP_Block]]
+
+    if combinedEntropy is None and args.workers > 1 and len(blocks) > 1:
+        # Entropy, smoothing and sub blocks are done together on each worker
+        with profiler.stage("blocks_parallel") as items:
+            (combinedEntropy, blockEntropies, subBlocks) = processBlocksInParallel(
+                args, data, blocks
+            )
+
+            items["blocks"] = len(blocks)
+            items["workers"] = args.workers
+
+        saveEntropyCheckpoint(args, blocks, combinedEntropy)
+        saveSmoothingCheckpoint(args, blockEntropies)
+    else:
+        if combinedEntropy is None:
+            with profiler.stage("entropy") as items:
+                combinedEntropy = calculateCombinedEntropies(args, data, blocks)
+
+                items["blocks"] = len(blocks)
+
+            saveEntropyCheckpoint(args, blocks, combinedEntropy)
+
+        if blockEntropies is None:
+            blockEntropies = smoothAllBlocks(args, data, blocks, combinedEntropy)
+
+            saveSmoothingCheckpoint(args, blockEntropies)
+
+        subBlocks = findAllSubBlocks(args, data, blocks, blockEntropies)
+
+    return [subBlock for found in subBlocks for subBlock in found]
+
+
+def findIpsPerAS(
+    args: argparse.Namespace, data: IpData
+) -> dict[tuple[int, str], np.ndarray]:
+    """
+    Separates the IP addresses of the input data per AS number and BGP prefix.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+
+    Returns
+    -------
+    `ipsPerAS`: indices of IPs in the input data (sorted), per (AS number, prefix)
+    """
+
+    # Flatten BGP prefixes into sorted intervals, so every IP is looked up at once
+    asnIndex: AsnIndex = AsnIndex.fromFile(f"{args.cacheFolder}/IPASN.dat")
+
+    # Separate IPs per AS Number and BGP prefix
+    logging.info(
+        f"Finding AS numbers and BGP prefixes for {data.getSize()} IP addresses"
+    )
+
+    # Indices of IPs in the input data, per (AS number, prefix)
+    ipsPerAS: dict[tuple[int, str], np.ndarray] = asnIndex.groupSortedIps(data.ips)
+
+    logging.info(f"Found {len(ipsPerAS)} unique (AS number, prefix) tuples")
+
+    return ipsPerAS
+
+
+def buildAllBlocks(
+    args: argparse.Namespace,
+    data: IpData,
+    ipsPerAS: dict[tuple[int, str], np.ndarray],
+) -> list[IP_Block]:
+    """
+    Builds the IP blocks of every (AS number, prefix).
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `ipsPerAS`: indices of IPs in the input data, per (AS number, prefix)
+
+    Returns
+    -------
+    `blocks`: IP blocks found
+    """
+
+    logging.info(
+        f"Found {sum(len(ips) >= args.minBlockSize for ips in ipsPerAS.values())} ASes with {args.minBlockSize} or more IP addresses"
+    )
+
+    # Start building blocks
+    logging.info(f"Building blocks")
+
+    blocks: list[IP_Block] = list()
+
+    # Every (AS number, prefix) with enough IPs is a group of contiguous IPs, blocks of every group are built at once
+    origins: list[tuple[int, str]] = [
+        origin
+        for origin, indices in ipsPerAS.items()
+        if len(indices) >= args.minBlockSize
+    ]
+
+    if origins:
+        indices: np.ndarray = np.concatenate([ipsPerAS[origin] for origin in origins])
+
+        groupStarts: np.ndarray = np.zeros(len(origins), dtype=np.int64)
+        np.cumsum(
+            [len(ipsPerAS[origin]) for origin in origins[:-1]], out=groupStarts[1:]
+        )
+
+        (trueIdx, blockFirst, blockLast) = findBlockBounds(
+            data.ips[indices],
+            data.getFingerprintCounts()[indices],
+            groupStarts,
+            args.minBlockSize,
+            args.maxGapSize,
+        )
+
+        trueIps: np.ndarray = data.ips[indices[trueIdx]]
+        blockGroups: np.ndarray = (
+            np.searchsorted(groupStarts, trueIdx[blockFirst], side="right") - 1
+        )
+
+        for first, last, group in zip(
+            blockFirst.tolist(), blockLast.tolist(), blockGroups.tolist()
+        ):
+            blocks.append(
+                IP_Block(
+                    int(trueIps[first]),
+                    int(trueIps[last]),
+                    trueIps[first : last + 1],
+                    asn=origins[group][0],
+                    prefix=origins[group][1],
+                )
+            )
+
+    logging.info(f"Built {len(blocks)} blocks")
+
+    # Debug messages are only formatted if they are logged
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Block data dumps:")
+
+        for b in blocks:
+            logging.debug(
+                f"BLOCK  Start: {b.startStr}  End: {b.endStr}  Size: {b.getSize()}  True Size: {b.getTrueSize()}"
+            )
+
+            for ip in b.getTrueIps().tolist():
+                logging.debug(f"{ipToStr(ip)}")
+
+            logging.debug("")
+
+    return blocks
+
+
+def calculateCombinedEntropies(
+    args: argparse.Namespace, data: IpData, blocks: list[IP_Block]
+) -> np.ndarray:
+    """
+    Calculates the combined entropy of every true IP of every block, and assigns a type to every block.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `blocks`: IP blocks, their types are set in place
+
+    Returns
+    -------
+    `combinedEntropy`: combined entropy of every input IP (indexed like the input data), 0 for IPs outside blocks
+    """
+
+    # IP Usage-Entropy Computation
+    # Adapted from: 'How Dynamic are IP Addresses?' (https://dl.acm.org/doi/abs/10.1145/1282380.1282415)
+    logging.info(f"Calculating IP Usage-Entropy and IP Domain-Entropy")
+
+    # Combined entropy of every input IP, IPs outside blocks have no entropy
+    combinedEntropy: np.ndarray = np.zeros(data.getSize(), dtype=np.float64)
+
+    # Debug messages and trace records are only built if they are logged
+    isDebug: bool = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    # The analysis is done on a block by block basis
+    for block in blocks:
+        blockIdx: np.ndarray = data.getIndices(block.getTrueIps())
+
+        isTraced: bool = traceSink.isTraced(block.asn, block.prefix, block.start)
+
+        # Calculate amount of unique fingerprints and domains for later use when combining entropies
+        (uniqueDomains, uniqueFingerprints) = getBlockUniqueDataAmount(data, blockIdx)
+
+        # Track types assigned to IPs by the getCombinedEntropy function, this is used to assign a type to the whole block
+        types: dict[str, int] = {
+            "dynamic": 0,
+            "proxy": 0,
+            "cluster": 0,
+            "outlier": 0,
+            "static": 0,
+        }
+
+        # Normalized IP Usage Entropy and Normalized Sample IP Usage Entropy of every true IP
+        (_, nsueValues) = USAGE_ENTROPY_ENGINES[args.entropyEngine](
+            data, blockIdx, block.getSize()
+        )
+
+        # Every true IP has definitely more than one fingerprint by this point, so
+        # we favor IPs with a domain name change (on a given port) to mitigate the effect of IPs which have
+        # different fingerprints because of SSL certificate renewals
+        # We do this by using a domain name entropy
+        domainEntropies: list[float] = calculateDomainNameEntropies(
+            data, blockIdx
+        ).tolist()
+
+        for ip, idx, nsue, normalizedDomainEntropy in zip(
+            block.getTrueIps().tolist(), blockIdx.tolist(), nsueValues, domainEntropies
+        ):
+            # Combine entropies using a set of rules
+            (combinedEntropy[idx], ipType) = getCombinedEntropyAndType(
+                nsue,
+                normalizedDomainEntropy,
+                uniqueDomains,
+                uniqueFingerprints,
+                block.getTrueSize(),
+            )
+
+            types[ipType] += 1
+
+            if isTraced:
+                traceSink.write(
+                    buildIpTraceRecord(
+                        data,
+                        block,
+                        ip,
+                        idx,
+                        nsue,
+                        normalizedDomainEntropy,
+                        float(combinedEntropy[idx]),
+                        ipType,
+                    )
+                )
+
+            if not isDebug:
+                continue
+
+            # Timeseries and entropy debug info
+            logging.debug(f"Time series for IP address: {ipToStr(ip)}")
+
+            for timestamp, fingerprint, port, domain in zip(
+                *(values.tolist() for values in data.getTimeSeries(idx))
+            ):
+                logging.debug(
+                    f"T: {dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)}  P: {port}  F: {data.getFingerprint(fingerprint)}  D: {data.getDomain(domain)}"
+                )
+
+            logging.debug(
+                f"IP: {ipToStr(ip)}  Entropy: {nsue}  Domain Entropy: {normalizedDomainEntropy}  Combined Entropy: {combinedEntropy[idx]}  Type: {ipType}  Unique Fingerprints: {uniqueFingerprints}  Unique Domains: {uniqueDomains}  Block true size {block.getTrueSize()}"
+            )
+            logging.debug("")
+
+        # Assign a type to this block based on the most prevalent type across its IPs
+        prevalentType: str = max(types, key=types.get)
+        block.setType(prevalentType)
+
+        if isTraced:
+            traceSink.write(
+                {
+                    "record": "block",
+                    **getBlockTraceFields(block),
+                    "type_counts": types,
+                    "type_prevalence": max(types.values()) / block.getTrueSize(),
+                    "unique_fingerprints": int(uniqueFingerprints),
+                    "unique_domains": int(uniqueDomains),
+                }
+            )
+
+        if isDebug:
+            logging.debug(
+                f"Block true size: {block.getTrueSize()}  Block type: {prevalentType}  Type prevalence: {max(types.values()) / block.getTrueSize()}"
+            )
+
+    return combinedEntropy
+
+
+def getBlockTraceFields(block: IP_Block) -> dict[str, Any]:
+    """
+    Gets the fields that identify a block (or sub block) in trace records.
+    """
+
+    return {
+        "start_ip": block.startStr,
+        "end_ip": block.endStr,
+        "asn": block.asn,
+        "prefix": block.prefix,
+        "size": block.getSize(),
+        "true_size": block.getTrueSize(),
+    }
+
+
+def buildIpTraceRecord(
+    data: IpData,
+    block: IP_Block,
+    ip: int,
+    idx: int,
+    usageEntropy: float,
+    domainEntropy: float,
+    combinedEntropy: float,
+    ipType: str,
+) -> dict[str, Any]:
+    """
+    Builds the trace record of a true IP of a block. The time series is only included if `--trace-time-series` is used.
+
+    Parameters
+    ----------
+    `data`: input data
+    `block`: IP block
+    `ip`: IP address, as an integer
+    `idx`: index of the IP in the input data
+    `usageEntropy`: normalized sample IP usage entropy (NSUE)
+    `domainEntropy`: normalized domain name entropy
+    `combinedEntropy`: combined entropy
+    `ipType`: type assigned to the IP
+
+    Returns
+    -------
+    `record`: trace record
+    """
+
+    record: dict[str, Any] = {
+        "record": "ip",
+        "ip": ipToStr(ip),
+        "block_start_ip": block.startStr,
+        "usage_entropy": float(usageEntropy),
+        "domain_entropy": float(domainEntropy),
+        "combined_entropy": combinedEntropy,
+        "type": ipType,
+        "fingerprints": int(
+            data.fingerprintOffsets[idx + 1] - data.fingerprintOffsets[idx]
+        ),
+        "observations": data.getObservationCount(idx),
+    }
+
+    if traceSink.shouldTraceTimeSeries:
+        record["time_series"] = [
+            [
+                dt.datetime.fromtimestamp(timestamp, dt.timezone.utc).isoformat(),
+                port,
+                data.getFingerprint(fingerprint),
+                data.getDomain(domain),
+            ]
+            for timestamp, fingerprint, port, domain in zip(
+                *(values.tolist() for values in data.getTimeSeries(idx))
+            )
+        ]
+
+        # Entries of compacted data are runs, their last time seen and amount of observations are added
+        if data.isCompacted():
+            start: int = data.seriesOffsets[idx]
+            end: int = data.seriesOffsets[idx + 1]
+
+            for entry, lastTimestamp, count in zip(
+                record["time_series"],
+                data.seriesLastTimestamps[start:end].tolist(),
+                data.seriesCounts[start:end].tolist(),
+            ):
+                entry += [
+                    dt.datetime.fromtimestamp(lastTimestamp, dt.timezone.utc).isoformat(),
+                    count,
+                ]
+
+    return record
+
+
+def smoothAllBlocks(
+    args: argparse.Namespace,
+    data: IpData,
+    blocks: list[IP_Block],
+    combinedEntropy: np.ndarray,
+) -> list[np.ndarray]:
+    """
+    Smooths the combined entropy of every block.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `blocks`: IP blocks, with types assigned
+    `combinedEntropy`: combined entropy of every input IP. It is not changed, so it can be reused
+
+    Returns
+    -------
+    `blockEntropies`: smoothed entropy of every IP address of every block (dense, indexed by offset in the block)
+    """
+
+    # Smoothing changes entropies in place
+    combinedEntropy = combinedEntropy.copy()
+
+    # Dynamic IP Block identification
+    # Please refer to the section 4.4 of the paper mentioned above
+    # Step 1: Apply median filter method to smooth out dips in IP Usage-Entropy
+    logging.info(f"Smoothing IP Usage-Entropy")
+
+    # Blocks are smoothed in order, so a block overlapping a previous one sees the entropies it smoothed,
+    # including those of IPs that are not in the input data
+    overlappingBlocks: set[int] = findOverlappingBlocks(blocks)
+    gapEntropy: dict[int, float] = dict()
+
+    blockEntropies: list[np.ndarray] = list()
+
+    with profiler.stage("smoothing") as items:
+        for blockIdx, block in enumerate(blocks):
+            blockGapEntropy: dict[int, float] | None = (
+                gapEntropy if blockIdx in overlappingBlocks else None
+            )
+
+            # Dense entropy of every IP in the block, indexed by offset
+            entropy: np.ndarray = gatherBlockEntropy(
+                block, data, combinedEntropy, blockGapEntropy
+            )
+
+            # If an IP has entropy smaller than threshold, apply smoothing
+            # The signal smoothing process can smooth over up to medianFilterWindowSize // 2 consecutive dips
+            smoothEntropies(
+                entropy, args.entropySmoothingThreshold, args.medianFilterWindowSize
+            )
+
+            scatterBlockEntropy(block, data, entropy, combinedEntropy, blockGapEntropy)
+            blockEntropies.append(entropy)
+
+        # Overlapping blocks may have been changed by blocks smoothed after them
+        for blockIdx in overlappingBlocks:
+            blockEntropies[blockIdx] = gatherBlockEntropy(
+                blocks[blockIdx], data, combinedEntropy, gapEntropy
+            )
+
+        items["blocks"] = len(blocks)
+        items["overlapping_blocks"] = len(overlappingBlocks)
+
+    return blockEntropies
+
+
+def findAllSubBlocks(
+    args: argparse.Namespace,
+    data: IpData,
+    blocks: list[IP_Block],
+    blockEntropies: list[np.ndarray],
+) -> list[list[IP_Block]]:
+    """
+    Finds the sub blocks of every block, given its smoothed entropy (see `smoothAllBlocks`).
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `blocks`: IP blocks, with types assigned
+    `blockEntropies`: smoothed entropy of every IP address of every block
+
+    Returns
+    -------
+    `subBlocks`: sub blocks found, for every block
+    """
+
+    # Step 2: find sub blocks
+    # We will sequentially segment the IP_Blocks into smaller segments
+    # by discarding the remaining “dips” after signal smoothing
+    logging.info(f"Finding sub blocks")
+
+    with profiler.stage("sub_blocks") as items:
+        subBlocks: list[list[IP_Block]] = [
+            findSubBlocks(args, block, entropy, data)
+            for block, entropy in zip(blocks, blockEntropies)
+        ]
+
+        items["sub_blocks"] = sum(map(len, subBlocks))
+
+    for block, found in zip(blocks, subBlocks):
+        if traceSink.isTraced(block.asn, block.prefix, block.start):
+            for subBlock in found:
+                (minEntropy, meanEntropy, maxEntropy) = subBlock.entropyStats
+
+                traceSink.write(
+                    {
+                        "record": "sub_block",
+                        **getBlockTraceFields(subBlock),
+                        "block_start_ip": block.startStr,
+                        "type": subBlock.type,
+                        "min_entropy": minEntropy,
+                        "mean_entropy": meanEntropy,
+                        "max_entropy": maxEntropy,
+                    }
+                )
+
+    logging.info(f"Found {sum(map(len, subBlocks))} sub blocks")
+
+    return subBlocks
+
+
+def getBlockParameters(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Gets the parameters blocks and their combined entropies depend on, as used in checkpoint names.
+    """
+
+    return {"b": args.minBlockSize, "g": args.maxGapSize}
+
+
+def getSmoothingParameters(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Gets the parameters smoothed entropies depend on, as used in checkpoint names.
+    """
+
+    return {
+        **getBlockParameters(args),
+        "t": args.entropySmoothingThreshold,
+        "w": args.medianFilterWindowSize,
+    }
+
+
+def saveBlocksCheckpoint(args: argparse.Namespace, blocks: list[IP_Block]) -> None:
+    """
+    Saves the blocks built as a checkpoint, if checkpoints are enabled. True IPs of every block are saved as a single
+    array with offsets.
+    """
+
+    if not checkpointStore.enabled:
+        return
+
+    trueOffsets: np.ndarray = np.zeros(len(blocks) + 1, dtype=np.int64)
+    np.cumsum([block.getTrueSize() for block in blocks], out=trueOffsets[1:])
+
+    checkpointStore.save(
+        "blocks",
+        getBlockParameters(args),
+        {
+            "starts": np.array([block.start for block in blocks], dtype=np.uint32),
+            "ends": np.array([block.end for block in blocks], dtype=np.uint32),
+            "trueOffsets": trueOffsets,
+            "trueIps": np.concatenate(
+                [block.getTrueIps() for block in blocks] + [np.zeros(0, dtype=np.uint32)]
+            ).astype(np.uint32),
+            "asns": np.array(
+                [-1 if block.asn is None else block.asn for block in blocks],
+                dtype=np.int64,
+            ),
+            "prefixes": np.array(
+                [block.prefix or "" for block in blocks], dtype=np.str_
+            ),
+        },
+    )
+
+
+def loadBlocksCheckpoint(args: argparse.Namespace) -> list[IP_Block] | None:
+    """
+    Loads the blocks built from a checkpoint, None if not available.
+    """
+
+    arrays: dict[str, np.ndarray] | None = checkpointStore.load(
+        "blocks", getBlockParameters(args)
+    )
+
+    if arrays is None:
+        return None
+
+    trueOffsets: list[int] = arrays["trueOffsets"].tolist()
+
+    blocks: list[IP_Block] = [
+        IP_Block(
+            start,
+            end,
+            arrays["trueIps"][trueOffsets[blockIdx] : trueOffsets[blockIdx + 1]],
+            asn=None if asn < 0 else asn,
+            prefix=prefix or None,
+        )
+        for blockIdx, (start, end, asn, prefix) in enumerate(
+            zip(
+                arrays["starts"].tolist(),
+                arrays["ends"].tolist(),
+                arrays["asns"].tolist(),
+                arrays["prefixes"].tolist(),
+            )
+        )
+    ]
+
+    logging.info(f"Loaded {len(blocks)} blocks from checkpoint")
+
+    return blocks
+
+
+def saveEntropyCheckpoint(
+    args: argparse.Namespace, blocks: list[IP_Block], combinedEntropy: np.ndarray
+) -> None:
+    """
+    Saves the combined entropy of every input IP and the type of every block as a checkpoint, if checkpoints are
+    enabled.
+    """
+
+    if not checkpointStore.enabled:
+        return
+
+    checkpointStore.save(
+        "entropy",
+        getBlockParameters(args),
+        {
+            "combinedEntropy": combinedEntropy,
+            "types": np.array([block.type for block in blocks], dtype=np.str_),
+        },
+    )
+
+
+def loadEntropyCheckpoint(
+    args: argparse.Namespace, data: IpData, blocks: list[IP_Block]
+) -> np.ndarray | None:
+    """
+    Loads the combined entropy of every input IP from a checkpoint, None if not available. Block types are set in
+    place.
+    """
+
+    arrays: dict[str, np.ndarray] | None = checkpointStore.load(
+        "entropy", getBlockParameters(args)
+    )
+
+    if (
+        arrays is None
+        or len(arrays["combinedEntropy"]) != data.getSize()
+        or len(arrays["types"]) != len(blocks)
+    ):
+        return None
+
+    for block, blockType in zip(blocks, arrays["types"].tolist()):
+        block.setType(blockType)
+
+    logging.info(f"Loaded combined entropies of {len(blocks)} blocks from checkpoint")
+
+    return arrays["combinedEntropy"]
+
+
+def saveSmoothingCheckpoint(
+    args: argparse.Namespace, blockEntropies: list[np.ndarray]
+) -> None:
+    """
+    Saves the smoothed entropy of every block as a checkpoint (as a single array), if checkpoints are enabled.
+    """
+
+    if not checkpointStore.enabled:
+        return
+
+    checkpointStore.save(
+        "smoothing",
+        getSmoothingParameters(args),
+        {
+            "entropies": np.concatenate(
+                blockEntropies + [np.zeros(0, dtype=np.float64)]
+            )
+        },
+    )
+
+
+def loadSmoothingCheckpoint(
+    args: argparse.Namespace, blocks: list[IP_Block]
+) -> list[np.ndarray] | None:
+    """
+    Loads the smoothed entropy of every block from a checkpoint, None if not available.
+    """
+
+    arrays: dict[str, np.ndarray] | None = checkpointStore.load(
+        "smoothing", getSmoothingParameters(args)
+    )
+
+    sizes: np.ndarray = np.array([block.getSize() for block in blocks], dtype=np.int64)
+
+    if arrays is None or len(arrays["entropies"]) != sizes.sum():
+        return None
+
+    logging.info(f"Loaded smoothed entropies of {len(blocks)} blocks from checkpoint")
+
+    # Dense entropy of every block, one after the other
+    offsets: list[int] = np.cumsum(sizes).tolist()
+
+    return [
+        arrays["entropies"][end - size : end]
+        for end, size in zip(offsets, sizes.tolist())
+    ]
+
+
+def splitBlocks(blocks: list[IP_Block], chunks: int) -> list[list[int]]:
+    """
+    Splits blocks in chunks of consecutive blocks with about the same amount of work.
+
+    Entropies compare every pair of true IPs in a block, so the work of a block is its true size squared.
+
+    Parameters
+    ----------
+    `blocks`: IP blocks
+    `chunks`: desired amount of chunks
+
+    Returns
+    -------
+    `blockChunks`: indices of the blocks of every (non-empty) chunk
+    """
+
+    work: np.ndarray = np.cumsum([block.getTrueSize() ** 2 for block in blocks])
+    chunkOf: np.ndarray = np.minimum(work * chunks // max(int(work[-1]), 1), chunks - 1)
+
+    blockChunks: dict[int, list[int]] = defaultdict(list)
+
+    for blockIdx, chunk in enumerate(chunkOf.tolist()):
+        blockChunks[chunk].append(blockIdx)
+
+    return [blockChunks[chunk] for chunk in sorted(blockChunks)]
+
+
+def initBlockWorker(loglevel: str, sink: TraceSink) -> None:
+    """
+    Silences stage progress logs in block workers, the main process already logs them. `DEBUG` traces are kept.
+
+    Trace records are kept in memory and sent back with the results, the main process writes them.
+    """
+
+    global traceSink
+
+    if loglevel != "DEBUG":
+        logging.getLogger().setLevel(max(getattr(logging, loglevel), logging.WARNING))
+
+    traceSink = sink
+    traceSink.toBuffer()
+
+
+def processBlockChunk(
+    args: argparse.Namespace,
+    blocks: list[IP_Block],
+    data: IpData,
+    isOverlapping: list[bool],
+) -> tuple[
+    list[tuple[str, np.ndarray, np.ndarray | None, list[IP_Block] | None]],
+    list[dict[str, Any]],
+]:
+    """
+    Calculates the entropies of a chunk of blocks, and smooths them and finds sub blocks for blocks that do not overlap
+    other blocks. Runs on a worker process.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `blocks`: IP blocks of the chunk
+    `data`: input data of every IP in the range of any block of the chunk
+    `isOverlapping`: whether each block overlaps another block. These must be smoothed in order, with every other
+    overlapping block, so it is done by the main process
+
+    Returns
+    -------
+    A tuple in the following order:
+    `results`: for every block, a tuple in the following order:
+        `type`: block type
+        `entropy`: combined entropy of every true IP of the block
+        `smoothedEntropy`: smoothed entropy of every IP of the block, None for overlapping blocks
+        `subBlocks`: sub blocks found, None for overlapping blocks
+    `traceRecords`: trace records of the chunk, written by the main process
+    """
+
+    combinedEntropy: np.ndarray = calculateCombinedEntropies(args, data, blocks)
+
+    # Blocks without overlaps do not change each other
+    independentBlocks: list[IP_Block] = [
+        block for block, overlapping in zip(blocks, isOverlapping) if not overlapping
+    ]
+    independentEntropies: list[np.ndarray] = smoothAllBlocks(
+        args, data, independentBlocks, combinedEntropy
+    )
+
+    smoothedEntropies = iter(independentEntropies)
+    independentSubBlocks = iter(
+        findAllSubBlocks(args, data, independentBlocks, independentEntropies)
+    )
+
+    results: list[
+        tuple[str, np.ndarray, np.ndarray | None, list[IP_Block] | None]
+    ] = list()
+
+    for block, overlapping in zip(blocks, isOverlapping):
+        blockIdx: np.ndarray = data.getIndices(block.getTrueIps())
+
+        results.append(
+            (
+                block.type,
+                combinedEntropy[blockIdx],
+                None if overlapping else next(smoothedEntropies),
+                None if overlapping else next(independentSubBlocks),
+            )
+        )
+
+    return (results, traceSink.drain())
+
+
+def processBlocksInParallel(
+    args: argparse.Namespace, data: IpData, blocks: list[IP_Block]
+) -> tuple[np.ndarray, list[np.ndarray], list[list[IP_Block]]]:
+    """
+    Calculates entropies, smooths them and finds sub blocks of every block on `--workers` worker processes.
+
+    Blocks are split in chunks, and every worker only receives the input data in the range of the blocks of its chunk.
+    Blocks that overlap other blocks are smoothed by the main process, in order, so results are identical
+    to processing every block sequentially, regardless of the amount of workers.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `blocks`: IP blocks, their types are set in place
+
+    Returns
+    -------
+    A tuple in the following order:
+    `combinedEntropy`: combined entropy of every input IP, 0 for IPs outside blocks
+    `blockEntropies`: smoothed entropy of every IP address of every block
+    `subBlocks`: sub blocks found, for every block
+    """
+
+    logging.info(
+        f"Calculating IP Usage-Entropy and IP Domain-Entropy, smoothing and finding sub blocks on {args.workers} workers"
+    )
+
+    overlappingBlocks: set[int] = findOverlappingBlocks(blocks)
+
+    combinedEntropy: np.ndarray = np.zeros(data.getSize(), dtype=np.float64)
+    blockEntropies: list[np.ndarray | None] = [None] * len(blocks)
+    subBlocks: list[list[IP_Block] | None] = [None] * len(blocks)
+
+    # Several chunks per worker, so workers finishing early can take more work
+    blockChunks: list[list[int]] = splitBlocks(blocks, 4 * args.workers)
+
+    def getChunkData(chunk: list[int]) -> IpData:
+        ranges: list[tuple[int, int]] = [
+            data.getRange(blocks[blockIdx].start, blocks[blockIdx].end)
+            for blockIdx in chunk
+        ]
+
+        return data.select(
+            np.unique(np.concatenate([np.arange(lo, hi) for lo, hi in ranges]))
+        )
+
+    with multiprocessing.Pool(
+        args.workers,
+        initializer=initBlockWorker,
+        initargs=(args.loglevel, traceSink),
+    ) as pool:
+        # Only a few chunks are in flight, so their data is not copied all at once
+        queued: deque[list[int]] = deque(blockChunks)
+        pending: deque[tuple[list[int], Any]] = deque()
+
+        while queued or pending:
+            while queued and len(pending) < 2 * args.workers:
+                chunk: list[int] = queued.popleft()
+
+                pending.append(
+                    (
+                        chunk,
+                        pool.apply_async(
+                            processBlockChunk,
+                            (
+                                args,
+                                [blocks[blockIdx] for blockIdx in chunk],
+                                getChunkData(chunk),
+                                [blockIdx in overlappingBlocks for blockIdx in chunk],
+                            ),
+                        ),
+                    )
+                )
+
+            (chunk, result) = pending.popleft()
+
+            (chunkResults, traceRecords) = result.get()
+            traceSink.writeAll(traceRecords)
+
+            for blockIdx, (blockType, entropy, smoothedEntropy, found) in zip(
+                chunk, chunkResults
+            ):
+                block: IP_Block = blocks[blockIdx]
+                block.setType(blockType)
+
+                combinedEntropy[data.getIndices(block.getTrueIps())] = entropy
+                blockEntropies[blockIdx] = smoothedEntropy
+                subBlocks[blockIdx] = found
+
+    # Overlapping blocks, every block they overlap is also in this list
+    if overlappingBlocks:
+        overlappingIdx: list[int] = sorted(overlappingBlocks)
+
+        logging.info(f"Smoothing {len(overlappingIdx)} overlapping blocks")
+
+        overlapping: list[IP_Block] = [blocks[blockIdx] for blockIdx in overlappingIdx]
+        overlappingEntropies: list[np.ndarray] = smoothAllBlocks(
+            args, data, overlapping, combinedEntropy
+        )
+
+        for blockIdx, smoothedEntropy, found in zip(
+            overlappingIdx,
+            overlappingEntropies,
+            findAllSubBlocks(args, data, overlapping, overlappingEntropies),
+        ):
+            blockEntropies[blockIdx] = smoothedEntropy
+            subBlocks[blockIdx] = found
+
+    logging.info(f"Found {sum(map(len, subBlocks))} sub blocks")
+
+    return (combinedEntropy, blockEntropies, subBlocks)
+
+
+def collectTypedIps(
+    subBlocks: list[IP_Block],
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Collects the IP address ranges of every sub block, by type.
+
+    IP addresses are kept as ranges (`start`, `end`, inclusive), see `buildOutputData` to get them as strings.
+
+    Parameters
+    ----------
+    `subBlocks`: sub blocks found
+
+    Returns
+    -------
+    A tuple in the following order:
+    `allDynamicIps`: ranges of all true + extra dynamic IP addresses found
+    `allProxyIps`: ranges of all true + extra proxy IP addresses found
+    `allClusterIps`: ranges of all true + extra cluster IP addresses found
+    """
+
+    # DONE
+    # Collect resulting IPs and finish
+    allDynamicIps: list[tuple[int, int]] = list()
+    allProxyIps: list[tuple[int, int]] = list()
+    allClusterIps: list[tuple[int, int]] = list()
+
+    for subBlock in subBlocks:
+        match subBlock.type:
+            case "dynamic":
+                allDynamicIps.append((subBlock.start, subBlock.end))
+
+            case "proxy":
+                allProxyIps.append((subBlock.start, subBlock.end))
+
+            case "cluster":
+                allClusterIps.append((subBlock.start, subBlock.end))
+
+            case "outlier":
+                pass
+
+    logging.info(f"Found {countRangeIps(allDynamicIps)} total dynamic IP addresses")
+    logging.info(f"Found {countRangeIps(allProxyIps)} total proxy IP addresses")
+    logging.info(f"Found {countRangeIps(allClusterIps)} total cluster IP addresses")
+
+    logging.info(
+        f"Total extra IP adresses: {sum(b.getSize() for b in subBlocks) - sum(b.getTrueSize() for b in subBlocks)}"
+    )
+
+    return (allDynamicIps, allProxyIps, allClusterIps)
+
+
+def countRangeIps(ranges: list[tuple[int, int]]) -> int:
+    """
+    Counts the IP addresses in a list of ranges (`start`, `end`, inclusive).
+    """
+
+    return sum(end - start + 1 for start, end in ranges)
+
+
+def formatRangeIps(
+    args: argparse.Namespace, ranges: list[tuple[int, int]]
+) -> list[str]:
+    """
+    Formats a list of IP address ranges (`start`, `end`, inclusive) as strings, as saved in the output.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `ranges`: IP address ranges
+
+    Returns
+    -------
+    `ips`: every IP address in the ranges (sorted as strings), or the CIDR blocks covering them (sorted by address) if
+    `--save-cidrs` is used
+    """
+
+    if args.shouldSaveCidrs:
+        return rangesToCidrs(ranges)
+
+    ips: list[str] = [
+        ipToStr(ip) for start, end in ranges for ip in range(start, end + 1)
+    ]
+    ips.sort()
+
+    return ips
+
+
+def buildOutputData(
+    args: argparse.Namespace,
+    data: IpData,
+    dynamicIps: list[tuple[int, int]],
+    proxyIps: list[tuple[int, int]],
+    clusterIps: list[tuple[int, int]],
+    shouldFormatIps: bool = True,
+) -> dict[str, Any]:
+    """
+    Builds the output of a DynMap run.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
+    `dynamicIps`: ranges of dynamic IP addresses found
+    `proxyIps`: ranges of proxy IP addresses found
+    `clusterIps`: ranges of cluster IP addresses found
+    `shouldFormatIps`: whether IP addresses are formatted as strings (see `formatRangeIps`), otherwise only the
+    amount of IP addresses of each type is kept
+
+    Returns
+    -------
+    `outputData`: parameters used and IP addresses found
+    """
+
+    formatIps: Callable[[list[tuple[int, int]]], list[str] | int] = (
+        (lambda ranges: formatRangeIps(args, ranges))
+        if shouldFormatIps
+        else countRangeIps
+    )
+
+    return {
+        "min_block_size": args.minBlockSize,
+        "max_gap_size": args.maxGapSize,
+        "smoothing_threshold": args.entropySmoothingThreshold,
+        "median_window_size": args.medianFilterWindowSize,
+        "total_input_ips": data.getSize(),
+        "total_output_ips": countRangeIps(dynamicIps)
+        + countRangeIps(proxyIps)
+        + countRangeIps(clusterIps),
+        "dynamic_ips": formatIps(dynamicIps),
+        "proxy_ips": formatIps(proxyIps),
+        "cluster_ips": formatIps(clusterIps),
+    }
+
+
+def isSweep(args: argparse.Namespace) -> bool:
+    """
+    Checks whether a parameter sweep was requested.
+    """
+
+    return any(
+        values is not None
+        for values in (
+            args.sweepBlockSizes,
+            args.sweepGapSizes,
+            args.sweepThresholds,
+            args.sweepWindowSizes,
+        )
+    )
+
+
+def getSweepGrid(args: argparse.Namespace) -> list[argparse.Namespace]:
+    """
+    Builds the arguments of every run of a parameter sweep.
+
+    Parameters that are not swept keep their single value.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+
+    Returns
+    -------
+    `grid`: command line arguments of every run, sorted by parameters
+    """
+
+    grid: list[argparse.Namespace] = list()
+
+    for blockSize, gapSize, threshold, windowSize in product(
+        sorted(set(args.sweepBlockSizes or [args.minBlockSize])),
+        sorted(set(args.sweepGapSizes or [args.maxGapSize])),
+        sorted(set(args.sweepThresholds or [args.entropySmoothingThreshold])),
+        sorted(set(args.sweepWindowSizes or [args.medianFilterWindowSize])),
+    ):
+        grid.append(
+            argparse.Namespace(
+                **{
+                    **vars(args),
+                    "minBlockSize": blockSize,
+                    "maxGapSize": gapSize,
+                    "entropySmoothingThreshold": threshold,
+                    "medianFilterWindowSize": windowSize,
+                    # Runs are already in parallel
+                    "workers": 1,
+                }
+            )
+        )
+
+    return grid
+
+
+# Structured trace of blocks and IPs, disabled unless --trace-file is used (see main)
+traceSink: TraceSink = TraceSink()
+
+# Stage timings, disabled unless --profile is used (see main)
+profiler: StageProfiler = StageProfiler("dynmap.py")
 
-    # CASE 2: If both entropies are high, this IP is likely dynamic
-    # So we average entropies and set type to dynamic
-    if usageEntropy > 0.8 and domainEntropy > 0.8:
-        return ((usageEntropy + domainEntropy) / 2, "dynamic")
+# Stage checkpoints, disabled unless --checkpoints is used (see main)
+checkpointStore: CheckpointStore = CheckpointStore()
 
-    # Special cases
-    # CASE 3: Usage entropy is too low but domain entropy is high
-    # This IP is likely dynamic if there are enough domain changes, so we set its combined entropy to high
-    if usageEntropy < 0.2 and domainEntropy > 0.8:
-        return (domainEntropy, "dynamic")
 
-    # CASE 4: Usage entropy is high but domain entropy is too low
-    # We will check whether or not this IP has a lot of fingerprints and domains
-    # This IP might be part of a cluster or a proxy block
-    if usageEntropy > 0.8 and domainEntropy < 0.2:
-        fgRatio: float = uniqueBlockFingerprints / blockTrueSize
-        dmRatio: float = uniqueBlockDomains / blockTrueSize
+# Shared by sweep workers, see initSweepWorker()
+sweepData: IpData | None = None
+sweepIpsPerAS: dict[tuple[int, str], np.ndarray] | None = None
 
-        # CASE 4.1: Lots of fingerprints and domains ACROSS THE WHOLE BLOCK,
-        # this IP is likely dynamic and part of a host provider or something similar
-        if fgRatio > 0.5 and dmRatio > 0.5:
-            return (usageEntropy, "dynamic")
 
-        if dmRatio <= 0.5:
-            # CASE 4.2 and 4.3: Few domains ACROSS THE WHOLE BLOCK,
-            # If the amount of fingerprints is significant for this block size,
-            # this IP might be part of a cluster, otherwise it might be a proxy IP
-            if fgRatio >= 0.5:
-                return (usageEntropy, "cluster")
-            else:
-                return (usageEntropy, "proxy")
+def initSweepWorker(
+    data: IpData, ipsPerAS: dict[tuple[int, str], np.ndarray], store: CheckpointStore
+) -> None:
+    """
+    Shares the input data and the IPs per AS with a sweep worker, so they are only sent once per worker.
 
-        # CASE 4.4: Few fingerprints ACROSS THE WHOLE BLOCK, but lots of domains
-        # This should not happen, but if it does, we will consider this IP an outlier and ignore it
-        return (usageEntropy, "outlier")
+    Sweep workers save their own checkpoints, every group of runs has its own checkpoint files.
+    """
 
-    # CASE 5: If an IP doesn't fall into any category stated above, we may have an IP that is not
-    # sufficiently dynamic nor static, so we average entropies and let the smoothing and
-    # sub block processes decide whether or not to include this IP in the resulting dynamic IPs
-    return ((usageEntropy + domainEntropy) / 2, "dynamic")
+    global sweepData, sweepIpsPerAS, checkpointStore
 
+    sweepData = data
+    sweepIpsPerAS = ipsPerAS
+    checkpointStore = store
 
-def findDynamicIps(
-    args: argparse.Namespace,
-    fingerprintsPerIp: dict[str, set[str]],
-    ipsPerFingerprint: dict[str, set[str]],
-    ipFingerprintsOverTime: dict[str, IpTimeSeries],
-) -> tuple[list[str], list[str], list[str]]:
+
+def runSweepGroup(runs: list[argparse.Namespace]) -> list[dict[str, Any]]:
     """
-    Analyzes a collection of IP addresses and applies a set of rules searching for dynamic IP addresses.
+    Runs every sweep run that shares the same blocks (same min block size and max gap size).
 
-    If the log level is set to `DEBUG`, a trace of blocks found will be logged,
-    as well as detailed information about the IPs found in each block.
+    Blocks and entropies are built once, only smoothing and sub block search are done for each run. Every stage is
+    loaded from its checkpoint if available.
 
     Parameters
     ----------
-    `args`: command line arguments
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address
-    `ipsPerFingerprint`: a dict of unique IP addresses found per fingerprint
-    `ipFingerprintsOverTime`: a dict of a timeseries for each IP address
+    `runs`: command line arguments of every run, with the same min block size and max gap size
 
     Returns
     -------
-    A tuple in the following order:
-    `allDynamicIps`: a list of all true + extra dynamic IP addresses found
-    `allProxyIps`: a list of all true + extra proxy IP addresses found
-    `allClusterIps`: a list of all true + extra cluster IP addresses found
+    `results`: output of every run (see `buildOutputData`) and its range rows (see `buildRangeRows`), with the run
+    parameters in every row. IP address lists are only kept if they should be saved as .pickle, and range rows if they
+    should be saved as ranges
     """
 
-    # Init pyasn
-    asndb = pyasn.pyasn(f"{args.cacheFolder}/IPASN.dat")
+    blocks: list[IP_Block] | None = loadBlocksCheckpoint(runs[0])
 
-    # Separate IPs per AS Number and BGP prefix
-    logging.info(
-        f"Finding AS numbers and BGP prefixes for {len(fingerprintsPerIp)} IP addresses"
-    )
-
-    ipsPerAS: dict[tuple[str, str], list[int]] = defaultdict(list)
+    if blocks is None:
+        blocks = buildAllBlocks(runs[0], sweepData, sweepIpsPerAS)
+        saveBlocksCheckpoint(runs[0], blocks)
 
-    for ip in fingerprintsPerIp.keys():
-        (asn, prefix) = asndb.lookup(ip)
+    combinedEntropy: np.ndarray | None = loadEntropyCheckpoint(
+        runs[0], sweepData, blocks
+    )
 
-        if asn == None:
-            continue
+    if combinedEntropy is None:
+        combinedEntropy = calculateCombinedEntropies(runs[0], sweepData, blocks)
+        saveEntropyCheckpoint(runs[0], blocks, combinedEntropy)
 
-        # Convert to integer value for easier block building
-        ipsPerAS[(asn, prefix)].append(int(ipaddress.IPv4Address(ip)))
+    results: list[tuple[dict[str, Any], list[dict[str, Any]]]] = list()
 
-    logging.info(f"Found {len(ipsPerAS)} unique (AS number, prefix) tuples")
-    logging.info(
-        f"Found {sum(len(ips) >= args.minBlockSize for ips in ipsPerAS.values())} ASes with {args.minBlockSize} or more IP addresses"
-    )
+    for runArgs in runs:
+        blockEntropies: list[np.ndarray] | None = loadSmoothingCheckpoint(
+            runArgs, blocks
+        )
 
-    # Start building blocks
-    logging.info(f"Building blocks")
+        if blockEntropies is None:
+            blockEntropies = smoothAllBlocks(runArgs, sweepData, blocks, combinedEntropy)
+            saveSmoothingCheckpoint(runArgs, blockEntropies)
 
-    blocks: list[IP_Block] = list()
+        subBlocks: list[list[IP_Block]] = findAllSubBlocks(
+            runArgs, sweepData, blocks, blockEntropies
+        )
 
-    for ips in ipsPerAS.values():
-        if len(ips) >= args.minBlockSize:
-            ips.sort()
-            blocks.extend(buildBlocks(args, ips, fingerprintsPerIp))
+        runSubBlocks: list[IP_Block] = [
+            subBlock for found in subBlocks for subBlock in found
+        ]
+        shouldSaveRanges: bool = (
+            runArgs.shouldSaveIps and runArgs.outputFormat in RANGE_FORMATS
+        )
 
-    logging.info(f"Built {len(blocks)} blocks")
+        outputData: dict[str, Any] = buildOutputData(
+            runArgs,
+            sweepData,
+            *collectTypedIps(runSubBlocks),
+            shouldFormatIps=runArgs.shouldSaveIps and not shouldSaveRanges,
+        )
 
-    logging.debug("Block data dumps:")
+        rangeRows: list[dict[str, Any]] = list()
 
-    for b in blocks:
-        logging.debug(
-            f"BLOCK  Start: {b.startStr}  End: {b.endStr}  Size: {b.getSize()}  True Size: {b.getTrueSize()}"
-        )
+        if shouldSaveRanges:
+            parameters: dict[str, Any] = {
+                column: outputData[column] for column in SWEEP_COLUMNS
+            }
+            rangeRows = [
+                {**parameters, **row} for row in buildRangeRows(runSubBlocks)
+            ]
 
-        for ip in b.getTrueIps():
-            logging.debug(f"{ip}")
+        results.append((outputData, rangeRows))
 
-        logging.debug("")
+    return results
 
-    # IP Usage-Entropy Computation
-    # Adapted from: 'How Dynamic are IP Addresses?' (https://dl.acm.org/doi/abs/10.1145/1282380.1282415)
-    logging.info(f"Calculating IP Usage-Entropy and IP Domain-Entropy")
 
-    combinedEntropy: dict[str, float] = defaultdict(float)
+def runSweep(
+    args: argparse.Namespace, data: IpData
+) -> list[tuple[dict[str, Any], list[dict[str, Any]]]]:
+    """
+    Runs DynMap for every combination of parameters in a sweep.
 
-    # The analysis is done on a block by block basis
-    for block in blocks:
-        # Calculate amount of unique fingerprints and domains for later use when combining entropies
-        (uniqueDomains, uniqueFingerprints) = getBlockUniqueDataAmount(
-            block.getTrueIps(), ipFingerprintsOverTime
-        )
+    IPs per AS are found once for every run. Blocks and entropies only depend on the min block size and max gap size,
+    so runs are grouped by these, and groups are run on `--workers` worker processes.
 
-        # Track types assigned to IPs by the getCombinedEntropy function, this is used to assign a type to the whole block
-        types: dict[str, int] = {
-            "dynamic": 0,
-            "proxy": 0,
-            "cluster": 0,
-            "outlier": 0,
-            "static": 0,
-        }
+    Parameters
+    ----------
+    `args`: command line arguments
+    `data`: input data
 
-        # We want to know the probability of fingerprints from an IPj from block A
-        # to appear in other IPs from the same block
-        for ip in block.getTrueIps():
-            entropy: float = 0.0
-
-            # We don't build the matrix Aj directly, instead we precalculate the sum of every column
-            # Please refer to the section 4.3 of the paper mentioned above
-            Aj: list[int] = [
-                len(fingerprintsPerIp[ipB].intersection(fingerprintsPerIp[ip]))
-                for ipB in block.getTrueIps()
-                if ipB != ip
-            ]
-            zj: int = sum(Aj)
+    Returns
+    -------
+    `results`: output of every run and its range rows (see `runSweepGroup`), sorted by parameters
+    """
 
-            if zj > 0:
-                entropy = -sum((ak / zj) * math.log2((ak / zj)) for ak in Aj if ak > 0)
+    grid: list[argparse.Namespace] = getSweepGrid(args)
 
-            # Normalized IP Usage Entropy and Normalized Sample IP Usage Entropy
-            nue: float = entropy / math.log2(block.getSize())
-            nsue: float = entropy / math.log2(
-                sum(ak > 0 for ak in Aj) + 1 + int(zj == 0)
-            )
+    logging.info(f"Running a parameter sweep with {len(grid)} parameter combinations")
 
-            # This IP has definitely more than one fingerprint by this point, so
-            # we favor IPs with a domain name change (on a given port) to mitigate the effect of IPs which have
-            # different fingerprints because of SSL certificate renewals
-            # We do this by using a domain name entropy
-            normalizedDomainEntropy: float = calculateDomainNameEntropy(
-                ipFingerprintsOverTime[ip]
-            )
+    ipsPerAS: dict[tuple[int, str], np.ndarray] = findIpsPerAS(args, data)
 
-            # Combine entropies using a set of rules
-            (combinedEntropy[ip], ipType) = getCombinedEntropyAndType(
-                nsue,
-                normalizedDomainEntropy,
-                uniqueDomains,
-                uniqueFingerprints,
-                block.getTrueSize(),
-            )
+    # Runs with the same blocks
+    groups: dict[tuple[int, int], list[argparse.Namespace]] = defaultdict(list)
 
-            types[ipType] += 1
+    for runArgs in grid:
+        groups[(runArgs.minBlockSize, runArgs.maxGapSize)].append(runArgs)
 
-            # Timeseries and entropy debug info
-            logging.debug(f"Time series for IP address: {ip}")
+    with multiprocessing.Pool(
+        max(1, min(args.workers, len(groups))),
+        initializer=initSweepWorker,
+        initargs=(data, ipsPerAS, checkpointStore),
+    ) as pool:
+        groupResults: list[list[tuple[dict[str, Any], list[dict[str, Any]]]]] = (
+            pool.map(runSweepGroup, list(groups.values()))
+        )
 
-            for timestamp, fingerprint, port, domain in ipFingerprintsOverTime[ip]:
-                logging.debug(
-                    f"T: {timestamp}  P: {port}  F: {fingerprint}  D: {domain}"
-                )
+    return [result for results in groupResults for result in results]
 
-            logging.debug(
-                f"IP: {ip}  Entropy: {nsue}  Domain Entropy: {normalizedDomainEntropy}  Combined Entropy: {combinedEntropy[ip]}  Type: {ipType}  Unique Fingerprints: {uniqueFingerprints}  Unique Domains: {uniqueDomains}  Block true size {block.getTrueSize()}"
-            )
-            logging.debug("")
 
-        # Assign a type to this block based on the most prevalent type across its IPs
-        prevalentType: str = max(types, key=types.get)
-        block.setType(prevalentType)
+def buildRangeRows(subBlocks: list[IP_Block]) -> list[dict[str, Any]]:
+    """
+    Builds the output row (see `buildRangeRow`) of every dynamic, proxy and cluster sub block.
+    """
 
-        logging.debug(
-            f"Block true size: {block.getTrueSize()}  Block type: {prevalentType}  Type prevalence: {max(types.values()) / block.getTrueSize()}"
+    return [
+        buildRangeRow(
+            b.start,
+            b.end,
+            b.type,
+            b.getTrueSize(),
+            b.asn,
+            b.prefix,
+            b.entropyStats,
         )
+        for b in subBlocks
+        if b.type in RANGE_TYPES
+    ]
 
-    # Dynamic IP Block identification
-    # Please refer to the section 4.4 of the paper mentioned above
-    # Step 1: Apply median filter method to smooth out dips in IP Usage-Entropy
-    logging.info(f"Smoothing IP Usage-Entropy")
 
-    for block in blocks:
-        blockIps: list[str] = block.getFullIps()
+def countOutputIps(args: argparse.Namespace, ips: list[str]) -> int:
+    """
+    Counts the IP addresses of an output list (see `formatRangeIps`).
+    """
 
-        # Move a sliding window looking for IP addresses to apply smoothing
-        startIdx: int = args.medianFilterWindowSize // 2
-        endIdx: int = block.getSize() - args.medianFilterWindowSize // 2
+    if args.shouldSaveCidrs:
+        return sum(1 << (32 - int(cidr.split("/")[1])) for cidr in ips)
 
-        for idx in range(startIdx, endIdx):
-            sliceStartIdx: int = idx - args.medianFilterWindowSize // 2
-            sliceEndIdx: int = idx + args.medianFilterWindowSize // 2 + 1
+    return len(ips)
 
-            # If an IP has entropy smaller than threshold, apply smoothing
-            # The signal smoothing process can smooth over up to medianFilterWindowSize // 2 consecutive dips
-            if combinedEntropy[blockIps[idx]] < args.entropySmoothingThreshold:
-                slice: list[str] = blockIps[sliceStartIdx:sliceEndIdx]
 
-                combinedEntropy[blockIps[idx]] = statistics.median(
-                    [combinedEntropy[ip] for ip in slice]
-                )
+def saveSweepResults(
+    args: argparse.Namespace,
+    results: list[tuple[dict[str, Any], list[dict[str, Any]]]],
+) -> None:
+    """
+    Saves the results of a parameter sweep as a single .csv table, with one row per parameter combination.
 
-    # Step 2: find sub blocks
-    # We will sequentially segment the IP_Blocks into smaller segments
-    # by discarding the remaining “dips” after signal smoothing
-    logging.info(f"Finding sub blocks")
+    If IP addresses should be saved, every run output is also saved in a single .pickle file or, with a range output
+    format, the ranges of every run are saved in a single range file, with the run parameters in every row.
 
-    subBlocks: list[IP_Block] = list()
+    Parameters
+    ----------
+    `args`: command line arguments
+    `results`: output of every run and its range rows (see `runSweepGroup`)
+    """
 
-    for block in blocks:
-        subBlocks.extend(findSubBlocks(args, block, combinedEntropy, fingerprintsPerIp))
+    filename: str = "dynmap_sweep"
+    columns: list[str] = list(results[0][0].keys())
+
+    with open(f"{filename}.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+
+        for outputData, _ in results:
+            writer.writerow(
+                {
+                    key: (
+                        countOutputIps(args, value)
+                        if isinstance(value, list)
+                        else value
+                    )
+                    for key, value in outputData.items()
+                }
+            )
 
-    logging.info(f"Found {len(subBlocks)} sub blocks")
+    logging.info(f"Parameter sweep results have been written to {filename}.csv")
 
-    # DONE
-    # Collect resulting IPs and finish
-    allDynamicIps: list[str] = list()
-    allProxyIps: list[str] = list()
-    allClusterIps: list[str] = list()
+    if not args.shouldSaveIps:
+        return
 
-    for subBlock in subBlocks:
-        match subBlock.type:
-            case "dynamic":
-                allDynamicIps.extend(subBlock.getFullIps())
+    if args.outputFormat in RANGE_FORMATS:
+        rangeFilename: str = f"{filename}{RANGE_FORMATS[args.outputFormat]}"
 
-            case "proxy":
-                allProxyIps.extend(subBlock.getFullIps())
+        saveRanges(
+            rangeFilename,
+            args.outputFormat,
+            (row for _, rangeRows in results for row in rangeRows),
+            # Parameters and amount of IP addresses of each type of every run
+            {"runs": [outputData for outputData, _ in results]},
+            tuple(SWEEP_COLUMNS),
+        )
 
-            case "cluster":
-                allClusterIps.extend(subBlock.getFullIps())
+        logging.info(
+            f"Dynamic/proxy/cluster IP ranges of every run have been written to {rangeFilename}"
+        )
 
-            case "outlier":
-                pass
+        return
 
-    logging.info(f"Found {len(allDynamicIps)} total dynamic IP addresses")
-    logging.info(f"Found {len(allProxyIps)} total proxy IP addresses")
-    logging.info(f"Found {len(allClusterIps)} total cluster IP addresses")
+    pickle.dump(
+        [outputData for outputData, _ in results], open(f"{filename}.pickle", "wb")
+    )
 
     logging.info(
-        f"Total extra IP adresses: {sum(b.getSize() for b in subBlocks) - sum(b.getTrueSize() for b in subBlocks)}"
+        f"Total dynamic/proxy/cluster IP addresses of every run have been written to {filename}.pickle"
     )
 
-    return (allDynamicIps, allProxyIps, allClusterIps)
-
 
-def loadDataFromCache(
-    args: argparse.Namespace,
-) -> tuple[dict[str, set[str]], dict[str, set[str]], dict[str, IpTimeSeries]]:
+def loadDataFromCache(args: argparse.Namespace) -> IpData:
     """
     Loads input data from disk if available. Input data needs to be generated by a preprocessing script.
 
@@ -720,16 +2512,9 @@ def loadDataFromCache(
 
     Returns
     -------
-    A tuple in the following order:
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address
-    `ipsPerFingerprint`: a dict of unique IP addresses found per fingerprint
-    `ipFingerprintsOverTime`: a dict of a timeseries for each IP address
+    `data`: compact input data
     """
 
-    fingerprintsPerIp: dict[str, set[str]] = dict()
-    ipsPerFingerprint: dict[str, set[str]] = dict()
-    ipFingerprintsOverTime: dict[str, IpTimeSeries] = dict()
-
     # Checking for IPASN.dat cache
     logging.info("Searching for IPASN cache file: IPASN.dat")
 
@@ -773,42 +2558,100 @@ def loadDataFromCache(
 
         logging.info(f"IPASN cache data has been saved to {args.cacheFolder}/")
 
-    # Checking for input data
-    filenameFPI: str = f"{args.cacheFolder}/FPI.pickle"
-    filenameIPF: str = f"{args.cacheFolder}/IPF.pickle"
-    filenameIFOT: str = f"{args.cacheFolder}/IFOT.pickle"
+    # Checking for input data of each selected module
+    if args.modules is not None:
+        inputFolders: list[str] = getInputFolders(args)
 
-    logging.info(
-        f"Searching for DynMap input files: {filenameFPI}, {filenameIPF}, {filenameIFOT}"
-    )
+        for inputFolder in inputFolders:
+            logging.info(f"Searching for DynMap input data at {inputFolder}/")
 
-    cacheIsAvailable: bool = (
-        pathlib.Path(filenameFPI).is_file()
-        and pathlib.Path(filenameIPF).is_file()
-        and pathlib.Path(filenameIFOT).is_file()
-    )
+            if not isCacheAvailable(inputFolder):
+                logging.error(f"Input data not available at {inputFolder}/")
 
-    if cacheIsAvailable:
+                logging.info(
+                    f"Please preprocess your data source first, with every module in {', '.join(args.modules)}."
+                )
+                exit(0)
+
+        logging.info("Loading cached data")
+
+        return IpData.fromCaches(inputFolders)
+
+    # Checking for input data
+    logging.info(f"Searching for DynMap input data at {args.cacheFolder}/")
+
+    if isCacheAvailable(args.cacheFolder):
         logging.info(f"Input data found at {args.cacheFolder}/")
         logging.info("Loading cached data")
 
-        fingerprintsPerIp = pickle.load(open(filenameFPI, "rb"))
-        ipsPerFingerprint = pickle.load(open(filenameIPF, "rb"))
-        ipFingerprintsOverTime = pickle.load(open(filenameIFOT, "rb"))
-    else:
-        logging.error(f"Input data not available at {args.cacheFolder}/")
+        return IpData.fromCache(args.cacheFolder)
 
-        logging.info(f"Please preprocess your data source first.")
-        exit(0)
+    # Legacy input data: IFOT.pickle holds every time series, FPI.pickle and IPF.pickle are derived from it
+    filenameIFOT: str = f"{args.cacheFolder}/IFOT.pickle"
+
+    if pathlib.Path(filenameIFOT).is_file():
+        logging.info(f"Legacy input data found at {args.cacheFolder}/")
+        logging.info("Loading cached data")
 
-    return (fingerprintsPerIp, ipsPerFingerprint, ipFingerprintsOverTime)
+        ipFingerprintsOverTime: dict[str, IpTimeSeries] = pickle.load(
+            open(filenameIFOT, "rb")
+        )
 
+        return IpData.fromTimeSeries(ipFingerprintsOverTime)
 
-def validateArgs(args: argparse.Namespace) -> None:
+    logging.error(f"Input data not available at {args.cacheFolder}/")
+
+    logging.info(f"Please preprocess your data source first.")
+    exit(0)
+
+
+def getInputFolders(args: argparse.Namespace) -> list[str]:
+    """
+    Gets the folders with the input data of a run: a subfolder of the cache folder per selected module, or the cache
+    folder itself if no module is selected.
     """
-    Validates command line arguments.
 
-    Exits if any argument is invalid.
+    if args.modules is None:
+        return [args.cacheFolder]
+
+    return [f"{args.cacheFolder}/{module}" for module in dict.fromkeys(args.modules)]
+
+
+def getInputFiles(args: argparse.Namespace) -> list[str]:
+    """
+    Gets the paths to every input file of a run (IPASN.dat and the input data that was loaded), used to key checkpoints.
+    """
+
+    inputFiles: list[str] = [f"{args.cacheFolder}/IPASN.dat"]
+
+    for inputFolder in getInputFolders(args):
+        if not isCacheAvailable(inputFolder):
+            inputFiles.append(f"{inputFolder}/IFOT.pickle")
+            continue
+
+        cacheDir: str = f"{inputFolder}/{CACHE_DIRNAME}"
+
+        inputFiles.extend(
+            f"{cacheDir}/{filename}"
+            for filename in [
+                "metadata.json",
+                "fingerprints.pickle",
+                "domains.pickle",
+                *(
+                    f"{column}.npy"
+                    for column in getCacheColumns(loadMetadata(cacheDir))
+                ),
+            ]
+        )
+
+    return inputFiles
+
+
+def validateParameters(args: argparse.Namespace) -> None:
+    """
+    Validates DynMap parameters.
+
+    Exits if any parameter is invalid.
 
     Parameters
     ----------
@@ -841,6 +2684,54 @@ def validateArgs(args: argparse.Namespace) -> None:
         )
         exit(4)
 
+
+def validateArgs(args: argparse.Namespace) -> None:
+    """
+    Validates command line arguments.
+
+    Exits if any argument is invalid.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    """
+
+    if args.workers < 1:
+        logging.error(f"At least one worker is needed")
+        exit(4)
+
+    if args.traceSampleRate <= 0.0 or args.traceSampleRate > 1.0:
+        logging.error(f"Trace sample rate should be in the interval (0.0, 1.0]")
+        exit(4)
+
+    if (
+        args.outputFormat in RANGE_FORMATS
+        and args.outputFormat not in getAvailableFormats()
+    ):
+        logging.error(
+            f"Output format '{args.outputFormat}' is not available, please install pyarrow"
+        )
+        exit(4)
+
+    if isSweep(args):
+        # Every combination must be valid
+        for runArgs in getSweepGrid(args):
+            validateParameters(runArgs)
+
+        logging.info("Starting DynMap parameter sweep")
+        logging.info("Selected parameters:")
+        logging.info(f"Min block sizes: {args.sweepBlockSizes or [args.minBlockSize]}")
+        logging.info(f"Max gap sizes: {args.sweepGapSizes or [args.maxGapSize]}")
+        logging.info(
+            f"Entropy smoothing thresholds: {args.sweepThresholds or [args.entropySmoothingThreshold]}"
+        )
+        logging.info(
+            f"Median filter window sizes: {args.sweepWindowSizes or [args.medianFilterWindowSize]}"
+        )
+        return
+
+    validateParameters(args)
+
     # Feedback
     logging.info("Starting DynMap")
     logging.info("Selected parameters:")
@@ -874,40 +2765,110 @@ if __name__ == "__main__":
 
     validateArgs(args)
 
-    # Step 1: Get fingerprints per IP address and IP addresses per fingerprint
-    (fingerprintsPerIp, ipsPerFingerprint, ipFingerprintsOverTime) = loadDataFromCache(
-        args
-    )
+    # Stage timings, memory and item counts
+    if args.profileFile is not None:
+        profiler = StageProfiler("dynmap.py", enabled=True)
+
+    # Step 1: Get fingerprints and time series per IP address
+    with profiler.stage("load_input") as items:
+        data: IpData = loadDataFromCache(args)
+
+        items["ips"] = data.getSize()
+        items["observations"] = len(data.seriesTimestamps)
+        items["fingerprints"] = data.totalFingerprints
+
+    # Checkpoints are kept per input data, so changed input data never reuses them
+    if args.shouldCheckpoint:
+        with profiler.stage("checkpoint_hash") as items:
+            checkpointStore = CheckpointStore(
+                f"{args.cacheFolder}/checkpoints", hashInputFiles(getInputFiles(args))
+            )
+
+            items["files"] = len(getInputFiles(args))
+
+        logging.info(f"Checkpoints are kept at {checkpointStore.folder}/")
 
     # Step 2: Apply rules to filter out dynamic ips
     logging.info("Starting analysis")
 
-    dynamicIps, proxyIps, clusterIps = findDynamicIps(
-        args, fingerprintsPerIp, ipsPerFingerprint, ipFingerprintsOverTime
-    )
+    # Parameter sweep, results of every run are saved to a single table
+    if isSweep(args):
+        with profiler.stage("sweep") as items:
+            results: list[tuple[dict[str, Any], list[dict[str, Any]]]] = runSweep(
+                args, data
+            )
 
-    # Step 3: Save results to a .pickle file
-    if args.shouldSaveIps:
-        dynamicIps.sort()
-        proxyIps.sort()
-        clusterIps.sort()
+            items["runs"] = len(results)
 
-        filename: str = f"dynmap_b{args.minBlockSize}_g{args.maxGapSize}_t{args.entropySmoothingThreshold}_w{args.medianFilterWindowSize}"
+        with profiler.stage("output"):
+            saveSweepResults(args, results)
 
-        outputData: dict[str, Any] = {
-            "min_block_size": args.minBlockSize,
-            "max_gap_size": args.maxGapSize,
-            "smoothing_threshold": args.entropySmoothingThreshold,
-            "median_window_size": args.medianFilterWindowSize,
-            "total_input_ips": len(fingerprintsPerIp),
-            "total_output_ips": len(dynamicIps) + len(proxyIps) + len(clusterIps),
-            "dynamic_ips": dynamicIps,
-            "proxy_ips": proxyIps,
-            "cluster_ips": clusterIps,
-        }
+        if args.profileFile is not None:
+            profiler.save(args.profileFile, vars(args))
 
-        pickle.dump(outputData, open(f"{filename}.pickle", "wb"))
+            logging.info(f"Profiling report has been written to {args.profileFile}")
 
-        logging.info(
-            f"Total dynamic/proxy/cluster IP addresses have been written to {filename}.pickle"
+        exit(0)
+
+    # Structured trace, records are only built for traced blocks
+    if args.traceFile is not None:
+        traceSink = TraceSink(
+            args.traceFile,
+            args.traceAsns,
+            args.tracePrefixes,
+            args.traceSampleRate,
+            args.shouldTraceTimeSeries,
+        )
+
+    subBlocks: list[IP_Block] = findDynamicIps(args, data)
+
+    with profiler.stage("collect") as items:
+        dynamicIps, proxyIps, clusterIps = collectTypedIps(subBlocks)
+
+        items["sub_blocks"] = len(subBlocks)
+
+    if args.traceFile is not None:
+        traceSink.close()
+
+        logging.info(f"Trace records have been written to {args.traceFile}")
+
+    # Step 3: Save results to a .pickle file, or as IP ranges
+    with profiler.stage("output") as items:
+        items["output_ips"] = (
+            countRangeIps(dynamicIps)
+            + countRangeIps(proxyIps)
+            + countRangeIps(clusterIps)
         )
+
+        if args.shouldSaveIps and args.outputFormat in RANGE_FORMATS:
+            filename: str = f"dynmap_b{args.minBlockSize}_g{args.maxGapSize}_t{args.entropySmoothingThreshold}_w{args.medianFilterWindowSize}{RANGE_FORMATS[args.outputFormat]}"
+
+            saveRanges(
+                filename,
+                args.outputFormat,
+                buildRangeRows(subBlocks),
+                # Parameters and amount of IP addresses of each type
+                buildOutputData(
+                    args, data, dynamicIps, proxyIps, clusterIps, shouldFormatIps=False
+                ),
+            )
+
+            logging.info(f"Dynamic/proxy/cluster IP ranges have been written to {filename}")
+
+        elif args.shouldSaveIps:
+            filename: str = f"dynmap_b{args.minBlockSize}_g{args.maxGapSize}_t{args.entropySmoothingThreshold}_w{args.medianFilterWindowSize}"
+
+            outputData: dict[str, Any] = buildOutputData(
+                args, data, dynamicIps, proxyIps, clusterIps
+            )
+
+            pickle.dump(outputData, open(f"{filename}.pickle", "wb"))
+
+            logging.info(
+                f"Total dynamic/proxy/cluster IP addresses have been written to {filename}.pickle"
+            )
+
+    if args.profileFile is not None:
+        profiler.save(args.profileFile, vars(args))
+
+        logging.info(f"Profiling report has been written to {args.profileFile}")
@@ -0,0 +1,1312 @@
+# Needed for analysis
+import os
+import json
+import array
+import socket
+import ipaddress
+import numpy as np
+import datetime as dt
+
+# Code quality
+import pickle
+from typing import Iterable
+
+# IP address time series
+IpTimeSeries = list[tuple[dt.datetime, str, int, str]]
+"""
+List of time series entries, each as a tuple (timestamp, fingerprint, port, domain)
+"""
+
+# Epoch used by timestamps in the columnar cache
+EPOCH: dt.datetime = dt.datetime(1970, 1, 1)
+ONE_SECOND: dt.timedelta = dt.timedelta(seconds=1)
+
+# Columnar cache
+CACHE_DIRNAME: str = "observations"
+CACHE_VERSION: int = 2
+
+# Column name -> dtype, every column is stored as a .npy file
+CACHE_COLUMNS: dict[str, type] = {
+    "ip": np.uint32,
+    "ts": np.int64,
+    "fingerprint_id": np.int32,
+    "port": np.uint16,
+    "domain_id": np.int32,
+}
+
+# Columns of compacted tables only, every row is a run of identical observations (see `Observations.compact`): `ts`
+# is the first time the run was seen, `last_ts` the last time and `count` its amount of observations
+RUN_COLUMNS: dict[str, type] = {
+    "last_ts": np.int64,
+    "count": np.int32,
+}
+
+# Column name -> array.array type code with the same dtype, used while rows are appended (see `ObservationBuilder`)
+BUILDER_TYPECODES: dict[str, str] = {
+    "ip": "I",
+    "ts": "q",
+    "fingerprint_id": "i",
+    "port": "H",
+    "domain_id": "i",
+}
+
+# Per IP summaries, derived from the columns when the cache is saved (see `summarizeIps`)
+SUMMARY_DIRNAME: str = "summaries"
+
+# Summary name -> dtype, every summary is stored as a .npy file. Per IP data is stored in CSR form (see `IpData`),
+# offsets always end with the amount of values
+SUMMARY_ARRAYS: dict[str, type] = {
+    "ips": np.uint32,
+    "series_offsets": np.int64,
+    "fingerprint_offsets": np.int64,
+    "fingerprint_ids": np.int32,
+    "domain_offsets": np.int64,
+    "domain_ids": np.int32,
+    "port_offsets": np.int64,
+    "ports": np.uint16,
+    "port_fingerprint_counts": np.int32,
+    "port_domain_counts": np.int32,
+}
+
+
+def ipToStr(ip: int) -> str:
+    """
+    Formats an integer IPv4 address as a dotted string.
+    """
+
+    return str(ipaddress.IPv4Address(ip))
+
+
+def rangesToCidrs(ranges: Iterable[tuple[int, int]]) -> list[str]:
+    """
+    Summarizes ranges of integer IPv4 addresses (`start`, `end`, inclusive) as the smallest list of CIDR blocks
+    covering them. Overlapping and adjacent ranges are merged, CIDR blocks are sorted by address.
+    """
+
+    cidrs: list[str] = list()
+    merged: list[list[int]] = list()
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    for start, end in merged:
+        cidrs.extend(
+            map(
+                str,
+                ipaddress.summarize_address_range(
+                    ipaddress.IPv4Address(start), ipaddress.IPv4Address(end)
+                ),
+            )
+        )
+
+    return cidrs
+
+
+def toEpochSeconds(timestamp: dt.datetime) -> int:
+    """
+    Converts a timestamp to epoch seconds. Naive timestamps (e.g. from Shodan) are considered UTC.
+    """
+
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(dt.timezone.utc).replace(tzinfo=None)
+
+    return (timestamp - EPOCH) // ONE_SECOND
+
+
+def gatherSlices(
+    offsets: np.ndarray, values: np.ndarray, indices: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gathers the CSR slices `values[offsets[i]:offsets[i + 1]]` for every i in `indices`.
+
+    Parameters
+    ----------
+    `offsets`: CSR offsets, one more than the amount of rows.
+    `values`: CSR values.
+    `indices`: rows to gather, in the desired order.
+
+    Returns
+    -------
+    A tuple in the following order:
+    `gatheredOffsets`: CSR offsets of the gathered rows.
+    `gatheredValues`: CSR values of the gathered rows.
+    """
+
+    starts: np.ndarray = offsets[indices]
+    counts: np.ndarray = offsets[indices + 1] - starts
+
+    gatheredOffsets: np.ndarray = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(counts, out=gatheredOffsets[1:])
+
+    # Position of every gathered value in the original values array
+    positions: np.ndarray = np.arange(gatheredOffsets[-1], dtype=np.int64) + np.repeat(
+        starts - gatheredOffsets[:-1], counts
+    )
+
+    return (gatheredOffsets, values[positions])
+
+
+def findUniquePerGroup(
+    groups: np.ndarray, values: np.ndarray, totalGroups: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the unique values of every group, e.g. the unique fingerprint IDs of every IP.
+
+    Parameters
+    ----------
+    `groups`: group of every value, between 0 and 2^31
+    `values`: values (non-negative integers below 2^32)
+    `totalGroups`: amount of groups
+
+    Returns
+    -------
+    A tuple in the following order, in CSR form indexed by group:
+    `offsets`: offsets of every group
+    `uniqueValues`: sorted unique values of every group
+    """
+
+    pairs: np.ndarray = np.unique(
+        (np.asarray(groups, dtype=np.int64) << 32) | np.asarray(values, dtype=np.int64)
+    )
+
+    offsets: np.ndarray = np.zeros(totalGroups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs >> 32, minlength=totalGroups), out=offsets[1:])
+
+    return (offsets, pairs & 0xFFFFFFFF)
+
+
+def summarizeIps(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Derives the per IP summaries of an observation table sorted by IP (see `SUMMARY_ARRAYS`).
+
+    - Unique IPs and the offsets of their rows (`series_offsets`)
+    - Unique fingerprints and domains of every IP (sorted IDs)
+    - Ports of every IP (sorted), with the amount of unique fingerprints and domains seen on every port
+
+    These only depend on the observations, so they are computed once, when the cache is saved, instead of on every
+    DynMap run.
+
+    Parameters
+    ----------
+    `columns`: columns of the observation table
+
+    Returns
+    -------
+    `summaries`: per IP summaries, by name
+    """
+
+    ipColumn: np.ndarray = columns["ip"]
+
+    # Rows of an IP are contiguous, so series offsets are where the IP changes
+    seriesOffsets: np.ndarray = np.zeros(1, dtype=np.int64)
+
+    if len(ipColumn) > 0:
+        seriesOffsets = np.concatenate(
+            (
+                [0],
+                np.flatnonzero(ipColumn[1:] != ipColumn[:-1]) + 1,
+                [len(ipColumn)],
+            )
+        ).astype(np.int64)
+
+    totalIps: int = len(seriesOffsets) - 1
+    rowIdx: np.ndarray = np.repeat(
+        np.arange(totalIps, dtype=np.int64), np.diff(seriesOffsets)
+    )
+
+    (fingerprintOffsets, fingerprintIds) = findUniquePerGroup(
+        rowIdx, columns["fingerprint_id"], totalIps
+    )
+    (domainOffsets, domainIds) = findUniquePerGroup(
+        rowIdx, columns["domain_id"], totalIps
+    )
+
+    # (IP, port) pairs, sorted by IP and then by port
+    (ipPorts, portGroups) = np.unique(
+        (rowIdx << 16) | np.asarray(columns["port"], dtype=np.int64), return_inverse=True
+    )
+    del rowIdx
+
+    portOffsets: np.ndarray = np.zeros(totalIps + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ipPorts >> 16, minlength=totalIps), out=portOffsets[1:])
+
+    summaries: dict[str, np.ndarray] = {
+        "ips": ipColumn[seriesOffsets[:-1]],
+        "series_offsets": seriesOffsets,
+        "fingerprint_offsets": fingerprintOffsets,
+        "fingerprint_ids": fingerprintIds,
+        "domain_offsets": domainOffsets,
+        "domain_ids": domainIds,
+        "port_offsets": portOffsets,
+        "ports": ipPorts & 0xFFFF,
+        "port_fingerprint_counts": np.diff(
+            findUniquePerGroup(portGroups, columns["fingerprint_id"], len(ipPorts))[0]
+        ),
+        "port_domain_counts": np.diff(
+            findUniquePerGroup(portGroups, columns["domain_id"], len(ipPorts))[0]
+        ),
+    }
+
+    return {
+        name: np.asarray(summaries[name], dtype=dtype)
+        for name, dtype in SUMMARY_ARRAYS.items()
+    }
+
+
+def concatenateSummaries(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """
+    Concatenates the per IP summaries of observation tables with disjoint, increasing IP addresses (e.g. shards
+    from `Observations.split`). Offsets of every part are shifted by the values of the parts before it.
+    """
+
+    summaries: dict[str, np.ndarray] = dict()
+
+    for name, dtype in SUMMARY_ARRAYS.items():
+        if not name.endswith("offsets"):
+            summaries[name] = np.concatenate(
+                [part[name] for part in parts] + [np.zeros(0, dtype=dtype)]
+            )
+            continue
+
+        shifted: list[np.ndarray] = list()
+        total: int = 0
+
+        for part in parts:
+            shifted.append(part[name][:-1] + total)
+            total += int(part[name][-1])
+
+        summaries[name] = np.concatenate(
+            shifted + [np.array([total], dtype=np.int64)]
+        ).astype(dtype)
+
+    return summaries
+
+
+class Observations:
+    """
+    A table of observations, one row per (ip, ts, fingerprint_id, port, domain_id), plus the
+    dictionaries used to encode fingerprints and domains as integer IDs.
+
+    Rows are sorted by IP and then by timestamp. This is the content of the columnar cache.
+    """
+
+    def __init__(
+        self,
+        columns: dict[str, np.ndarray],
+        fingerprints: list[str],
+        domains: list[str],
+    ):
+        self.columns: dict[str, np.ndarray] = columns
+        self.fingerprints: list[str] = fingerprints
+        self.domains: list[str] = domains
+
+    @classmethod
+    def fromTimeSeries(
+        cls, ipFingerprintsOverTime: dict[str, IpTimeSeries]
+    ) -> "Observations":
+        """
+        Builds an observation table from a dict of time series per IP address.
+
+        Parameters
+        ----------
+        `ipFingerprintsOverTime`: a dict of a timeseries for each IP address
+
+        Returns
+        -------
+        `observations`: observation table sorted by IP and timestamp
+        """
+
+        builder: ObservationBuilder = ObservationBuilder()
+
+        for ip, timeSeries in ipFingerprintsOverTime.items():
+            for timestamp, fingerprint, port, domain in timeSeries:
+                builder.add(ip, timestamp, fingerprint, port, domain)
+
+        return builder.build()
+
+    @classmethod
+    def concatenate(cls, parts: list["Observations"]) -> "Observations":
+        """
+        Concatenates observation tables (e.g. from different files) into a single table sorted by IP and timestamp.
+
+        Every table has its own dictionaries, so fingerprint and domain IDs are remapped to merged dictionaries.
+        Rows with the same IP and timestamp keep the order of `parts`.
+
+        Parameters
+        ----------
+        `parts`: observation tables to concatenate
+
+        Returns
+        -------
+        `observations`: concatenated observation table
+        """
+
+        fingerprintIdsByName: dict[str, int] = dict()
+        domainIdsByName: dict[str, int] = dict()
+
+        # Rows of tables that are not compacted are runs of a single observation
+        isCompacted: bool = any(part.isCompacted() for part in parts)
+        columnTypes: dict[str, type] = {
+            **CACHE_COLUMNS,
+            **(RUN_COLUMNS if isCompacted else dict()),
+        }
+
+        columns: dict[str, list[np.ndarray]] = {column: list() for column in columnTypes}
+
+        for part in parts:
+            # Old ID -> new ID
+            fingerprintMap: np.ndarray = np.array(
+                [
+                    fingerprintIdsByName.setdefault(fingerprint, len(fingerprintIdsByName))
+                    for fingerprint in part.fingerprints
+                ],
+                dtype=np.int32,
+            )
+            domainMap: np.ndarray = np.array(
+                [
+                    domainIdsByName.setdefault(domain, len(domainIdsByName))
+                    for domain in part.domains
+                ],
+                dtype=np.int32,
+            )
+
+            columns["ip"].append(part.columns["ip"])
+            columns["ts"].append(part.columns["ts"])
+            columns["fingerprint_id"].append(fingerprintMap[part.columns["fingerprint_id"]])
+            columns["port"].append(part.columns["port"])
+            columns["domain_id"].append(domainMap[part.columns["domain_id"]])
+
+            if isCompacted:
+                for column, values in part.getRunColumns().items():
+                    columns[column].append(values)
+
+        observations: Observations = cls(
+            columns={
+                column: np.concatenate(columns.pop(column) + [np.zeros(0, dtype=dtype)])
+                for column, dtype in columnTypes.items()
+            },
+            fingerprints=list(fingerprintIdsByName.keys()),
+            domains=list(domainIdsByName.keys()),
+        )
+        observations.sort()
+
+        return observations
+
+    @classmethod
+    def load(cls, cacheFolder: str) -> "Observations":
+        """
+        Loads an observation table, along with its dictionaries, from a columnar cache. Columns are memory-mapped.
+        """
+
+        cacheDir: str = os.path.join(cacheFolder, CACHE_DIRNAME)
+
+        return cls(
+            columns=loadColumns(cacheDir),
+            fingerprints=loadDictionary(cacheDir, "fingerprints"),
+            domains=loadDictionary(cacheDir, "domains"),
+        )
+
+    def getSize(self) -> int:
+        return len(self.columns["ip"])
+
+    def isCompacted(self) -> bool:
+        return "count" in self.columns
+
+    def getRunColumns(self) -> dict[str, np.ndarray]:
+        """
+        Gets the run columns (see `RUN_COLUMNS`). Every row of a table that is not compacted is a single observation.
+        """
+
+        if self.isCompacted():
+            return {column: self.columns[column] for column in RUN_COLUMNS}
+
+        return {
+            "last_ts": self.columns["ts"],
+            "count": np.ones(self.getSize(), dtype=RUN_COLUMNS["count"]),
+        }
+
+    def sort(self) -> None:
+        """
+        Sorts rows by IP and then by timestamp. The sort is stable.
+        """
+
+        order: np.ndarray = np.lexsort((self.columns["ts"], self.columns["ip"]))
+
+        for column in self.columns:
+            self.columns[column] = self.columns[column][order]
+
+    def compact(self) -> "Observations":
+        """
+        Collapses runs of identical observations into a single row.
+
+        Shodan scans every port of an IP on its own, so the observations of an IP are split in one stream per port,
+        and consecutive observations of a stream with the same fingerprint and domain are a run. Every run keeps the
+        time of its first observation (`ts`), of its last observation (`last_ts`) and its amount of observations
+        (`count`). Unique fingerprints, domains and ports of every IP (and of every port of an IP) stay the same, so
+        DynMap results are identical.
+
+        Compacted tables can be compacted again (e.g. after being concatenated), runs are then merged.
+
+        Returns
+        -------
+        `observations`: compacted observation table sorted by IP and timestamp
+        """
+
+        order: np.ndarray = np.lexsort(
+            (self.columns["ts"], self.columns["port"], self.columns["ip"])
+        )
+        columns: dict[str, np.ndarray] = {
+            column: values[order]
+            for column, values in {**self.columns, **self.getRunColumns()}.items()
+        }
+
+        # A row repeats the previous one if the stream, the fingerprint and the domain are the same, otherwise it
+        # starts a run
+        isRepeated: np.ndarray = np.ones(self.getSize(), dtype=bool)
+        isRepeated[:1] = False
+
+        for column in ("ip", "port", "fingerprint_id", "domain_id"):
+            isRepeated[1:] &= columns[column][1:] == columns[column][:-1]
+
+        starts: np.ndarray = np.flatnonzero(~isRepeated)
+
+        runs: dict[str, np.ndarray] = {
+            column: columns[column][starts] for column in CACHE_COLUMNS
+        }
+
+        if len(starts) > 0:
+            runs["last_ts"] = np.maximum.reduceat(columns["last_ts"], starts)
+            runs["count"] = np.add.reduceat(columns["count"], starts).astype(
+                RUN_COLUMNS["count"]
+            )
+        else:
+            runs.update(
+                {column: np.zeros(0, dtype=dtype) for column, dtype in RUN_COLUMNS.items()}
+            )
+
+        observations: Observations = Observations(runs, self.fingerprints, self.domains)
+        observations.sort()
+
+        return observations
+
+    def selectRows(self, mask: np.ndarray | slice) -> "Observations":
+        """
+        Selects a subset of rows. Dictionaries are compacted, so only fingerprints and domains still in use are kept.
+
+        Parameters
+        ----------
+        `mask`: boolean mask (or slice) of rows to keep
+
+        Returns
+        -------
+        `observations`: observation table with the selected rows
+        """
+
+        columns: dict[str, np.ndarray] = {
+            column: values[mask] for column, values in self.columns.items()
+        }
+
+        (usedFingerprints, columns["fingerprint_id"]) = np.unique(
+            columns["fingerprint_id"], return_inverse=True
+        )
+        (usedDomains, columns["domain_id"]) = np.unique(
+            columns["domain_id"], return_inverse=True
+        )
+
+        columns["fingerprint_id"] = columns["fingerprint_id"].astype(np.int32)
+        columns["domain_id"] = columns["domain_id"].astype(np.int32)
+
+        return Observations(
+            columns=columns,
+            fingerprints=[self.fingerprints[i] for i in usedFingerprints.tolist()],
+            domains=[self.domains[i] for i in usedDomains.tolist()],
+        )
+
+    def getIpQuantiles(self, count: int) -> list[int]:
+        """
+        Gets the IP addresses at `count` evenly spaced rows, starting at the first row. Every IP address stands for the
+        same amount of rows, so the quantiles of several tables can be combined (see `findShardBoundaries`).
+
+        Parameters
+        ----------
+        `count`: amount of quantiles, fewer are returned if the table has fewer rows
+
+        Returns
+        -------
+        `quantiles`: sorted IP addresses, empty if the table is empty
+        """
+
+        size: int = self.getSize()
+        count = min(count, size)
+
+        return self.columns["ip"][(np.arange(count) * size) // max(count, 1)].tolist()
+
+    def split(self, boundaries: list[int]) -> dict[int, "Observations"]:
+        """
+        Splits the table in shards by IP range, shard `i` holds the IPs from `boundaries[i - 1]` (included) to
+        `boundaries[i]` (not included).
+
+        Shards are disjoint ranges of IP addresses, so concatenating them in shard order keeps rows sorted.
+
+        Parameters
+        ----------
+        `boundaries`: sorted first IP address of every shard but the first (see `findShardBoundaries`)
+
+        Returns
+        -------
+        `shards`: dict of non-empty observation tables per shard
+        """
+
+        # Rows are sorted by IP, so every shard is a contiguous range of rows
+        bounds: list[int] = (
+            [0]
+            + np.searchsorted(self.columns["ip"], boundaries, side="left").tolist()
+            + [self.getSize()]
+        )
+
+        return {
+            shard: self.selectRows(slice(start, end))
+            for shard, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+            if end > start
+        }
+
+    def save(self, cacheFolder: str, metadata: dict[str, object]) -> str:
+        """
+        Saves the observation table as a columnar cache (one .npy file per column) in `cacheFolder`.
+
+        Parameters
+        ----------
+        `cacheFolder`: cache folder, the table is saved in a subfolder
+        `metadata`: extra metadata saved along with the table (e.g. module used)
+
+        Returns
+        -------
+        `cacheDir`: folder where the table has been saved
+        """
+
+        return saveObservationParts(
+            cacheFolder, [self], self.getSize(), metadata, self.isCompacted()
+        )
+
+
+class ObservationBuilder:
+    """
+    Builds an observation table one row at a time, e.g. while banners are decoded.
+
+    Rows are appended to typed arrays and fingerprints and domains are dictionary-encoded as they are added, so every
+    row takes a few bytes instead of a tuple with a datetime and two strings.
+    """
+
+    def __init__(self):
+        self.columns: dict[str, array.array] = {
+            column: array.array(typecode) for column, typecode in BUILDER_TYPECODES.items()
+        }
+
+        self.ipIntsByName: dict[str, int] = dict()
+        self.fingerprintIdsByName: dict[str, int] = dict()
+        self.domainIdsByName: dict[str, int] = dict()
+
+    def getSize(self) -> int:
+        return len(self.columns["ip"])
+
+    def add(
+        self, ip: str, timestamp: dt.datetime, fingerprint: str, port: int, domain: str
+    ) -> None:
+        """
+        Appends an observation. Naive timestamps are considered UTC (see `toEpochSeconds`).
+        """
+
+        ipInt: int | None = self.ipIntsByName.get(ip)
+
+        if ipInt is None:
+            ipInt = int.from_bytes(socket.inet_aton(ip), "big")
+            self.ipIntsByName[ip] = ipInt
+
+        self.columns["ip"].append(ipInt)
+        self.columns["ts"].append(toEpochSeconds(timestamp))
+        self.columns["fingerprint_id"].append(
+            self.fingerprintIdsByName.setdefault(fingerprint, len(self.fingerprintIdsByName))
+        )
+        self.columns["port"].append(port)
+        self.columns["domain_id"].append(
+            self.domainIdsByName.setdefault(domain, len(self.domainIdsByName))
+        )
+
+    def build(self) -> Observations:
+        """
+        Builds the observation table, sorted by IP and timestamp with a single lexsort over every row.
+
+        IDs are renumbered in order of first appearance by IP, so the table does not depend on the order in which
+        different IPs were added.
+
+        Returns
+        -------
+        `observations`: observation table sorted by IP and timestamp
+        """
+
+        columns: dict[str, np.ndarray] = {
+            column: np.array(self.columns[column], dtype=dtype)
+            for column, dtype in CACHE_COLUMNS.items()
+        }
+
+        # Rows of every IP, in the order they were added
+        ipOrder: np.ndarray = np.argsort(columns["ip"], kind="stable")
+
+        (columns["fingerprint_id"], fingerprints) = renumberByFirstAppearance(
+            columns["fingerprint_id"], list(self.fingerprintIdsByName.keys()), ipOrder
+        )
+        (columns["domain_id"], domains) = renumberByFirstAppearance(
+            columns["domain_id"], list(self.domainIdsByName.keys()), ipOrder
+        )
+
+        observations: Observations = Observations(columns, fingerprints, domains)
+        observations.sort()
+
+        return observations
+
+
+def renumberByFirstAppearance(
+    ids: np.ndarray, names: list[str], order: np.ndarray
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Renumbers dictionary IDs in order of their first appearance when rows are read in `order`.
+
+    Parameters
+    ----------
+    `ids`: ID of every row
+    `names`: dictionary, indexed by ID
+    `order`: order in which rows are read
+
+    Returns
+    -------
+    A tuple in the following order:
+    `ids`: new ID of every row
+    `names`: new dictionary, indexed by new ID
+    """
+
+    (_, firstPositions) = np.unique(ids[order], return_index=True)
+
+    # Old IDs sorted by first appearance, i.e. new ID -> old ID
+    oldIds: np.ndarray = ids[order][np.sort(firstPositions)]
+
+    newIds: np.ndarray = np.empty(len(names), dtype=np.int32)
+    newIds[oldIds] = np.arange(len(oldIds), dtype=np.int32)
+
+    return (newIds[ids], [names[i] for i in oldIds.tolist()])
+
+
+def findShardBoundaries(
+    quantiles: list[list[int]], rows: list[int], totalShards: int
+) -> list[int]:
+    """
+    Picks IP addresses that split several tables in shards with about the same amount of rows, from the IP quantiles
+    of every table (see `Observations.getIpQuantiles`). Tables are then split with `Observations.split`.
+
+    Every quantile of a table stands for the same share of its rows, so the boundaries are the quantiles of the
+    combined rows. Rows of an IP address are never split across shards, so shards may be fewer than `totalShards`.
+
+    Parameters
+    ----------
+    `quantiles`: IP quantiles of every table
+    `rows`: amount of rows of every table
+    `totalShards`: amount of shards wanted
+
+    Returns
+    -------
+    `boundaries`: sorted first IP address of every shard but the first
+    """
+
+    ips: np.ndarray = np.concatenate(
+        [np.array(tableQuantiles, dtype=np.int64) for tableQuantiles in quantiles]
+        + [np.zeros(0, dtype=np.int64)]
+    )
+    weights: np.ndarray = np.concatenate(
+        [
+            np.full(len(tableQuantiles), tableRows / max(len(tableQuantiles), 1))
+            for tableQuantiles, tableRows in zip(quantiles, rows)
+        ]
+        + [np.zeros(0)]
+    )
+
+    if len(ips) == 0:
+        return list()
+
+    order: np.ndarray = np.argsort(ips, kind="stable")
+    (ips, cumulativeRows) = (ips[order], np.cumsum(weights[order]))
+
+    # Rows before each quantile of the combined rows
+    targets: np.ndarray = cumulativeRows[-1] * np.arange(1, totalShards) / totalShards
+    boundaries: np.ndarray = ips[
+        np.minimum(np.searchsorted(cumulativeRows, targets, side="left") + 1, len(ips) - 1)
+    ]
+
+    # Shards that would start at the first IP address would be empty
+    return np.unique(boundaries[boundaries > ips[0]]).tolist()
+
+
+def saveObservationParts(
+    cacheFolder: str,
+    parts: Iterable[Observations],
+    totalRows: int,
+    metadata: dict[str, object],
+    isCompacted: bool = False,
+) -> str:
+    """
+    Saves a sequence of observation tables as a single columnar cache (one .npy file per column) in `cacheFolder`.
+
+    Parts are written one at a time to memory mapped files, so they can be loaded lazily (e.g. from a generator)
+    and only one part is in memory at any time. Rows are written in the order of `parts`, which should already
+    be sorted by IP and timestamp when concatenated (e.g. shards from `Observations.split`), and no IP should be
+    in more than one part.
+
+    Per IP summaries (see `summarizeIps`) are computed for every part and saved in the `summaries/` subfolder.
+
+    Compacted tables (see `Observations.compact`) are saved with their run columns, and the total amount of
+    observations across all runs is saved in the metadata. Run columns of a compacted table saved before in the same
+    folder are removed when the table is not compacted.
+
+    Parameters
+    ----------
+    `cacheFolder`: cache folder, the table is saved in a subfolder
+    `parts`: observation tables to save, every table has its own dictionaries
+    `totalRows`: total amount of rows across all parts
+    `metadata`: extra metadata saved along with the table (e.g. module used)
+    `isCompacted`: whether parts are compacted tables
+
+    Returns
+    -------
+    `cacheDir`: folder where the table has been saved
+    """
+
+    cacheDir: str = os.path.join(cacheFolder, CACHE_DIRNAME)
+    os.makedirs(cacheDir, exist_ok=True)
+
+    # Metadata is removed first and written last, so a partially written cache is never considered valid
+    metadataPath: str = os.path.join(cacheDir, "metadata.json")
+
+    if os.path.exists(metadataPath):
+        os.remove(metadataPath)
+
+    # Run columns of a compacted table saved here before are not part of a table that is not compacted
+    if not isCompacted:
+        for column in RUN_COLUMNS:
+            columnPath: str = os.path.join(cacheDir, f"{column}.npy")
+
+            if os.path.exists(columnPath):
+                os.remove(columnPath)
+
+    columns: dict[str, np.ndarray] = {
+        column: np.lib.format.open_memmap(
+            os.path.join(cacheDir, f"{column}.npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(totalRows,),
+        )
+        for column, dtype in getCacheColumns({"compacted": isCompacted}).items()
+    }
+
+    fingerprintIdsByName: dict[str, int] = dict()
+    domainIdsByName: dict[str, int] = dict()
+
+    # Summaries are much smaller than the columns, so they are kept until every part is written
+    summaryParts: list[dict[str, np.ndarray]] = list()
+
+    position: int = 0
+
+    for part in parts:
+        # Old ID -> new ID
+        fingerprintMap: np.ndarray = np.array(
+            [
+                fingerprintIdsByName.setdefault(fingerprint, len(fingerprintIdsByName))
+                for fingerprint in part.fingerprints
+            ],
+            dtype=np.int32,
+        )
+        domainMap: np.ndarray = np.array(
+            [
+                domainIdsByName.setdefault(domain, len(domainIdsByName))
+                for domain in part.domains
+            ],
+            dtype=np.int32,
+        )
+
+        rows: slice = slice(position, position + part.getSize())
+
+        columns["ip"][rows] = part.columns["ip"]
+        columns["ts"][rows] = part.columns["ts"]
+        columns["fingerprint_id"][rows] = fingerprintMap[part.columns["fingerprint_id"]]
+        columns["port"][rows] = part.columns["port"]
+        columns["domain_id"][rows] = domainMap[part.columns["domain_id"]]
+
+        if isCompacted:
+            for column, values in part.getRunColumns().items():
+                columns[column][rows] = values
+
+        summaryParts.append(
+            summarizeIps({column: columns[column][rows] for column in CACHE_COLUMNS})
+        )
+
+        position += part.getSize()
+
+    if position != totalRows:
+        raise ValueError(f"Expected {totalRows} rows, {position} rows were written")
+
+    for column in columns.values():
+        column.flush()
+
+    # Every row of a compacted table is a run of observations
+    runMetadata: dict[str, object] = dict()
+
+    if isCompacted:
+        runMetadata = {"compacted": True, "observations": int(columns["count"].sum())}
+
+    del columns
+
+    summaryDir: str = os.path.join(cacheDir, SUMMARY_DIRNAME)
+    os.makedirs(summaryDir, exist_ok=True)
+
+    for name, values in concatenateSummaries(summaryParts).items():
+        np.save(os.path.join(summaryDir, f"{name}.npy"), values)
+
+    pickle.dump(
+        list(fingerprintIdsByName.keys()),
+        open(os.path.join(cacheDir, "fingerprints.pickle"), "wb"),
+    )
+    pickle.dump(
+        list(domainIdsByName.keys()), open(os.path.join(cacheDir, "domains.pickle"), "wb")
+    )
+
+    json.dump(
+        {
+            "version": CACHE_VERSION,
+            "rows": totalRows,
+            "fingerprints": len(fingerprintIdsByName),
+            "domains": len(domainIdsByName),
+            **runMetadata,
+            **metadata,
+        },
+        open(metadataPath, "w"),
+        indent=4,
+    )
+
+    return cacheDir
+
+
+def isCacheAvailable(cacheFolder: str) -> bool:
+    """
+    Checks whether a columnar cache is available in `cacheFolder`.
+    """
+
+    return os.path.isfile(os.path.join(cacheFolder, CACHE_DIRNAME, "metadata.json"))
+
+
+def getCacheColumns(metadata: dict[str, object]) -> dict[str, type]:
+    """
+    Gets the columns of a columnar cache (name -> dtype) given its metadata, run columns included if it is compacted.
+    """
+
+    return {**CACHE_COLUMNS, **(RUN_COLUMNS if metadata.get("compacted") else dict())}
+
+
+def loadMetadata(cacheDir: str) -> dict[str, object]:
+    """
+    Loads the metadata of a columnar cache.
+    """
+
+    return json.load(open(os.path.join(cacheDir, "metadata.json")))
+
+
+def loadColumns(cacheDir: str) -> dict[str, np.ndarray]:
+    """
+    Memory-maps every column of a columnar cache.
+    """
+
+    return {
+        column: np.load(os.path.join(cacheDir, f"{column}.npy"), mmap_mode="r")
+        for column in getCacheColumns(loadMetadata(cacheDir))
+    }
+
+
+def loadDictionary(cacheDir: str, name: str) -> list[str]:
+    """
+    Loads a dictionary (`fingerprints` or `domains`) from a columnar cache.
+    """
+
+    return pickle.load(open(os.path.join(cacheDir, f"{name}.pickle"), "rb"))
+
+
+class IpData:
+    """
+    Compact, array-backed input data for DynMap.
+
+    IP addresses are kept as a sorted uint32 array. Fingerprints and domains are interned, so every
+    fingerprint or domain is stored once and referenced by an integer ID everywhere else.
+
+    Per IP data is stored in CSR (compressed sparse row) form: the data of the i-th IP
+    is `values[offsets[i]:offsets[i + 1]]`.
+
+    - Unique fingerprints per IP: `fingerprintOffsets`, `fingerprintIds` (sorted for every IP)
+    - Unique domains per IP: `domainOffsets`, `domainIds` (sorted for every IP)
+    - Ports per IP: `portOffsets`, `ports` (sorted for every IP), with the amount of unique fingerprints and domains
+      seen on every port: `portFingerprintCounts`, `portDomainCounts`
+    - Time series per IP: `seriesOffsets`, `seriesTimestamps`, `seriesFingerprints`, `seriesPorts`, `seriesDomains`
+      (sorted by timestamp for every IP, timestamps are epoch seconds). If the data is compacted (see
+      `Observations.compact`), every entry is a run of observations, with the time of its last observation and its
+      amount of observations in `seriesLastTimestamps` and `seriesCounts` (None otherwise)
+
+    Fingerprint and domain dictionaries are only needed to print data, so they are loaded lazily from the cache.
+    """
+
+    def __init__(
+        self,
+        ips: np.ndarray,
+        totalFingerprints: int,
+        fingerprintOffsets: np.ndarray,
+        fingerprintIds: np.ndarray,
+        domainOffsets: np.ndarray,
+        domainIds: np.ndarray,
+        portOffsets: np.ndarray,
+        ports: np.ndarray,
+        portFingerprintCounts: np.ndarray,
+        portDomainCounts: np.ndarray,
+        seriesOffsets: np.ndarray,
+        seriesTimestamps: np.ndarray,
+        seriesFingerprints: np.ndarray,
+        seriesPorts: np.ndarray,
+        seriesDomains: np.ndarray,
+        seriesLastTimestamps: np.ndarray | None = None,
+        seriesCounts: np.ndarray | None = None,
+        fingerprints: list[str] | None = None,
+        domains: list[str] | None = None,
+        cacheDir: str | None = None,
+    ):
+        self.ips: np.ndarray = ips
+        self.totalFingerprints: int = totalFingerprints
+
+        self.fingerprintOffsets: np.ndarray = fingerprintOffsets
+        self.fingerprintIds: np.ndarray = fingerprintIds
+
+        self.domainOffsets: np.ndarray = domainOffsets
+        self.domainIds: np.ndarray = domainIds
+
+        self.portOffsets: np.ndarray = portOffsets
+        self.ports: np.ndarray = ports
+        self.portFingerprintCounts: np.ndarray = portFingerprintCounts
+        self.portDomainCounts: np.ndarray = portDomainCounts
+
+        self.seriesOffsets: np.ndarray = seriesOffsets
+        self.seriesTimestamps: np.ndarray = seriesTimestamps
+        self.seriesFingerprints: np.ndarray = seriesFingerprints
+        self.seriesPorts: np.ndarray = seriesPorts
+        self.seriesDomains: np.ndarray = seriesDomains
+        self.seriesLastTimestamps: np.ndarray | None = seriesLastTimestamps
+        self.seriesCounts: np.ndarray | None = seriesCounts
+
+        self.fingerprints: list[str] | None = fingerprints
+        self.domains: list[str] | None = domains
+        self.cacheDir: str | None = cacheDir
+
+    @classmethod
+    def fromObservations(
+        cls,
+        observations: Observations,
+        totalFingerprints: int | None = None,
+        cacheDir: str | None = None,
+        summaries: dict[str, np.ndarray] | None = None,
+    ) -> "IpData":
+        """
+        Builds compact input data from an observation table sorted by IP and timestamp.
+
+        Time series are the table columns themselves (no copy is made, so memory-mapped columns stay memory-mapped).
+        Per IP summaries are derived from the table, unless already given (e.g. loaded from the cache).
+
+        Parameters
+        ----------
+        `observations`: observation table
+        `totalFingerprints`: amount of fingerprints in the dictionary, if it is not loaded
+        `cacheDir`: folder of the columnar cache, used to load dictionaries lazily
+        `summaries`: per IP summaries of the table (see `summarizeIps`)
+
+        Returns
+        -------
+        `data`: compact input data
+        """
+
+        columns: dict[str, np.ndarray] = observations.columns
+
+        if summaries is None:
+            summaries = summarizeIps(columns)
+
+        hasDictionaries: bool = totalFingerprints is None
+
+        return cls(
+            ips=summaries["ips"],
+            totalFingerprints=(
+                len(observations.fingerprints) if hasDictionaries else totalFingerprints
+            ),
+            fingerprintOffsets=summaries["fingerprint_offsets"],
+            fingerprintIds=summaries["fingerprint_ids"],
+            domainOffsets=summaries["domain_offsets"],
+            domainIds=summaries["domain_ids"],
+            portOffsets=summaries["port_offsets"],
+            ports=summaries["ports"],
+            portFingerprintCounts=summaries["port_fingerprint_counts"],
+            portDomainCounts=summaries["port_domain_counts"],
+            seriesOffsets=summaries["series_offsets"],
+            seriesTimestamps=columns["ts"],
+            seriesFingerprints=columns["fingerprint_id"],
+            seriesPorts=columns["port"],
+            seriesDomains=columns["domain_id"],
+            seriesLastTimestamps=columns.get("last_ts"),
+            seriesCounts=columns.get("count"),
+            fingerprints=observations.fingerprints if hasDictionaries else None,
+            domains=observations.domains if hasDictionaries else None,
+            cacheDir=cacheDir,
+        )
+
+    @classmethod
+    def fromCache(cls, cacheFolder: str) -> "IpData":
+        """
+        Loads compact input data from a columnar cache. Columns are memory-mapped and
+        dictionaries are only loaded when needed.
+
+        Per IP summaries are loaded from the cache, caches saved by previous versions (without summaries) are
+        summarized when loaded.
+        """
+
+        cacheDir: str = os.path.join(cacheFolder, CACHE_DIRNAME)
+        metadata: dict[str, object] = loadMetadata(cacheDir)
+
+        observations: Observations = Observations(
+            columns=loadColumns(cacheDir),
+            fingerprints=list(),
+            domains=list(),
+        )
+
+        summaries: dict[str, np.ndarray] | None = None
+
+        if metadata.get("version", 1) >= 2:
+            summaries = {
+                name: np.load(os.path.join(cacheDir, SUMMARY_DIRNAME, f"{name}.npy"))
+                for name in SUMMARY_ARRAYS
+            }
+
+        return cls.fromObservations(
+            observations,
+            totalFingerprints=metadata["fingerprints"],
+            cacheDir=cacheDir,
+            summaries=summaries,
+        )
+
+    @classmethod
+    def fromCaches(cls, cacheFolders: list[str]) -> "IpData":
+        """
+        Loads compact input data from one or more columnar caches (e.g. one per Shodan module), analyzed together.
+
+        A single cache is loaded as in `fromCache`. Several caches are concatenated into a single table, with merged
+        dictionaries, so their columns are loaded into memory and per IP summaries are derived from the merged table.
+        """
+
+        if len(cacheFolders) == 1:
+            return cls.fromCache(cacheFolders[0])
+
+        return cls.fromObservations(
+            Observations.concatenate(
+                [Observations.load(cacheFolder) for cacheFolder in cacheFolders]
+            )
+        )
+
+    @classmethod
+    def fromTimeSeries(
+        cls, ipFingerprintsOverTime: dict[str, IpTimeSeries]
+    ) -> "IpData":
+        """
+        Builds compact input data from a dict of time series per IP address (legacy IFOT.pickle input).
+        """
+
+        return cls.fromObservations(
+            Observations.fromTimeSeries(ipFingerprintsOverTime)
+        )
+
+    def select(self, indices: np.ndarray) -> "IpData":
+        """
+        Selects a subset of IP addresses, e.g. to send only the data of some blocks to a worker process.
+
+        Fingerprint and domain IDs are kept, so results computed on the subset are identical.
+        Dictionaries are only kept if they are already loaded, otherwise they are loaded lazily from the cache.
+
+        Parameters
+        ----------
+        `indices`: sorted indices of the IPs to select
+
+        Returns
+        -------
+        `data`: input data with the selected IPs only
+        """
+
+        (fingerprintOffsets, fingerprintIds) = gatherSlices(
+            self.fingerprintOffsets, self.fingerprintIds, indices
+        )
+        (domainOffsets, domainIds) = gatherSlices(
+            self.domainOffsets, self.domainIds, indices
+        )
+
+        # Every port column has the same offsets
+        (portOffsets, ports) = gatherSlices(self.portOffsets, self.ports, indices)
+
+        # Every series column has the same offsets
+        (seriesOffsets, seriesTimestamps) = gatherSlices(
+            self.seriesOffsets, self.seriesTimestamps, indices
+        )
+
+        return IpData(
+            ips=self.ips[indices],
+            totalFingerprints=self.totalFingerprints,
+            fingerprintOffsets=fingerprintOffsets,
+            fingerprintIds=fingerprintIds,
+            domainOffsets=domainOffsets,
+            domainIds=domainIds,
+            portOffsets=portOffsets,
+            ports=ports,
+            portFingerprintCounts=gatherSlices(
+                self.portOffsets, self.portFingerprintCounts, indices
+            )[1],
+            portDomainCounts=gatherSlices(self.portOffsets, self.portDomainCounts, indices)[1],
+            seriesOffsets=seriesOffsets,
+            seriesTimestamps=seriesTimestamps,
+            seriesFingerprints=gatherSlices(
+                self.seriesOffsets, self.seriesFingerprints, indices
+            )[1],
+            seriesPorts=gatherSlices(self.seriesOffsets, self.seriesPorts, indices)[1],
+            seriesDomains=gatherSlices(self.seriesOffsets, self.seriesDomains, indices)[1],
+            seriesLastTimestamps=(
+                gatherSlices(self.seriesOffsets, self.seriesLastTimestamps, indices)[1]
+                if self.isCompacted()
+                else None
+            ),
+            seriesCounts=(
+                gatherSlices(self.seriesOffsets, self.seriesCounts, indices)[1]
+                if self.isCompacted()
+                else None
+            ),
+            fingerprints=self.fingerprints,
+            domains=self.domains,
+            cacheDir=self.cacheDir,
+        )
+
+    def getSize(self) -> int:
+        return len(self.ips)
+
+    def isCompacted(self) -> bool:
+        return self.seriesCounts is not None
+
+    def getObservationCount(self, idx: int) -> int:
+        """
+        Gets the amount of observations of the IP at index `idx`. Entries of compacted data are runs of observations,
+        so their counts are added.
+        """
+
+        start: int = self.seriesOffsets[idx]
+        end: int = self.seriesOffsets[idx + 1]
+
+        if self.isCompacted():
+            return int(self.seriesCounts[start:end].sum())
+
+        return int(end - start)
+
+    def getFingerprint(self, fingerprintId: int) -> str:
+        if self.fingerprints is None:
+            self.fingerprints = loadDictionary(self.cacheDir, "fingerprints")
+
+        return self.fingerprints[fingerprintId]
+
+    def getDomain(self, domainId: int) -> str:
+        if self.domains is None:
+            self.domains = loadDictionary(self.cacheDir, "domains")
+
+        return self.domains[domainId]
+
+    def getFingerprintCounts(self) -> np.ndarray:
+        return np.diff(self.fingerprintOffsets)
+
+    def getIndices(self, ips: np.ndarray) -> np.ndarray:
+        """
+        Finds the index of every IP address (as integers) in this data. All IPs must be present.
+        """
+
+        return np.searchsorted(self.ips, ips)
+
+    def contains(self, ips: np.ndarray) -> np.ndarray:
+        """
+        Checks whether each IP address (as integers) is present in this data.
+        """
+
+        if self.getSize() == 0:
+            return np.zeros(len(ips), dtype=bool)
+
+        indices: np.ndarray = np.searchsorted(self.ips, ips)
+        indices[indices == len(self.ips)] = 0
+
+        return self.ips[indices] == ips
+
+    def getRange(self, start: int, end: int) -> tuple[int, int]:
+        """
+        Gets the indices of the IP addresses between `start` and `end` (inclusive), as a range `[lo, hi)`.
+        """
+
+        # Bounds are cast to the dtype of the IPs, otherwise every search would copy the IPs to a common dtype
+        return (
+            int(np.searchsorted(self.ips, np.uint32(start), side="left")),
+            int(np.searchsorted(self.ips, np.uint32(end), side="right")),
+        )
+
+    def getIpFingerprints(self, idx: int) -> np.ndarray:
+        return self.fingerprintIds[
+            self.fingerprintOffsets[idx] : self.fingerprintOffsets[idx + 1]
+        ]
+
+    def getTimeSeries(
+        self, idx: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gets the time series of the IP at index `idx` as (timestamps, fingerprint IDs, ports, domain IDs) arrays.
+        """
+
+        start: int = self.seriesOffsets[idx]
+        end: int = self.seriesOffsets[idx + 1]
+
+        return (
+            self.seriesTimestamps[start:end],
+            self.seriesFingerprints[start:end],
+            self.seriesPorts[start:end],
+            self.seriesDomains[start:end],
+        )
+
+    def getIpsPerFingerprint(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Derives the unique IPs per fingerprint (the inverse of unique fingerprints per IP).
+        DynMap does not need it, so it is never stored.
+
+        Returns
+        -------
+        A tuple in the following order, in CSR form indexed by fingerprint ID:
+        `offsets`: offsets of every fingerprint
+        `ipIndices`: sorted indices of IPs (in this data) of every fingerprint
+        """
+
+        order: np.ndarray = np.argsort(self.fingerprintIds, kind="stable")
+
+        offsets: np.ndarray = np.zeros(self.totalFingerprints + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.fingerprintIds, minlength=self.totalFingerprints),
+            out=offsets[1:],
+        )
+
+        ipIndices: np.ndarray = np.repeat(
+            np.arange(self.getSize(), dtype=np.int64), self.getFingerprintCounts()
+        )[order]
+
+        return (offsets, ipIndices)
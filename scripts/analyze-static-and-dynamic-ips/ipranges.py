@@ -0,0 +1,289 @@
+# Needed for analysis
+import gzip
+import json
+import numpy as np
+
+# Code consistency
+from typing import Any, Iterable
+
+# Compact input data
+from ipdata import ipToStr, rangesToCidrs
+
+# Optional Parquet support
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Output formats, by file extension
+RANGE_FORMATS: dict[str, str] = {
+    "jsonl": ".jsonl.gz",
+    "parquet": ".parquet",
+}
+
+# IP types saved in the output
+RANGE_TYPES: tuple[str, ...] = ("dynamic", "proxy", "cluster")
+
+# Parameter columns of the ranges saved by a parameter sweep, with their Parquet types
+SWEEP_COLUMNS: dict[str, str] = {
+    "min_block_size": "int64",
+    "max_gap_size": "int64",
+    "smoothing_threshold": "float64",
+    "median_window_size": "int64",
+}
+
+
+def getAvailableFormats() -> list[str]:
+    """
+    Gets every range output format available. Parquet needs pyarrow.
+    """
+
+    return [
+        outputFormat
+        for outputFormat in RANGE_FORMATS
+        if outputFormat != "parquet" or pyarrow is not None
+    ]
+
+
+def buildRangeRow(
+    start: int,
+    end: int,
+    ipType: str,
+    trueSize: int,
+    asn: int | None,
+    prefix: str | None,
+    entropyStats: tuple[float, float, float] | None,
+) -> dict[str, Any]:
+    """
+    Builds the output row of an IP range (a sub block found by DynMap).
+
+    Parameters
+    ----------
+    `start`: first IP address of the range, as an integer
+    `end`: last IP address of the range (inclusive), as an integer
+    `ipType`: type of every IP address in the range (e.g. `dynamic`)
+    `trueSize`: amount of IP addresses in the range found in the input data
+    `asn`: AS number of the block the range was found in
+    `prefix`: BGP prefix of the block the range was found in
+    `entropyStats`: smoothed entropy of the IP addresses in the range, as (min, mean, max)
+
+    Returns
+    -------
+    `row`: range data, with the range as integers, strings and its minimal CIDR cover
+    """
+
+    (minEntropy, meanEntropy, maxEntropy) = entropyStats or (None, None, None)
+
+    return {
+        "start": start,
+        "end": end,
+        "start_ip": ipToStr(start),
+        "end_ip": ipToStr(end),
+        "cidrs": rangesToCidrs([(start, end)]),
+        "type": ipType,
+        "size": end - start + 1,
+        "true_size": trueSize,
+        "asn": asn,
+        "prefix": prefix,
+        "min_entropy": minEntropy,
+        "mean_entropy": meanEntropy,
+        "max_entropy": maxEntropy,
+    }
+
+
+def saveRanges(
+    filepath: str,
+    outputFormat: str,
+    rows: Iterable[dict[str, Any]],
+    metadata: dict[str, Any],
+    parameterColumns: tuple[str, ...] = (),
+) -> None:
+    """
+    Saves IP ranges as a gzipped JSON Lines or Parquet file.
+
+    JSON Lines files start with a line holding the metadata, as `{"metadata": {...}}`, followed by one range per line.
+    Parquet files hold one range per row, and the metadata is saved as JSON in the schema metadata (`dynmap` key).
+
+    Parameters
+    ----------
+    `filepath`: path to the output file
+    `outputFormat`: one of `jsonl` or `parquet`
+    `rows`: ranges, see `buildRangeRow`. Rows are sorted by parameters and then by start IP address
+    `metadata`: parameters of the run, saved as is
+    `parameterColumns`: run parameters (see `SWEEP_COLUMNS`) also saved in every row, used to save the ranges of
+    every run of a parameter sweep in a single file
+    """
+
+    rows = sorted(
+        rows,
+        key=lambda row: (
+            *(row[column] for column in parameterColumns),
+            row["start"],
+            row["end"],
+        ),
+    )
+
+    if outputFormat == "jsonl":
+        with gzip.open(filepath, "wt", encoding="utf-8") as file:
+            file.write(json.dumps({"metadata": metadata}) + "\n")
+
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+
+        return
+
+    if outputFormat != "parquet":
+        raise ValueError(f"Unknown range output format '{outputFormat}'")
+
+    if pyarrow is None:
+        raise ImportError("pyarrow is needed to save ranges as Parquet")
+
+    schema = pyarrow.schema(
+        [
+            *(
+                (column, getattr(pyarrow, SWEEP_COLUMNS[column])())
+                for column in parameterColumns
+            ),
+            ("start", pyarrow.uint32()),
+            ("end", pyarrow.uint32()),
+            ("start_ip", pyarrow.string()),
+            ("end_ip", pyarrow.string()),
+            ("cidrs", pyarrow.list_(pyarrow.string())),
+            ("type", pyarrow.string()),
+            ("size", pyarrow.int64()),
+            ("true_size", pyarrow.int64()),
+            ("asn", pyarrow.int64()),
+            ("prefix", pyarrow.string()),
+            ("min_entropy", pyarrow.float64()),
+            ("mean_entropy", pyarrow.float64()),
+            ("max_entropy", pyarrow.float64()),
+        ],
+        metadata={"dynmap": json.dumps(metadata)},
+    )
+
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows, schema=schema), filepath)
+
+
+class IpRanges:
+    """
+    IP ranges saved by DynMap (see `saveRanges`), loaded for membership tests.
+
+    Ranges of the same type are merged into sorted, disjoint intervals, so a batch of IPs is tested with a single
+    binary search per type.
+
+    - Intervals per type: `starts[type]`, `ends[type]` (inclusive)
+    - `rows`: every range as saved, `metadata`: parameters of the run
+    """
+
+    def __init__(self, rows: list[dict[str, Any]], metadata: dict[str, Any]):
+        self.rows: list[dict[str, Any]] = rows
+        self.metadata: dict[str, Any] = metadata
+
+        self.starts: dict[str, np.ndarray] = dict()
+        self.ends: dict[str, np.ndarray] = dict()
+
+        for ipType in RANGE_TYPES:
+            merged: list[list[int]] = list()
+
+            for start, end in sorted(
+                (row["start"], row["end"]) for row in rows if row["type"] == ipType
+            ):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+
+            intervals: np.ndarray = np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+            self.starts[ipType] = intervals[:, 0]
+            self.ends[ipType] = intervals[:, 1]
+
+    @classmethod
+    def fromFile(
+        cls, filepath: str, parameters: dict[str, Any] | None = None
+    ) -> "IpRanges":
+        """
+        Loads ranges from a file saved by `saveRanges`, the format is given by the file extension.
+
+        Files saved by a parameter sweep hold the ranges of every run, the ranges (and metadata) of a single run are
+        selected by its `parameters` (e.g. `{"min_block_size": 8, "max_gap_size": 8, "smoothing_threshold": 0.5,
+        "median_window_size": 5}`).
+        """
+
+        if filepath.endswith(RANGE_FORMATS["parquet"]):
+            if pyarrow is None:
+                raise ImportError("pyarrow is needed to load ranges from Parquet")
+
+            table = pyarrow.parquet.read_table(filepath)
+            metadata: dict[str, Any] = json.loads(
+                (table.schema.metadata or dict()).get(b"dynmap", b"{}")
+            )
+            rows: list[dict[str, Any]] = table.to_pylist()
+        else:
+            with gzip.open(filepath, "rt", encoding="utf-8") as file:
+                metadata = json.loads(file.readline())["metadata"]
+                rows = [json.loads(line) for line in file]
+
+        if parameters is not None:
+            rows = [
+                row
+                for row in rows
+                if all(row.get(key) == value for key, value in parameters.items())
+            ]
+
+            for run in metadata.get("runs", list()):
+                if all(run.get(key) == value for key, value in parameters.items()):
+                    metadata = run
+
+        return cls(rows, metadata)
+
+    def contains(self, ips: np.ndarray, ipType: str | None = None) -> np.ndarray:
+        """
+        Checks whether each IP address (as integers) is in a range of the given type, or of any type if not given.
+        """
+
+        ips = np.asarray(ips, dtype=np.int64)
+        found: np.ndarray = np.zeros(len(ips), dtype=bool)
+
+        for rangeType in RANGE_TYPES if ipType is None else (ipType,):
+            starts: np.ndarray = self.starts[rangeType]
+
+            # Last interval starting at or before each IP
+            intervals: np.ndarray = np.searchsorted(starts, ips, side="right") - 1
+
+            inRange: np.ndarray = intervals >= 0
+            inRange[inRange] = ips[inRange] <= self.ends[rangeType][intervals[inRange]]
+
+            found |= inRange
+
+        return found
+
+    def getTypes(self, ips: np.ndarray) -> list[str | None]:
+        """
+        Gets the type of each IP address (as integers), None for IPs that are not in any range.
+        """
+
+        types: list[str | None] = [None] * len(ips)
+
+        for ipType in RANGE_TYPES:
+            for idx in np.flatnonzero(self.contains(ips, ipType)).tolist():
+                types[idx] = ipType
+
+        return types
+
+    def getCidrs(self, ipType: str) -> list[str]:
+        """
+        Gets the minimal CIDR cover of every range of the given type.
+        """
+
+        return rangesToCidrs(
+            zip(self.starts[ipType].tolist(), self.ends[ipType].tolist())
+        )
+
+    def getSize(self, ipType: str) -> int:
+        """
+        Gets the amount of IP addresses in ranges of the given type.
+        """
+
+        return int((self.ends[ipType] - self.starts[ipType] + 1).sum())
@@ -0,0 +1,158 @@
+# Needed for analysis
+import sys
+import json
+import pathlib
+
+# Code consistency
+from typing import Any, Callable, Iterator
+
+# Optional fast JSON backends, stdlib json is used if none is available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Shared modules are in the repository root
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))
+
+from modules.bz2reader import open_lines
+
+
+# JSON backend
+JsonLoads = Callable[[bytes], Any]
+"""
+Function that decodes a JSON document given as bytes
+"""
+
+
+def getAvailableBackends() -> dict[str, JsonLoads]:
+    """
+    Gets every JSON backend installed, fastest first.
+
+    Returns
+    -------
+    `backends`: dict of a decoding function for each backend name
+    """
+
+    backends: dict[str, JsonLoads] = dict()
+
+    if orjson is not None:
+        backends["orjson"] = orjson.loads
+
+    if simdjson is not None:
+        backends["simdjson"] = simdjson.loads
+
+    backends["json"] = json.loads
+
+    return backends
+
+
+def getBackend(name: str) -> tuple[str, JsonLoads]:
+    """
+    Gets a JSON backend by name. `auto` selects the fastest backend installed.
+
+    Backends are selected by name (instead of passing functions around) so they can be used in worker processes.
+
+    Parameters
+    ----------
+    `name`: backend name, one of `auto`, `orjson`, `simdjson` or `json`
+
+    Returns
+    -------
+    A tuple in the following order:
+    `name`: name of the selected backend
+    `loads`: decoding function of the selected backend
+    """
+
+    backends: dict[str, JsonLoads] = getAvailableBackends()
+
+    if name == "auto":
+        name = next(iter(backends))
+
+    if name not in backends:
+        raise ValueError(f"JSON backend '{name}' is not installed")
+
+    return (name, backends[name])
+
+
+def buildModuleFilter(moduleNames: list[str]) -> Callable[[bytes], bool]:
+    """
+    Builds a cheap pre-filter for raw banners (one JSON document per line), given the target modules.
+
+    A banner of a target module must have the module name as a JSON string somewhere in the line, so lines without any
+    of them are skipped without being decoded. Lines that pass the filter may still be of another module (e.g. the name
+    is found in another field), so banners must be checked again after decoding.
+
+    Parameters
+    ----------
+    `moduleNames`: names of the target modules
+
+    Returns
+    -------
+    `moduleFilter`: function that returns whether a raw banner may be of a target module
+    """
+
+    patterns: list[bytes] = [f'"{name}"'.encode() for name in moduleNames]
+
+    def moduleFilter(line: bytes) -> bool:
+        for pattern in patterns:
+            if pattern in line:
+                return True
+
+        return False
+
+    return moduleFilter
+
+
+def decodeBanners(
+    filepath: str, moduleNames: list[str], backend: str = "auto", workers: int = 1
+) -> Iterator[dict[Any, Any]]:
+    """
+    Decodes Shodan banners from a .json or .json.bz2 file.
+
+    Compressed files have one banner per line, lines that can't be of a target module are skipped before decoding.
+    They are decompressed by `modules.bz2reader`, on several processes if `workers` is greater than one.
+    Uncompressed files are a single JSON list, so every banner is returned.
+
+    If the selected backend fails to decode a banner (e.g. values only accepted by stdlib json, such as NaN),
+    stdlib json is used for that banner.
+
+    Parameters
+    ----------
+    `filepath`: path to the file. Be careful when using relative paths.
+    `moduleNames`: names of the target modules
+    `backend`: JSON backend name (see `getBackend`)
+    `workers`: amount of processes used to decompress the file. Must be 1 inside `multiprocessing.Pool` workers
+
+    Returns
+    -------
+    `banners`: iterator of decoded banners
+    """
+
+    (_, loads) = getBackend(backend)
+
+    if not filepath.endswith(".json.bz2"):
+        with open(filepath, "rb") as file:
+            try:
+                yield from loads(file.read())
+            except ValueError:
+                file.seek(0)
+                yield from json.load(file)
+
+        return
+
+    moduleFilter: Callable[[bytes], bool] = buildModuleFilter(moduleNames)
+
+    for line in open_lines(filepath, workers):
+        if not moduleFilter(line):
+            continue
+
+        try:
+            yield loads(line)
+        except ValueError:
+            yield json.loads(line)
@@ -2,8 +2,10 @@
 
 # Needed for analysis
 import os
-import bz2
 import json
+import shutil
+import hashlib
+import tempfile
 import datetime as dt
 import multiprocessing
 from itertools import repeat
@@ -16,10 +18,25 @@ import argparse
 
 # Code consistency
 from typing import Any, Callable, Optional
+from multiprocessing.pool import Pool
 from pydantic import BaseModel, ValidationError
 
-# DynMap timeseries definition
-from dynmap import IpTimeSeries
+# DynMap input data
+from ipdata import (
+    ObservationBuilder,
+    Observations,
+    findShardBoundaries,
+    saveObservationParts,
+)
+
+# JSON decoding
+from jsondecoder import decodeBanners, getAvailableBackends, getBackend
+
+# Stage timings
+from profiler import StageProfiler
+
+# IP quantiles kept for every extracted file, used to pick shards with about the same amount of observations
+IP_QUANTILES: int = 1024
 
 
 # Expected scan data format from Shodan .json or .json.bz2 files
@@ -42,12 +59,67 @@ FieldPath = list[str]
 Path to a fingerprint or domain field after splitting the original path by dots
 """
 
+# Compiled extractor of a module, gets (fingerprint, domain) from a banner
+BannerExtractor = Callable[[dict[str, Any]], Optional[tuple[str, str]]]
+
+
+def compileExtractor(
+    fingerprintField: FieldPath,
+    domainField: FieldPath,
+    domainExtractor: Optional[Callable[[Any], str | None]] = None,
+) -> BannerExtractor:
+    """
+    Compiles the extractor of a module: a function that gets the fingerprint and domain of a banner with direct key
+    accesses (e.g. `scan["ssl"]["cert"]["fingerprint"]["sha256"]`), instead of walking the field paths for every
+    banner. The domain extractor, if any, is called right after the domain is read.
+
+    Parameters
+    ----------
+    `fingerprintField`: path to the fingerprint field
+    `domainField`: path to the domain field
+    `domainExtractor`: function used to extract the domain from the domain field (optional)
+
+    Returns
+    -------
+    `extractor`: function that returns the (fingerprint, domain) of a banner, None if any of them is not available
+    """
+
+    def getAccess(field: FieldPath) -> str:
+        return "scan" + "".join(f"[{key!r}]" for key in field)
+
+    lines: list[str] = [
+        "def extract(scan):",
+        "    try:",
+        f"        fingerprint = {getAccess(fingerprintField)}",
+        f"        domain = {getAccess(domainField)}",
+        "    except (KeyError, TypeError):",
+        "        return None",
+        "    if fingerprint is None or domain is None:",
+        "        return None",
+    ]
+
+    if domainExtractor is not None:
+        lines += [
+            "    domain = domainExtractor(domain)",
+            "    if domain is None:",
+            "        return None",
+        ]
+
+    lines.append("    return (fingerprint, domain)")
+
+    namespace: dict[str, Any] = {"domainExtractor": domainExtractor}
+    exec("\n".join(lines), namespace)
+
+    return namespace["extract"]
+
 
 # Configurable module data for Shodan
 class ModuleData:
     """
     Represents a supported module for Shodan scans.
 
+    Fields are read from every banner by `extract`, compiled once from the field paths (see `compileExtractor`).
+
     Please see initSupportedModules() for guidance on how to add support for new modules.
     """
 
@@ -84,7 +156,25 @@ class ModuleData:
         self.moduleNames: set[str] = moduleNames
         self.fingerprintField: FieldPath = fingerprintFieldPath.split(sep=".")
         self.domainField: FieldPath = domainFieldPath.split(sep=".")
-        self.fingerprintExtractor: Optional[Callable[[str], str]] = extractorFn
+        self.domainExtractor: Optional[Callable[[str], str]] = extractorFn
+
+        self.extract: BannerExtractor = compileExtractor(
+            self.fingerprintField, self.domainField, self.domainExtractor
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Compiled extractors can't be pickled (e.g. to be sent to worker processes), so they are compiled again
+        state: dict[str, Any] = self.__dict__.copy()
+        del state["extract"]
+
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+
+        self.extract = compileExtractor(
+            self.fingerprintField, self.domainField, self.domainExtractor
+        )
 
 
 def initParser(supportedModules: dict[str, ModuleData]) -> argparse.ArgumentParser:
@@ -100,11 +190,12 @@ def initParser(supportedModules: dict[str, ModuleData]) -> argparse.ArgumentPars
     )
 
     parser.add_argument(
-        "targetModule",
+        "targetModules",
         metavar="target-module",
         type=str,
-        choices=supportedModules.keys(),
-        help=f"Shodan module to be analyzed. Available options: {', '.join(supportedModules.keys())}",
+        nargs="+",
+        choices=[*supportedModules.keys(), "all"],
+        help=f"Shodan modules to be analyzed, every file is decoded once for all of them. Available options: {', '.join(supportedModules.keys())}, all. If several modules are selected, the input data of each module is saved in its own subfolder of the cache folder (e.g. cache/https)",
     )
 
     parser.add_argument(
@@ -117,6 +208,47 @@ def initParser(supportedModules: dict[str, ModuleData]) -> argparse.ArgumentPars
         help="folder to store processed input data. (default: %(default)s)",
     )
 
+    parser.add_argument(
+        "-w",
+        "--window-days",
+        type=int,
+        dest="windowDays",
+        metavar="DAYS",
+        action="store",
+        default=None,
+        help="sliding window size in days. If set, only observations from the most recent DAYS days are kept, older days are dropped (default: keep every day)",
+    )
+
+    parser.add_argument(
+        "-n",
+        "--shards",
+        type=int,
+        dest="totalShards",
+        metavar="SHARDS",
+        action="store",
+        default=256,
+        help="extracted data is split in up to SHARDS ranges of IP addresses with about the same amount of observations and merged one shard at a time, more shards means less memory used while merging (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--compact",
+        dest="shouldCompact",
+        action="store_true",
+        default=False,
+        help="if enabled, consecutive identical observations (same fingerprint and domain) of an IP and port are collapsed into a single record with their first time seen, last time seen and count. DynMap results are the same (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--json-backend",
+        type=str,
+        dest="jsonBackend",
+        action="store",
+        choices=["auto", *getAvailableBackends().keys()],
+        default="auto",
+        help="JSON backend used to decode Shodan banners. 'auto' selects the fastest one installed (orjson, simdjson, then stdlib json) (default: %(default)s)",
+    )
+
     parser.add_argument(
         "-f",
         "--logfile",
@@ -139,6 +271,17 @@ def initParser(supportedModules: dict[str, ModuleData]) -> argparse.ArgumentPars
         help="log level. Available options: DEBUG, INFO, WARN, ERROR, FATAL (default: %(default)s)",
     )
 
+    parser.add_argument(
+        "--profile",
+        type=str,
+        dest="profileFile",
+        metavar="FILE",
+        nargs="?",
+        const="preprocess_profile.json",
+        default=None,
+        help="if enabled, the wall time, CPU time, peak memory and item counts of every stage are written to a JSON report (default file: %(const)s)",
+    )
+
     return parser
 
 
@@ -161,9 +304,8 @@ def extractDomainFromSSH(domains: list[str]) -> str | None:
 
     # SSH scans may have multiple domains found by Shodan
     if len(domains) > 0:
-        # For the sake of simplicity, we sort and then return the first domain
-        domains.sort()
-        return domains[0]
+        # For the sake of simplicity, we return the first domain in sorted order
+        return min(domains)
 
     return None
 
@@ -184,7 +326,7 @@ def initSupportedModules() -> dict[str, ModuleData]:
 
     `domain field`:          used to select a domain name from the respective modules (nested path separated by dots)
 
-    `fingerprint extractor:` function used to parse/extract the fingerprint from the selected field (optional)
+    `domain extractor:`      function used to parse/extract the domain name from the selected field (optional)
 
     It is up to the user to add support for modules, please refer to the `https` and `ssh` implementations for guidance
 
@@ -221,166 +363,288 @@ def initSupportedModules() -> dict[str, ModuleData]:
     return supportedModules
 
 
-def getNestedFieldData(
-    scan: dict[str, Any],
-    field: FieldPath,
-    extractor: Optional[Callable[[str], str]] = None,
-) -> str | None:
+def getTargetModules(
+    args: argparse.Namespace, supportedModules: dict[str, ModuleData]
+) -> list[ModuleData]:
+    """
+    Gets the data of every selected module, in the order they were selected ('all' selects every supported module).
     """
-    Get data from a scan given the desired field, regardless of how nested it is.
-
-    If a extractor function is needed, it is up to the user to implement a viable method under `initSupportedModules()`
 
-    Parameters
-    ----------
-    `scan`: scan to get data from
-    `field`: nested field with data
-    `extractor`: extractor function to extract/parse/process the data before returning (optional)
+    aliases: list[str] = list()
 
-    Returns
-    -------
-    `data`: data after it has been processed by an extractor function or raw
-    """
+    for alias in args.targetModules:
+        for selected in supportedModules.keys() if alias == "all" else [alias]:
+            if selected not in aliases:
+                aliases.append(selected)
 
-    data = scan
+    return [supportedModules[alias] for alias in aliases]
 
-    # Iteratively traverse parent -> child to get desired field
-    for key in field:
-        data = data.get(key)
 
-        if data == None:
-            return None
+def getModuleCacheFolder(args: argparse.Namespace, moduleData: ModuleData) -> str:
+    """
+    Gets the folder where the input data of a module is saved: the cache folder itself if a single module is selected,
+    or a subfolder named after the module otherwise (e.g. cache/https).
+    """
 
-    if extractor:
-        return extractor(data)
+    if len(args.targetModules) == 1 and args.targetModules[0] != "all":
+        return args.cacheFolder
 
-    return data
+    return f"{args.cacheFolder}/{moduleData.alias}"
 
 
 def extractDataFromFile(
-    filepath: str, moduleData: ModuleData
-) -> tuple[dict[str, set[str]], dict[str, set[str]], dict[str, IpTimeSeries], int]:
+    filepath: str,
+    modules: list[ModuleData],
+    jsonBackend: str = "auto",
+    readerWorkers: int = 1,
+) -> tuple[dict[str, ObservationBuilder], dict[str, int]]:
     """
-    Extract data from a Shodan scan file, given a target module.
+    Extract data from a Shodan scan file, given the target modules.
     The file can be either a .json or .json.bz2 file.
 
+    The file is decoded once, every banner is added to the data of the modules it belongs to. Observations are
+    appended to a columnar builder per module, with timestamps as epoch seconds and dictionary-encoded fingerprints
+    and domains.
+
     Parameters
     ----------
     `filepath`: path to the file. Be careful when using relative paths.
-    `moduleData`: module
+    `modules`: target modules
+    `jsonBackend`: JSON backend used to decode banners (see `jsondecoder.getBackend`)
+    `readerWorkers`: amount of processes used to decompress the file (see `modules.bz2reader`)
 
     Returns
     -------
     A tuple containing the following data, in order:
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address
-    `ipsPerFingerprint`: a dict of unique IP addresses found per fingerprint
-    `ipFingerprintsOverTime`: a dict of a timeseries for each IP address
-    `bannersFound`: total amount of Shodan banners (for this module) found in the file, even if not valid
+    `builders`: observations found in the file, per module alias
+    `bannersFound`: total amount of Shodan banners found in the file, even if not valid, per module alias
     """
 
-    # Init data dicts
-    fingerprintsPerIp: dict[str, set[str]] = defaultdict(set)
-    ipsPerFingerprint: dict[str, set[str]] = defaultdict(set)
-    ipFingerprintsOverTime: dict[str, IpTimeSeries] = defaultdict(list)
-    bannersFound: int = 0
-
-    logging.info(f"Loading scans from {filepath}")
+    # Init data
+    builders: dict[str, ObservationBuilder] = {
+        moduleData.alias: ObservationBuilder() for moduleData in modules
+    }
+    bannersFound: dict[str, int] = {moduleData.alias: 0 for moduleData in modules}
 
-    # Change extraction method based on whether or not file is compressed
-    isFileCompressed: bool = filepath.endswith(".json.bz2")
+    # Shodan module name -> target modules with that name
+    modulesByName: dict[str, list[ModuleData]] = defaultdict(list)
 
-    if isFileCompressed:
-        data = bz2.open(filepath, "rt")
-    else:
-        data = json.load(open(filepath, "rb"))
+    for moduleData in modules:
+        for moduleName in moduleData.moduleNames:
+            modulesByName[moduleName].append(moduleData)
 
-    for scan in data:
-        # Compressed scans are not dict-ready, so we need to load them
-        if isFileCompressed:
-            scan: dict[Any, Any] = json.loads(scan)
+    logging.info(f"Loading scans from {filepath}")
 
+    # Banners of other modules are skipped before being decoded whenever possible
+    for scan in decodeBanners(
+        filepath, list(modulesByName.keys()), jsonBackend, readerWorkers
+    ):
         try:
-            ip: str = scan["ip_str"]
-            port: int = scan["port"]
             modName: str = scan["_shodan"]["module"]
 
-            # Count banners found for this module, even if other fields are missing
-            if modName in moduleData.moduleNames:
-                bannersFound += 1
-
-            timestamp: dt.datetime = dt.datetime.fromisoformat(scan["timestamp"])
-            domain: str | None = getNestedFieldData(scan, moduleData.domainField)
-
-            if domain is None:
+            # Skip non-desired modules before reading anything else
+            if modName not in modulesByName:
                 continue
+
+            ip: str = scan["ip_str"]
+            port: int = scan["port"]
         except KeyError:
             # We need every field to perform our analysis, so we skip the scan if they are not available
             # This happens very often, so we won't log it directly
             continue
 
-        # Skip non-desired modules
-        if modName not in moduleData.moduleNames:
+        # Count banners found for each module, even if other fields are missing
+        for moduleData in modulesByName[modName]:
+            bannersFound[moduleData.alias] += 1
+
+        try:
+            timestamp: dt.datetime = dt.datetime.fromisoformat(scan["timestamp"])
+        except KeyError:
             continue
 
-        # Get fingerprint for this module
-        fingerprint: str | None = getNestedFieldData(
-            scan, moduleData.fingerprintField, moduleData.fingerprintExtractor
-        )
+        for moduleData in modulesByName[modName]:
+            # Get fingerprint and domain for this module
+            fields: Optional[tuple[str, str]] = moduleData.extract(scan)
 
-        # Skip if fingerprint is not available
-        if fingerprint == None:
-            continue
+            # Skip if fingerprint or domain are not available
+            if fields is None:
+                continue
 
-        # Save data for this scan
-        ipsPerFingerprint[fingerprint].add(ip)
+            # Save data for this scan
+            builders[moduleData.alias].add(ip, timestamp, fields[0], port, fields[1])
 
-        fingerprintsPerIp[ip].add(fingerprint)
+    return (builders, bannersFound)
 
-        ipFingerprintsOverTime[ip].append((timestamp, fingerprint, port, domain))
 
-    return (fingerprintsPerIp, ipsPerFingerprint, ipFingerprintsOverTime, bannersFound)
+def getFileCacheKey(filepath: str, moduleData: ModuleData) -> str:
+    """
+    Builds the key of a file in the per-file extraction cache.
 
+    A file is only extracted again if its path, size or modification time change, or if another module is used.
 
-def getFingerprintsAndIps(
-    args: argparse.Namespace, supportedModules: dict[str, ModuleData]
-) -> tuple[dict[str, set[str]], dict[str, set[str]], dict[str, IpTimeSeries]]:
+    Parameters
+    ----------
+    `filepath`: path to the file.
+    `moduleData`: module
+
+    Returns
+    -------
+    `key`: cache key for the file
     """
-    Analyzes a collection of shodan scans and finds/builds:
 
-    All unique fingerprints associated with an IP address, for every IP address.
+    stat: os.stat_result = os.stat(filepath)
 
-    All unique IP addresses associated with a fingerprint, for every fingerprint.
+    return f"{moduleData.alias}:{os.path.abspath(filepath)}:{stat.st_size}:{stat.st_mtime_ns}"
 
-    A time series describing the fingerprints over time, for every IP address.
 
-    Attention
-    ---------
-    This function is computationally expensive and may take a while to complete.
-    It will also use (almost) all available CPU cores to speed up the process.
+def extractFileToCache(
+    filepath: str,
+    modules: list[ModuleData],
+    partialDirs: list[str],
+    jsonBackend: str,
+    readerWorkers: int = 1,
+) -> list[tuple[int, int, list[int], Optional[int]]]:
+    """
+    Extracts data from a Shodan scan file and saves it to the per-file extraction cache, for every target module.
+
+    The IP quantiles of the extracted data (see `Observations.getIpQuantiles`) are returned, so shards with about the
+    same amount of observations across every file can be picked later (see `findShardBoundaries`).
 
     Parameters
     ----------
-    `args`: command line arguments
-    `supportedModules`: dict of supported modules data
+    `filepath`: path to the file. Be careful when using relative paths.
+    `modules`: target modules
+    `partialDirs`: folders where the extracted data of each module is saved
+    `jsonBackend`: JSON backend used to decode banners
+    `readerWorkers`: amount of processes used to decompress the file
+
+    Returns
+    -------
+    A list with a tuple per module, in the order of `modules`, in the following order:
+    `bannersFound`: total amount of Shodan banners (for this module) found in the file, even if not valid
+    `rowsFound`: amount of valid observations extracted from the file
+    `ipQuantiles`: IP quantiles of the extracted data
+    `lastDay`: most recent day found in the file (as days since epoch), None if no observation was found
+    """
+
+    (builders, bannersFound) = extractDataFromFile(
+        filepath, modules, jsonBackend, readerWorkers
+    )
+
+    results: list[tuple[int, int, list[int], Optional[int]]] = list()
+
+    for moduleData, partialDir in zip(modules, partialDirs):
+        observations: Observations = builders.pop(moduleData.alias).build()
+
+        # Start from an empty folder, the file may have been extracted before
+        shutil.rmtree(partialDir, ignore_errors=True)
+        os.makedirs(partialDir)
+
+        pickle.dump(observations, open(f"{partialDir}/observations.pickle", "wb"))
+
+        lastDay: Optional[int] = None
+
+        if observations.getSize() > 0:
+            lastDay = int(observations.columns["ts"].max()) // 86400
+
+        results.append(
+            (
+                bannersFound[moduleData.alias],
+                observations.getSize(),
+                observations.getIpQuantiles(IP_QUANTILES),
+                lastDay,
+            )
+        )
+
+    return results
+
+
+def splitPartial(task: tuple[str, list[int], str]) -> list[int]:
+    """
+    Splits the data extracted from a single file in shards (see `Observations.split`), every shard is saved to its
+    own file so shards can be merged one at a time.
+
+    Parameters
+    ----------
+    `task`: a tuple in the following order:
+        `partialPath`: path to the extracted data
+        `boundaries`: first IP address of every shard but the first (see `findShardBoundaries`)
+        `shardPrefix`: prefix of the path where each shard is saved
+
+    Returns
+    -------
+    `shards`: non-empty shards saved
+    """
+
+    (partialPath, boundaries, shardPrefix) = task
+
+    shards: dict[int, Observations] = pickle.load(open(partialPath, "rb")).split(
+        boundaries
+    )
+
+    for shard, shardObservations in shards.items():
+        pickle.dump(shardObservations, open(f"{shardPrefix}{shard}.pickle", "wb"))
+
+    return sorted(shards.keys())
+
+
+def mergeShard(
+    task: tuple[int, list[str], Optional[int], bool, str]
+) -> tuple[int, int, int]:
+    """
+    Merges the extracted data of a single shard from several files.
+
+    Parameters
+    ----------
+    `task`: a tuple in the following order:
+        `shard`: shard to merge
+        `partialPaths`: paths to the shard files of each scan file (see `splitPartial`), in the order they should be
+        merged. Files are removed once loaded
+        `firstDay`: observations before this day (as days since epoch) are dropped, None to keep every day
+        `shouldCompact`: whether runs of identical observations are collapsed (see `Observations.compact`)
+        `mergedPath`: path where the merged shard is saved
 
     Returns
     -------
     A tuple in the following order:
-    `fingerprintsPerIp`: a dict of unique fingerprints found per IP address
-    `ipsPerFingerprint`: a dict of unique IP addresses found per fingerprint
-    `ipFingerprintsOverTime`: a dict of a timeseries for each IP address
+    `shard`: merged shard
+    `rows`: amount of rows in the merged shard
+    `observations`: amount of observations in the merged shard, before being compacted
     """
 
-    # Init final data dicts
-    fingerprintsPerIp: dict[str, set[str]] = defaultdict(set)
-    ipsPerFingerprint: dict[str, set[str]] = defaultdict(set)
-    ipFingerprintsOverTime: dict[str, IpTimeSeries] = defaultdict(list)
-    totalBanners: int = 0
+    (shard, partialPaths, firstDay, shouldCompact, mergedPath) = task
+
+    observations: Observations = Observations.concatenate(
+        [pickle.load(open(partialPath, "rb")) for partialPath in partialPaths]
+    )
+
+    for partialPath in partialPaths:
+        os.remove(partialPath)
+
+    # Drop days outside the sliding window
+    if firstDay is not None:
+        observations = observations.selectRows(
+            observations.columns["ts"] // 86400 >= firstDay
+        )
+
+    totalObservations: int = observations.getSize()
+
+    # Runs are only collapsed once every file is merged, so runs that span several files are collapsed too
+    if shouldCompact:
+        observations = observations.compact()
 
-    # Get target module data
-    moduleData: ModuleData = supportedModules[args.targetModule]
+    pickle.dump(observations, open(mergedPath, "wb"))
+
+    return (shard, observations.getSize(), totalObservations)
+
+
+def findScanFiles(args: argparse.Namespace) -> list[str]:
+    """
+    Finds every Shodan scan file (.json or .json.bz2) in the Shodan directory, sorted by path.
+
+    Exits if no file is found.
+    """
 
-    # Get target files
     scanFiles: list[str] = list()
 
     for file in os.scandir(args.shodanDir):
@@ -397,55 +661,285 @@ def getFingerprintsAndIps(
         )
         exit(3)
 
-    # Prepare to multiprocess data
-    partialResults: list[
-        tuple[dict[str, set[str]], dict[str, set[str]], dict[str, IpTimeSeries], int]
+    # Files are sorted so the result does not depend on the directory order
+    scanFiles.sort()
+
+    return scanFiles
+
+
+def extractScanFiles(
+    args: argparse.Namespace,
+    modules: list[ModuleData],
+    scanFiles: list[str],
+    pool: Pool,
+    workers: int,
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Extracts data from every scan file, for every target module, into the per-file extraction cache.
+
+    Extraction is incremental: data extracted from each file is kept per module, so only new or changed files are
+    extracted on later runs, and only for the modules they were not extracted for. Every pending file is decoded once,
+    for all of its pending modules.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    `modules`: target modules
+    `scanFiles`: paths to the scan files, sorted
+    `pool`: worker processes
+    `workers`: amount of worker processes
+
+    Returns
+    -------
+    `entries`: extraction cache entries of every scan file (in the order of `scanFiles`), per module alias
+    """
+
+    fileCacheDir: str = f"{args.cacheFolder}/files"
+    manifestPath: str = f"{fileCacheDir}/manifest.json"
+
+    os.makedirs(fileCacheDir, exist_ok=True)
+
+    manifest: dict[str, dict[str, Any]] = dict()
+
+    if os.path.isfile(manifestPath):
+        manifest = json.load(open(manifestPath))
+
+    # Module alias -> scan file -> cache key
+    fileKeys: dict[str, dict[str, str]] = {
+        moduleData.alias: {
+            filepath: getFileCacheKey(filepath, moduleData) for filepath in scanFiles
+        }
+        for moduleData in modules
+    }
+
+    # Scan file -> modules it still has to be extracted for
+    pendingModules: dict[str, list[ModuleData]] = defaultdict(list)
+
+    for moduleData in modules:
+        for filepath, key in fileKeys[moduleData.alias].items():
+            if (
+                key not in manifest
+                or "ip_quantiles" not in manifest[key]
+                or not os.path.isdir(f"{fileCacheDir}/{manifest[key]['partial']}")
+            ):
+                pendingModules[filepath].append(moduleData)
+
+    # Keep the order of scanFiles
+    pendingFiles: list[str] = [
+        filepath for filepath in scanFiles if filepath in pendingModules
     ]
 
-    # Leave two cores free, use the rest
-    with multiprocessing.Pool(multiprocessing.cpu_count() - 2) as pool:
-        partialResults = pool.starmap(
-            extractDataFromFile, zip(scanFiles, repeat(moduleData))
+    logging.info(
+        f"{len(scanFiles) - len(pendingFiles)} files found in the extraction cache, {len(pendingFiles)} files to extract"
+    )
+
+    pendingKeys: list[list[str]] = [
+        [fileKeys[moduleData.alias][filepath] for moduleData in pendingModules[filepath]]
+        for filepath in pendingFiles
+    ]
+
+    with profiler.stage("extraction") as items:
+        if pendingFiles:
+            partialNames: list[list[str]] = [
+                [hashlib.sha1(key.encode()).hexdigest() for key in keys]
+                for keys in pendingKeys
+            ]
+
+            extractArgs = zip(
+                pendingFiles,
+                [pendingModules[filepath] for filepath in pendingFiles],
+                [[f"{fileCacheDir}/{name}" for name in names] for names in partialNames],
+                repeat(args.jsonBackend),
+            )
+
+            # Workers save their results to disk, only small summaries are sent back
+            partialResults: list[list[tuple[int, int, list[int], Optional[int]]]]
+
+            if len(pendingFiles) < workers:
+                # Few files (e.g. a new daily scan), so each file is decompressed on every core instead
+                partialResults = [
+                    extractFileToCache(*fileArgs, readerWorkers=workers)
+                    for fileArgs in extractArgs
+                ]
+            else:
+                partialResults = pool.starmap(extractFileToCache, extractArgs)
+
+            for keys, names, results in zip(pendingKeys, partialNames, partialResults):
+                for key, name, (bannersFound, rowsFound, ipQuantiles, lastDay) in zip(
+                    keys, names, results
+                ):
+                    manifest[key] = {
+                        "partial": name,
+                        "ip_quantiles": ipQuantiles,
+                        "last_day": lastDay,
+                        "banners": bannersFound,
+                        "rows": rowsFound,
+                    }
+
+        extractedKeys: list[str] = [key for keys in pendingKeys for key in keys]
+
+        items["files"] = len(scanFiles)
+        items["modules"] = len(modules)
+        items["extracted_files"] = len(pendingFiles)
+        items["extracted_banners"] = sum(
+            manifest[key]["banners"] for key in extractedKeys
         )
+        items["extracted_rows"] = sum(manifest[key]["rows"] for key in extractedKeys)
+
+    # Forget files of these modules that were removed or changed since they were extracted
+    for moduleData in modules:
+        currentKeys: set[str] = set(fileKeys[moduleData.alias].values())
+
+        for key in list(manifest.keys()):
+            if key.startswith(f"{moduleData.alias}:") and key not in currentKeys:
+                shutil.rmtree(
+                    f"{fileCacheDir}/{manifest.pop(key)['partial']}", ignore_errors=True
+                )
+
+    json.dump(manifest, open(manifestPath, "w"), indent=4)
+
+    return {
+        moduleData.alias: [
+            manifest[fileKeys[moduleData.alias][filepath]] for filepath in scanFiles
+        ]
+        for moduleData in modules
+    }
+
+
+def getFingerprintsAndIps(
+    args: argparse.Namespace,
+    moduleData: ModuleData,
+    entries: list[dict[str, Any]],
+    pool: Pool,
+    mergedDir: str,
+) -> tuple[list[str], int]:
+    """
+    Builds a table of observations describing the fingerprints over time, for every IP address, from the data
+    extracted from every scan file for a module.
+
+    Unique fingerprints per IP address and unique IP addresses per fingerprint are derived from the observations
+    when needed, so they are not built here.
 
-    logging.info(f"Aggregating {len(partialResults)} file scan results")
+    Extracted data is split in ranges of IP addresses with about the same amount of observations, picked from the IP
+    quantiles of every file, and merged one shard at a time. The memory used while merging is bounded by the size of
+    the largest shard instead of the whole dataset.
 
-    # Aggregate results
-    for (
-        partialFingerprintsPerIp,
-        partialIpsPerFingerprint,
-        partialIpFingerprintsOverTime,
-        bannersFound,
-    ) in partialResults:
-        for ip, fingerprints in partialFingerprintsPerIp.items():
-            fingerprintsPerIp[ip] = fingerprintsPerIp[ip].union(fingerprints)
+    Parameters
+    ----------
+    `args`: command line arguments
+    `moduleData`: module
+    `entries`: extraction cache entries of every scan file for this module (see `extractScanFiles`)
+    `pool`: worker processes
+    `mergedDir`: folder where merged shards are saved
+
+    Returns
+    -------
+    A tuple in the following order:
+    `mergedPaths`: paths to the merged shards, sorted by IP address. Concatenated, they form the table of observations
+    `totalRows`: total amount of observations across all merged shards
+    """
+
+    fileCacheDir: str = f"{args.cacheFolder}/files"
+
+    totalBanners: int = sum(entry["banners"] for entry in entries)
+
+    logging.info(f"Total {moduleData.alias} banners found: {totalBanners}")
+
+    # Find the first day of the sliding window
+    firstDay: Optional[int] = None
+    lastDays: list[int] = [
+        entry["last_day"] for entry in entries if entry["last_day"] is not None
+    ]
 
-        for fingerprint, ips in partialIpsPerFingerprint.items():
-            ipsPerFingerprint[fingerprint] = ipsPerFingerprint[fingerprint].union(ips)
+    if args.windowDays is not None and lastDays:
+        firstDay = max(lastDays) - args.windowDays + 1
 
-        for ip, timeseries in partialIpFingerprintsOverTime.items():
-            ipFingerprintsOverTime[ip].extend(timeseries)
+    # Files without observations have nothing to merge
+    entries = [entry for entry in entries if entry["rows"] > 0]
 
-        totalBanners += bannersFound
+    boundaries: list[int] = findShardBoundaries(
+        [entry["ip_quantiles"] for entry in entries],
+        [entry["rows"] for entry in entries],
+        args.totalShards,
+    )
 
-    logging.info(f"Total {args.targetModule} banners found: {totalBanners}")
+    with profiler.stage("merge") as items:
+        # Shard -> files with data in the shard, in the order of the files
+        partialPathsPerShard: dict[int, list[str]] = defaultdict(list)
+
+        for fileIdx, shards in enumerate(
+            pool.imap(
+                splitPartial,
+                [
+                    (
+                        f"{fileCacheDir}/{entry['partial']}/observations.pickle",
+                        boundaries,
+                        f"{mergedDir}/{fileIdx}-",
+                    )
+                    for fileIdx, entry in enumerate(entries)
+                ],
+            )
+        ):
+            for shard in shards:
+                partialPathsPerShard[shard].append(
+                    f"{mergedDir}/{fileIdx}-{shard}.pickle"
+                )
+
+        logging.info(
+            f"Merging {len(entries)} file scan results in {len(partialPathsPerShard)} shards"
+        )
 
-    # Sort time series, saving us some time later
-    for ip in ipFingerprintsOverTime.keys():
-        ipFingerprintsOverTime[ip] = sorted(
-            ipFingerprintsOverTime[ip], key=lambda x: x[0]
+        rowsPerShard: dict[int, int] = dict()
+        totalObservations: int = 0
+
+        for shard, rows, observations in pool.imap_unordered(
+            mergeShard,
+            [
+                (
+                    shard,
+                    partialPaths,
+                    firstDay,
+                    args.shouldCompact,
+                    f"{mergedDir}/{shard}.pickle",
+                )
+                for shard, partialPaths in partialPathsPerShard.items()
+            ],
+        ):
+            rowsPerShard[shard] = rows
+            totalObservations += observations
+
+        items["module"] = moduleData.alias
+        items["shards"] = len(rowsPerShard)
+        items["observations"] = totalObservations
+        items["rows"] = sum(rowsPerShard.values())
+
+    totalRows: int = sum(rowsPerShard.values())
+
+    if firstDay is not None:
+        logging.info(
+            f"Kept {totalObservations} observations from the last {args.windowDays} days"
         )
 
-    logging.info(f"File scan data extraction complete")
+    if args.shouldCompact:
+        logging.info(
+            f"Compacted {totalObservations} observations into {totalRows} runs of identical observations"
+        )
 
-    return (fingerprintsPerIp, ipsPerFingerprint, ipFingerprintsOverTime)
+    return ([f"{mergedDir}/{shard}.pickle" for shard in sorted(rowsPerShard)], totalRows)
 
 
 def extractShodanData(
     args: argparse.Namespace, supportedModules: dict[str, ModuleData]
 ) -> None:
     """
-    Performs a full Shodan scan data extraction for a given target module.
+    Performs a full Shodan scan data extraction for the given target modules.
+
+    Scan files are decoded once for every module, then the input data of each module is merged and saved on its own.
+
+    Attention
+    ---------
+    This function is computationally expensive and may take a while to complete.
+    It will also use (almost) all available CPU cores to speed up the process.
 
     Parameters
     ----------
@@ -453,34 +947,59 @@ def extractShodanData(
     `supportedModules`: dict of supported modules data
     """
 
-    # Default names
-    filenameFPI: str = f"{args.cacheFolder}/FPI.pickle"
-    filenameIPF: str = f"{args.cacheFolder}/IPF.pickle"
-    filenameIFOT: str = f"{args.cacheFolder}/IFOT.pickle"
+    modules: list[ModuleData] = getTargetModules(args, supportedModules)
 
-    logging.info("Starting full Shodan scan data extraction")
+    logging.info(
+        f"Starting Shodan scan data extraction for {', '.join(moduleData.alias for moduleData in modules)}, using the '{getBackend(args.jsonBackend)[0]}' JSON backend"
+    )
 
-    (
-        fingerprintsPerIp,
-        ipsPerFingerprint,
-        ipFingerprintsOverTime,
-    ) = getFingerprintsAndIps(args, supportedModules)
+    os.makedirs(args.cacheFolder, exist_ok=True)
 
-    logging.info("Saving results")
+    scanFiles: list[str] = findScanFiles(args)
 
-    if not os.path.exists(args.cacheFolder):
-        os.mkdir(args.cacheFolder)
+    # Leave two cores free, use the rest
+    workers: int = max(1, multiprocessing.cpu_count() - 2)
 
-    pickle.dump(fingerprintsPerIp, open(filenameFPI, "wb"))
-    pickle.dump(ipsPerFingerprint, open(filenameIPF, "wb"))
-    pickle.dump(ipFingerprintsOverTime, open(filenameIFOT, "wb"))
+    with multiprocessing.Pool(workers) as pool:
+        entries: dict[str, list[dict[str, Any]]] = extractScanFiles(
+            args, modules, scanFiles, pool, workers
+        )
 
-    logging.info(
-        f"Shodan input data has been saved to {args.cacheFolder}. You can now run DynMap with this data."
-    )
+        logging.info(f"File scan data extraction complete")
+
+        for moduleData in modules:
+            moduleCacheFolder: str = getModuleCacheFolder(args, moduleData)
+
+            # Merged shards are only needed until they are saved as a single table
+            with tempfile.TemporaryDirectory(dir=args.cacheFolder) as mergedDir:
+                (mergedPaths, totalRows) = getFingerprintsAndIps(
+                    args, moduleData, entries[moduleData.alias], pool, mergedDir
+                )
+
+                logging.info(f"Saving {moduleData.alias} results")
+
+                with profiler.stage("save") as items:
+                    # Shards are loaded one at a time
+                    cacheDir: str = saveObservationParts(
+                        moduleCacheFolder,
+                        (pickle.load(open(mergedPath, "rb")) for mergedPath in mergedPaths),
+                        totalRows,
+                        {"module": moduleData.alias, "window_days": args.windowDays},
+                        args.shouldCompact,
+                    )
+
+                    items["module"] = moduleData.alias
+                    items["rows"] = totalRows
+
+            logging.info(
+                f"Shodan {moduleData.alias} input data has been saved to {cacheDir}. You can now run DynMap with this data."
+            )
 
 
 # Start here
+# Stage timings, disabled unless --profile is used (see main)
+profiler: StageProfiler = StageProfiler("preprocess-shodan.py")
+
 if __name__ == "__main__":
     # Init supported modules
     supportedModules: dict[str, ModuleData] = initSupportedModules()
@@ -505,5 +1024,22 @@ if __name__ == "__main__":
         encoding="utf-8",
     )
 
+    if args.windowDays is not None and args.windowDays < 1:
+        logging.error(f"Window size should be at least one day")
+        exit(4)
+
+    if args.totalShards < 1:
+        logging.error(f"Amount of shards should be at least one")
+        exit(5)
+
+    # Stage timings, memory and item counts
+    if args.profileFile is not None:
+        profiler = StageProfiler("preprocess-shodan.py", enabled=True)
+
     # Start execution
     extractShodanData(args, supportedModules)
+
+    if args.profileFile is not None:
+        profiler.save(args.profileFile, vars(args))
+
+        logging.info(f"Profiling report has been written to {args.profileFile}")
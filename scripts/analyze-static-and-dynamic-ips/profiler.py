@@ -0,0 +1,130 @@
+# Needed for analysis
+import os
+import sys
+import json
+import time
+import resource
+import platform
+import datetime as dt
+
+# Code consistency
+from typing import Any, Iterator
+from contextlib import contextmanager
+
+
+def getPeakMemory() -> tuple[int, int]:
+    """
+    Gets the peak resident set size (RSS) of this process and of its largest finished child process, in bytes.
+    """
+
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    unit: int = 1 if sys.platform == "darwin" else 1024
+
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    )
+
+
+def getChildrenCpuTime() -> float:
+    """
+    Gets the CPU time (user + system) of every finished child process (e.g. worker processes), in seconds.
+    """
+
+    times = os.times()
+
+    return times.children_user + times.children_system
+
+
+class StageProfiler:
+    """
+    Records the wall time, CPU time, peak memory and item counts of every stage of a script.
+
+    Stages are recorded with `stage`, which gives a dict where the stage stores its item counts:
+
+        with profiler.stage("asn_lookup") as items:
+            ...
+            items["ips"] = len(ips)
+
+    Peak memory is the high water mark of the process, so it only grows from one stage to the next. CPU time of
+    worker processes is only known once they finish (e.g. when their pool is closed), so it is counted in the stage
+    that closes the pool.
+
+    A disabled profiler (the default) records nothing, so stages cost a context manager call.
+    """
+
+    def __init__(self, script: str = "", enabled: bool = False):
+        self.script: str = script
+        self.enabled: bool = enabled
+
+        self.startedAt: str = dt.datetime.now(dt.timezone.utc).isoformat()
+        self.startWall: float = time.perf_counter()
+        self.startCpu: float = time.process_time()
+        self.startChildrenCpu: float = getChildrenCpuTime()
+
+        self.stages: list[dict[str, Any]] = list()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict[str, Any]]:
+        """
+        Records a stage. Stages may be nested, every stage is recorded on its own.
+        """
+
+        items: dict[str, Any] = dict()
+
+        if not self.enabled:
+            yield items
+            return
+
+        startWall: float = time.perf_counter()
+        startCpu: float = time.process_time()
+        startChildrenCpu: float = getChildrenCpuTime()
+
+        try:
+            yield items
+        finally:
+            (peakRss, peakChildRss) = getPeakMemory()
+
+            self.stages.append(
+                {
+                    "name": name,
+                    "wall_seconds": time.perf_counter() - startWall,
+                    "cpu_seconds": time.process_time() - startCpu,
+                    "children_cpu_seconds": getChildrenCpuTime() - startChildrenCpu,
+                    "peak_rss_bytes": peakRss,
+                    "peak_child_rss_bytes": peakChildRss,
+                    "items": items,
+                }
+            )
+
+    def getReport(self, args: dict[str, Any] | None = None) -> dict[str, Any]:
+        """
+        Builds the profiling report: run information, totals and every stage, in the order they finished.
+        """
+
+        (peakRss, peakChildRss) = getPeakMemory()
+
+        return {
+            "script": self.script,
+            "started_at": self.startedAt,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": args or dict(),
+            "total": {
+                "wall_seconds": time.perf_counter() - self.startWall,
+                "cpu_seconds": time.process_time() - self.startCpu,
+                "children_cpu_seconds": getChildrenCpuTime() - self.startChildrenCpu,
+                "peak_rss_bytes": peakRss,
+                "peak_child_rss_bytes": peakChildRss,
+            },
+            "stages": self.stages,
+        }
+
+    def save(self, filepath: str, args: dict[str, Any] | None = None) -> None:
+        """
+        Saves the profiling report as JSON.
+        """
+
+        with open(filepath, "w") as file:
+            json.dump(self.getReport(args), file, indent=4, default=str)
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+
+# Needed for analysis
+import os
+import math
+import socket
+import numpy as np
+
+# Code quality
+import logging
+import argparse
+
+# Code consistency
+from typing import Any
+
+# Compact input data
+from ipdata import Observations
+
+# First IP address of the synthetic address space (1.0.0.0)
+BASE_ADDRESS: int = 1 << 24
+
+# First AS number of the synthetic ASes (private use range)
+BASE_ASN: int = 64512
+
+# Start of the observation window (2024-01-01 00:00:00 UTC)
+BASE_TIMESTAMP: int = 1704067200
+
+# Scanned port of every observation
+SCANNED_PORT: int = 443
+
+# Most fingerprint versions (certificate renewals + 1) of a static host
+MAX_FINGERPRINT_VERSIONS: int = 8
+
+
+def initParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Synthetic DynMap input generator. Writes a columnar cache (see ipdata.Observations) and a matching IPASN.dat to a cache folder, so DynMap can be run and benchmarked offline."
+    )
+
+    parser.add_argument(
+        "-n",
+        "--ips",
+        type=int,
+        dest="ips",
+        metavar="IPS",
+        action="store",
+        default=10000,
+        help="amount of IP addresses in the input data (default: %(default)s)",
+    )
+
+    addGeneratorArguments(parser)
+
+    parser.add_argument(
+        "-c",
+        "--cache-folder",
+        type=str,
+        dest="cacheFolder",
+        metavar="CACHE_FOLDER",
+        action="store",
+        default="./cache",
+        help="folder where the synthetic input data will be saved (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--logfile",
+        type=str,
+        dest="logfile",
+        metavar="LOGFILE",
+        action="store",
+        default=None,
+        help="file to store log outputs. If not specified, logs will be printed on screen",
+    )
+
+    parser.add_argument(
+        "-l",
+        "--loglevel",
+        type=str,
+        dest="loglevel",
+        metavar="LOGLEVEL",
+        action="store",
+        choices=["DEBUG", "INFO", "WARN", "ERROR", "FATAL"],
+        default="INFO",
+        help="log level. Available options: DEBUG, INFO, WARN, ERROR, FATAL (default: %(default)s)",
+    )
+
+    return parser
+
+
+def addGeneratorArguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the generator parameters to a parser, shared by the generator and the benchmark suite. The amount of IP
+    addresses is not included, as the benchmark script generates several datasets.
+    """
+
+    parser.add_argument(
+        "-a",
+        "--ases",
+        type=int,
+        dest="ases",
+        metavar="ASES",
+        action="store",
+        default=20,
+        help="amount of ASes, every AS has a single BGP prefix and about the same amount of IP addresses (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--pool-sizes",
+        type=int,
+        dest="poolSizes",
+        metavar=("MIN", "MAX"),
+        nargs=2,
+        action="store",
+        default=[16, 128],
+        help="range of the size of address pools (in IP addresses, gaps included). Pools are drawn uniformly from this range (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--pool-spacing",
+        type=int,
+        dest="poolSpacing",
+        metavar=("MIN", "MAX"),
+        nargs=2,
+        action="store",
+        default=[16, 64],
+        help="range of the amount of unused IP addresses between consecutive pools. Spacings greater than the max gap size of DynMap keep pools in different blocks (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--gap-rate",
+        type=float,
+        dest="gapRate",
+        metavar="RATE",
+        action="store",
+        default=0.1,
+        help="fraction of IP addresses of a pool that are never observed (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--dynamic-rate",
+        type=float,
+        dest="dynamicRate",
+        metavar="RATE",
+        action="store",
+        default=0.5,
+        help="fraction of dynamic pools, where hosts of the pool move between its IP addresses. Other pools are static, one host per IP address (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--churn-rate",
+        type=float,
+        dest="churnRate",
+        metavar="RATE",
+        action="store",
+        default=0.2,
+        help="fraction of static hosts that renew their certificate (new fingerprint, same domain) during the observation window (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--renewal-days",
+        type=int,
+        dest="renewalDays",
+        metavar="DAYS",
+        action="store",
+        default=7,
+        help="days between certificate renewals of a churning static host (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--days",
+        type=int,
+        dest="days",
+        metavar="DAYS",
+        action="store",
+        default=30,
+        help="length of the observation window, in days (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--observations",
+        type=float,
+        dest="observations",
+        metavar="MEAN",
+        action="store",
+        default=8.0,
+        help="mean amount of observations of every IP address, every IP is observed at least once (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        metavar="SEED",
+        action="store",
+        default=0,
+        help="random seed, the same seed and parameters always generate the same data (default: %(default)s)",
+    )
+
+
+def getGeneratorParameters(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Gets the generator parameters from command line arguments, as saved in the cache metadata.
+    """
+
+    return {
+        "ips": args.ips,
+        "ases": args.ases,
+        "pool_sizes": list(args.poolSizes),
+        "pool_spacing": list(args.poolSpacing),
+        "gap_rate": args.gapRate,
+        "dynamic_rate": args.dynamicRate,
+        "churn_rate": args.churnRate,
+        "renewal_days": args.renewalDays,
+        "days": args.days,
+        "observations": args.observations,
+        "seed": args.seed,
+    }
+
+
+def generatePools(
+    rng: np.random.Generator, args: argparse.Namespace
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[tuple[str, int]]]:
+    """
+    Lays out the IP addresses of every AS as a sequence of address pools.
+
+    Every AS gets `ips / ases` IP addresses (the first ASes get the remainder), split in pools separated by unused
+    addresses. Addresses of a pool are skipped with probability `gapRate`. The BGP prefix of every AS is the smallest
+    prefix covering its pools, and prefixes are laid out one after the other from 1.0.0.0.
+
+    Parameters
+    ----------
+    `rng`: random generator
+    `args`: generator parameters
+
+    Returns
+    -------
+    A tuple in the following order:
+    `ips`: IP addresses as integers, sorted
+    `poolIds`: pool of every IP address
+    `isDynamicPool`: whether every pool is dynamic
+    `prefixes`: BGP prefix and AS number of every AS
+    """
+
+    (minPoolSize, maxPoolSize) = args.poolSizes
+    (minSpacing, maxSpacing) = args.poolSpacing
+
+    ipParts: list[np.ndarray] = list()
+    poolParts: list[np.ndarray] = list()
+    prefixes: list[tuple[str, int]] = list()
+
+    totalPools: int = 0
+    position: int = BASE_ADDRESS
+
+    for asIdx in range(args.ases):
+        target: int = args.ips // args.ases + (asIdx < args.ips % args.ases)
+
+        offsets: list[np.ndarray] = list()
+        pools: list[np.ndarray] = list()
+
+        found: int = 0
+        poolStart: int = 0
+
+        # Pools are drawn until the AS has enough IP addresses, the last pool is cut short
+        while found < target:
+            poolSize: int = int(rng.integers(minPoolSize, maxPoolSize + 1))
+
+            poolOffsets: np.ndarray = poolStart + np.flatnonzero(
+                rng.random(poolSize) >= args.gapRate
+            )
+            poolOffsets = poolOffsets[: target - found]
+
+            offsets.append(poolOffsets)
+            pools.append(np.full(len(poolOffsets), totalPools, dtype=np.int64))
+
+            found += len(poolOffsets)
+            totalPools += 1
+            poolStart += poolSize + int(rng.integers(minSpacing, maxSpacing + 1))
+
+        asOffsets: np.ndarray = np.concatenate(offsets + [np.zeros(0, dtype=np.int64)])
+
+        # Smallest prefix covering every pool of the AS, aligned to its size
+        span: int = int(asOffsets[-1]) + 1 if len(asOffsets) > 0 else 1
+        bits: int = 32 - math.ceil(math.log2(span))
+        size: int = 1 << (32 - bits)
+        position = (position + size - 1) // size * size
+
+        ipParts.append(position + asOffsets)
+        poolParts.append(np.concatenate(pools + [np.zeros(0, dtype=np.int64)]))
+        prefixes.append(
+            (f"{socket.inet_ntoa(position.to_bytes(4, 'big'))}/{bits}", BASE_ASN + asIdx)
+        )
+
+        position += size
+
+    if position > 1 << 32:
+        raise ValueError("Synthetic IP addresses do not fit in the IPv4 address space")
+
+    return (
+        np.concatenate(ipParts + [np.zeros(0, dtype=np.int64)]).astype(np.uint32),
+        np.concatenate(poolParts + [np.zeros(0, dtype=np.int64)]),
+        rng.random(totalPools) < args.dynamicRate,
+        prefixes,
+    )
+
+
+def generateObservations(
+    args: argparse.Namespace,
+) -> tuple[Observations, list[tuple[str, int]]]:
+    """
+    Generates a synthetic observation table.
+
+    - Dynamic pools: every pool has as many hosts as IP addresses, and every observation of an IP address sees a
+      random host of its pool (the fingerprint and domain of the host), so hosts move between the addresses of the pool
+    - Static pools: every IP address has its own host. Churning hosts renew their certificate every `renewalDays`
+      days, which changes their fingerprint but not their domain
+
+    Parameters
+    ----------
+    `args`: generator parameters
+
+    Returns
+    -------
+    A tuple in the following order:
+    `observations`: observation table sorted by IP and timestamp
+    `prefixes`: BGP prefix and AS number of every AS
+    """
+
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+
+    (ips, poolIds, isDynamicPool, prefixes) = generatePools(rng, args)
+
+    # Observations of every IP address, at random times of the window
+    counts: np.ndarray = rng.poisson(max(args.observations - 1.0, 0.0), len(ips)) + 1
+    rowIps: np.ndarray = np.repeat(np.arange(len(ips), dtype=np.int64), counts)
+    rowOffsets: np.ndarray = rng.integers(0, args.days * 86400, len(rowIps))
+
+    rowPools: np.ndarray = poolIds[rowIps]
+    isDynamicRow: np.ndarray = isDynamicPool[rowPools]
+
+    # Hosts of dynamic pools come first, then one host per IP address of static pools
+    poolSizes: np.ndarray = np.bincount(poolIds, minlength=len(isDynamicPool))
+    poolHosts: np.ndarray = np.where(isDynamicPool, poolSizes, 0)
+    poolFirstHost: np.ndarray = np.cumsum(poolHosts) - poolHosts
+    staticFirstHost: int = int(poolHosts.sum())
+
+    hosts: np.ndarray = np.where(
+        isDynamicRow,
+        poolFirstHost[rowPools]
+        + (rng.random(len(rowIps)) * poolHosts[rowPools]).astype(np.int64),
+        staticFirstHost + rowIps,
+    )
+
+    # Certificate churn: a new fingerprint version at every renewal, from a random phase
+    isChurning: np.ndarray = rng.random(len(ips)) < args.churnRate
+    phases: np.ndarray = rng.integers(0, args.renewalDays * 86400, len(ips))
+
+    versions: np.ndarray = np.where(
+        ~isDynamicRow & isChurning[rowIps],
+        (rowOffsets + phases[rowIps]) // (args.renewalDays * 86400),
+        0,
+    )
+    versions = np.minimum(versions, MAX_FINGERPRINT_VERSIONS - 1)
+
+    (fingerprintKeys, fingerprintIds) = np.unique(
+        hosts * MAX_FINGERPRINT_VERSIONS + versions, return_inverse=True
+    )
+    (domainHosts, domainIds) = np.unique(hosts, return_inverse=True)
+
+    observations: Observations = Observations(
+        columns={
+            "ip": ips[rowIps],
+            "ts": (BASE_TIMESTAMP + rowOffsets).astype(np.int64),
+            "fingerprint_id": fingerprintIds.astype(np.int32),
+            "port": np.full(len(rowIps), SCANNED_PORT, dtype=np.uint16),
+            "domain_id": domainIds.astype(np.int32),
+        },
+        fingerprints=[f"{key:016x}" for key in fingerprintKeys.tolist()],
+        domains=[f"host{host}.example.net" for host in domainHosts.tolist()],
+    )
+    observations.sort()
+
+    return (observations, prefixes)
+
+
+def saveIpAsnFile(filepath: str, prefixes: list[tuple[str, int]]) -> None:
+    """
+    Saves BGP prefixes as an IPASN data file, in the format generated by `pyasn_util_convert.py`.
+    """
+
+    with open(filepath, "w") as file:
+        file.write("; IP-ASN32-DAT file\n")
+        file.write("; Original file : synthetic.py\n")
+        file.write(f"; Prefixes-v4 : {len(prefixes)}\n")
+        file.write("; Prefixes-v6 : 0\n")
+        file.write(";\n")
+
+        for prefix, asn in prefixes:
+            file.write(f"{prefix}\t{asn}\n")
+
+
+def generateDataset(args: argparse.Namespace, cacheFolder: str) -> Observations:
+    """
+    Generates a synthetic dataset and saves it to `cacheFolder`: a columnar cache and a matching IPASN.dat.
+
+    Parameters
+    ----------
+    `args`: generator parameters
+    `cacheFolder`: folder where the input data will be saved
+
+    Returns
+    -------
+    `observations`: generated observation table
+    """
+
+    os.makedirs(cacheFolder, exist_ok=True)
+
+    (observations, prefixes) = generateObservations(args)
+
+    # IPASN.dat is written first, the columnar cache is only valid once its metadata is written
+    saveIpAsnFile(os.path.join(cacheFolder, "IPASN.dat"), prefixes)
+    observations.save(
+        cacheFolder, {"module": "synthetic", "generator": getGeneratorParameters(args)}
+    )
+
+    return observations
+
+
+def validateArgs(args: argparse.Namespace) -> None:
+    """
+    Validates generator parameters.
+
+    Exits if any parameter is invalid.
+
+    Parameters
+    ----------
+    `args`: command line arguments
+    """
+
+    if args.ips < 1 or args.ases < 1:
+        logging.error(f"At least one IP address and one AS are needed")
+        exit(4)
+
+    if args.poolSizes[0] < 1 or args.poolSizes[0] > args.poolSizes[1]:
+        logging.error(f"Pool sizes should be a valid range of positive sizes")
+        exit(4)
+
+    if args.poolSpacing[0] < 0 or args.poolSpacing[0] > args.poolSpacing[1]:
+        logging.error(f"Pool spacing should be a valid range of non-negative sizes")
+        exit(4)
+
+    for name, rate in (
+        ("Dynamic rate", args.dynamicRate),
+        ("Churn rate", args.churnRate),
+    ):
+        if rate < 0.0 or rate > 1.0:
+            logging.error(f"{name} should be in the interval [0.0, 1.0]")
+            exit(4)
+
+    if args.gapRate < 0.0 or args.gapRate >= 1.0:
+        logging.error(f"Gap rate should be in the interval [0.0, 1.0)")
+        exit(4)
+
+    if args.days < 1 or args.renewalDays < 1:
+        logging.error(f"Observation window and renewal period should be at least one day")
+        exit(4)
+
+    if args.observations < 1.0:
+        logging.error(f"Every IP address should have at least one observation")
+        exit(4)
+
+
+# Start here
+if __name__ == "__main__":
+    # Get args
+    parser = initParser()
+    args = parser.parse_args()
+
+    # Set up log
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s: %(message)s",
+        datefmt="%m/%d/%Y %I:%M:%S %p",
+        level=getattr(logging, args.loglevel),
+        filename=args.logfile,
+        encoding="utf-8",
+    )
+
+    validateArgs(args)
+
+    logging.info(
+        f"Generating {args.ips} IP addresses in {args.ases} ASes (seed {args.seed})"
+    )
+
+    observations: Observations = generateDataset(args, args.cacheFolder)
+
+    logging.info(
+        f"Synthetic input data has been saved to {args.cacheFolder}/ ({observations.getSize()} observations, {len(observations.fingerprints)} fingerprints, {len(observations.domains)} domains)"
+    )
@@ -0,0 +1,100 @@
+import random
+import argparse
+import numpy as np
+
+# Block building
+from dynmap import IP_Block, buildBlocks, buildBlocksSequential, findBlockBounds
+
+# Amount of random cases compared with the reference implementation
+RANDOM_CASES: int = 3000
+
+
+def generateGroup(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    """
+    Generates a sorted group of IP addresses with random gaps and fingerprint counts from 0 to 3, sometimes right
+    below 2^32 so that differences between IPs cannot overflow unnoticed.
+    """
+
+    ip: int = (
+        rng.randrange(2**32 - 4 * size - 64, 2**32 - 4 * size)
+        if rng.random() < 0.3
+        else rng.randrange(2**31)
+    )
+
+    ips: list[int] = list()
+
+    for _ in range(size):
+        ips.append(ip)
+        ip += rng.choice([1, 1, 1, 2, 3, 4])
+
+    return (ips, [rng.randrange(4) for _ in range(size)])
+
+
+def toTuples(blocks: list[IP_Block]) -> list[tuple[int, int, list[int]]]:
+    return [(block.start, block.end, block.trueIps.tolist()) for block in blocks]
+
+
+def generateArgs(rng: random.Random) -> argparse.Namespace:
+    minBlockSize: int = rng.randrange(1, 17)
+
+    return argparse.Namespace(
+        minBlockSize=minBlockSize, maxGapSize=rng.randrange(0, minBlockSize + 1)
+    )
+
+
+def test_build_blocks_matches_sequential() -> None:
+    rng: random.Random = random.Random(0)
+
+    for _ in range(RANDOM_CASES):
+        args: argparse.Namespace = generateArgs(rng)
+        (ips, fingerprintCounts) = generateGroup(rng, rng.randrange(0, 60))
+
+        expected = buildBlocksSequential(args, ips, fingerprintCounts)
+        result = buildBlocks(
+            args,
+            np.array(ips, dtype=np.uint32),
+            np.array(fingerprintCounts, dtype=np.int64),
+        )
+
+        assert toTuples(result) == toTuples(expected)
+
+
+def test_find_block_bounds_keeps_groups_apart() -> None:
+    rng: random.Random = random.Random(1)
+
+    for _ in range(RANDOM_CASES):
+        args: argparse.Namespace = generateArgs(rng)
+        groups: list[tuple[list[int], list[int]]] = [
+            generateGroup(rng, rng.randrange(1, 30))
+            for _ in range(rng.randrange(1, 6))
+        ]
+
+        # Every group is built on its own by the reference implementation
+        expected: list[tuple[int, int, list[int]]] = list()
+
+        for groupIps, groupCounts in groups:
+            expected.extend(
+                toTuples(buildBlocksSequential(args, groupIps, groupCounts))
+            )
+
+        ips: np.ndarray = np.array(
+            [ip for group in groups for ip in group[0]], dtype=np.uint32
+        )
+        fingerprintCounts: np.ndarray = np.array(
+            [count for group in groups for count in group[1]], dtype=np.int64
+        )
+        groupStarts: np.ndarray = np.cumsum(
+            [0] + [len(group[0]) for group in groups[:-1]]
+        )
+
+        (trueIdx, blockFirst, blockLast) = findBlockBounds(
+            ips, fingerprintCounts, groupStarts, args.minBlockSize, args.maxGapSize
+        )
+        trueIps: np.ndarray = ips[trueIdx]
+
+        result: list[tuple[int, int, list[int]]] = [
+            (int(trueIps[first]), int(trueIps[last]), trueIps[first : last + 1].tolist())
+            for first, last in zip(blockFirst.tolist(), blockLast.tolist())
+        ]
+
+        assert result == expected
@@ -0,0 +1,76 @@
+import random
+import datetime as dt
+import numpy as np
+import pytest
+
+# IP usage entropy engines
+from dynmap import (
+    ENTROPY_BATCH_ENTRIES,
+    calculateUsageEntropiesSets,
+    calculateUsageEntropiesSparse,
+)
+
+# Compact input data
+from ipdata import IpData, ObservationBuilder
+
+# Amount of random blocks compared between engines
+RANDOM_CASES: int = 300
+
+
+def buildBlockData(
+    rng: random.Random, totalIps: int, totalFingerprints: int, sharedFingerprint: bool
+) -> IpData:
+    """
+    Builds input data for a single block of IP addresses with random fingerprints, every IP also gets a common
+    fingerprint if `sharedFingerprint` is set (e.g. a vendor default certificate across a provider pool).
+    """
+
+    builder: ObservationBuilder = ObservationBuilder()
+    start: dt.datetime = dt.datetime(2024, 3, 1)
+
+    for i in range(totalIps):
+        ip: str = f"10.0.{i >> 8}.{i & 255}"
+        fingerprints: list[str] = [
+            f"fp{rng.randrange(totalFingerprints)}" for _ in range(rng.randrange(1, 5))
+        ]
+
+        if sharedFingerprint:
+            fingerprints.append("shared")
+
+        for day, fingerprint in enumerate(fingerprints):
+            builder.add(
+                ip, start + dt.timedelta(days=day), fingerprint, 443, "example.com"
+            )
+
+    return IpData.fromObservations(builder.build())
+
+
+def compareEngines(data: IpData, blockSize: int, batchEntries: int) -> None:
+    blockIdx: np.ndarray = np.arange(data.getSize())
+
+    expected = calculateUsageEntropiesSets(data, blockIdx, blockSize)
+    result = calculateUsageEntropiesSparse(data, blockIdx, blockSize, batchEntries)
+
+    # Engines must agree to the last bit, not only approximately
+    assert result == expected
+
+
+@pytest.mark.parametrize("batchEntries", [1, 16, ENTROPY_BATCH_ENTRIES])
+def test_engines_match_on_random_blocks(batchEntries: int) -> None:
+    rng: random.Random = random.Random(batchEntries)
+
+    for _ in range(RANDOM_CASES):
+        totalIps: int = rng.randrange(1, 40)
+        data: IpData = buildBlockData(
+            rng, totalIps, rng.randrange(1, 30), rng.random() < 0.3
+        )
+
+        compareEngines(data, totalIps + rng.randrange(1, 10), batchEntries)
+
+
+def test_engines_match_on_shared_fingerprint() -> None:
+    rng: random.Random = random.Random(0)
+    data: IpData = buildBlockData(rng, 600, 5000, True)
+
+    # Every IP shares a fingerprint with every other IP, so the product is split in many batches
+    compareEngines(data, 1024, 5000)
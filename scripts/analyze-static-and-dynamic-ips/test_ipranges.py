@@ -0,0 +1,106 @@
+import random
+import numpy as np
+import pytest
+
+# Range output
+from ipranges import (
+    RANGE_FORMATS,
+    RANGE_TYPES,
+    SWEEP_COLUMNS,
+    IpRanges,
+    buildRangeRow,
+    saveRanges,
+)
+
+
+def generateRows(rng: random.Random, totalRanges: int) -> list[dict]:
+    """
+    Generates disjoint ranges of random types, with or without entropy statistics.
+    """
+
+    rows: list[dict] = list()
+    start: int = rng.randrange(2**32 - 64 * totalRanges)
+
+    for _ in range(totalRanges):
+        end: int = start + rng.randrange(0, 40)
+        entropyStats = (0.1, 0.5, 0.9) if rng.random() < 0.8 else None
+
+        rows.append(
+            buildRangeRow(
+                start,
+                end,
+                rng.choice(RANGE_TYPES),
+                rng.randrange(1, end - start + 2),
+                rng.choice([64500, None]),
+                rng.choice(["100.64.0.0/10", None]),
+                entropyStats,
+            )
+        )
+
+        start = end + rng.randrange(1, 20)
+
+    return rows
+
+
+@pytest.mark.parametrize("outputFormat", list(RANGE_FORMATS))
+def test_ranges_round_trip(tmp_path, outputFormat: str) -> None:
+    if outputFormat == "parquet":
+        pytest.importorskip("pyarrow")
+
+    rng: random.Random = random.Random(0)
+    rows: list[dict] = generateRows(rng, 200)
+    metadata: dict = {"min_block_size": 8, "dynamic_ips": 10}
+
+    filepath: str = str(tmp_path / f"ranges{RANGE_FORMATS[outputFormat]}")
+    saveRanges(filepath, outputFormat, reversed(rows), metadata)
+
+    ranges: IpRanges = IpRanges.fromFile(filepath)
+
+    assert ranges.rows == rows
+    assert ranges.metadata == metadata
+
+    for row in rows:
+        ips: np.ndarray = np.array([row["start"], row["end"]], dtype=np.int64)
+
+        assert ranges.contains(ips, row["type"]).all()
+        assert ranges.getTypes(ips) == [row["type"], row["type"]]
+
+
+@pytest.mark.parametrize("outputFormat", list(RANGE_FORMATS))
+def test_sweep_ranges_select_runs(tmp_path, outputFormat: str) -> None:
+    if outputFormat == "parquet":
+        pytest.importorskip("pyarrow")
+
+    rng: random.Random = random.Random(1)
+    runs: list[dict] = list()
+    rowsPerRun: list[list[dict]] = list()
+
+    for minBlockSize in (8, 16):
+        for threshold in (0.3, 0.5):
+            parameters: dict = {
+                "min_block_size": minBlockSize,
+                "max_gap_size": 4,
+                "smoothing_threshold": threshold,
+                "median_window_size": 5,
+            }
+
+            runs.append({**parameters, "dynamic_ips": minBlockSize})
+            rowsPerRun.append(
+                [{**parameters, **row} for row in generateRows(rng, 50)]
+            )
+
+    filepath: str = str(tmp_path / f"sweep{RANGE_FORMATS[outputFormat]}")
+    saveRanges(
+        filepath,
+        outputFormat,
+        [row for rows in reversed(rowsPerRun) for row in rows],
+        {"runs": runs},
+        tuple(SWEEP_COLUMNS),
+    )
+
+    for run, rows in zip(runs, rowsPerRun):
+        parameters = {column: run[column] for column in SWEEP_COLUMNS}
+        ranges: IpRanges = IpRanges.fromFile(filepath, parameters)
+
+        assert ranges.rows == rows
+        assert ranges.metadata == run
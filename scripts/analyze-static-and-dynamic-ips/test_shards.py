@@ -0,0 +1,106 @@
+import random
+import datetime as dt
+import numpy as np
+
+# Observation tables and shards
+from ipdata import Observations, ObservationBuilder, findShardBoundaries
+
+# Amount of random sets of files split in shards
+RANDOM_CASES: int = 50
+
+
+def buildFile(rng: random.Random, totalRows: int) -> Observations:
+    """
+    Builds the observations of a single scan file, most of them in a single /16 so that prefix shards would be skewed.
+    """
+
+    builder: ObservationBuilder = ObservationBuilder()
+    start: dt.datetime = dt.datetime(2024, 3, 1)
+
+    for _ in range(totalRows):
+        ip: int = (
+            rng.randrange(0x0A000000, 0x0A010000)
+            if rng.random() < 0.9
+            else rng.randrange(2**32)
+        )
+
+        builder.add(
+            f"{ip >> 24}.{(ip >> 16) & 255}.{(ip >> 8) & 255}.{ip & 255}",
+            start + dt.timedelta(hours=rng.randrange(24 * 30)),
+            f"fp{rng.randrange(50)}",
+            rng.choice([443, 8443]),
+            f"domain{rng.randrange(10)}",
+        )
+
+    return builder.build()
+
+
+def toRows(observations: Observations) -> list[tuple]:
+    return list(
+        zip(
+            observations.columns["ip"].tolist(),
+            observations.columns["ts"].tolist(),
+            [
+                observations.fingerprints[i]
+                for i in observations.columns["fingerprint_id"]
+            ],
+            observations.columns["port"].tolist(),
+            [observations.domains[i] for i in observations.columns["domain_id"]],
+        )
+    )
+
+
+def test_shards_merge_to_the_whole_table() -> None:
+    rng: random.Random = random.Random(0)
+
+    for _ in range(RANDOM_CASES):
+        files: list[Observations] = [
+            buildFile(rng, rng.randrange(0, 400)) for _ in range(rng.randrange(1, 5))
+        ]
+        totalShards: int = rng.randrange(1, 20)
+
+        boundaries: list[int] = findShardBoundaries(
+            [file.getIpQuantiles(rng.randrange(1, 64)) for file in files],
+            [file.getSize() for file in files],
+            totalShards,
+        )
+
+        assert len(boundaries) < totalShards
+        assert boundaries == sorted(set(boundaries))
+
+        splitFiles: list[dict[int, Observations]] = [
+            file.split(boundaries) for file in files
+        ]
+        shards: list[Observations] = [
+            Observations.concatenate(
+                [shards[shard] for shards in splitFiles if shard in shards]
+            )
+            for shard in range(len(boundaries) + 1)
+        ]
+
+        # Shards are disjoint ranges of IP addresses, merged in shard order they are the whole table
+        assert [row for shard in shards for row in toRows(shard)] == toRows(
+            Observations.concatenate(files)
+        )
+
+
+def test_shards_are_balanced() -> None:
+    rng: random.Random = random.Random(1)
+    files: list[Observations] = [buildFile(rng, 5000) for _ in range(3)]
+
+    boundaries: list[int] = findShardBoundaries(
+        [file.getIpQuantiles(1024) for file in files],
+        [file.getSize() for file in files],
+        16,
+    )
+
+    ips: np.ndarray = np.sort(
+        np.concatenate([file.columns["ip"] for file in files]).astype(np.int64)
+    )
+    shardSizes: np.ndarray = np.diff(
+        [0] + np.searchsorted(ips, boundaries).tolist() + [len(ips)]
+    )
+
+    # A shard per /8 would put 90% of the rows in a single shard
+    assert len(shardSizes) == 16
+    assert shardSizes.max() < 1.5 * len(ips) / 16
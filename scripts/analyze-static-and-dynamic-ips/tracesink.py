@@ -0,0 +1,104 @@
+# Needed for analysis
+import gzip
+import json
+import zlib
+
+# Code consistency
+from typing import Any, TextIO
+
+
+class TraceSink:
+    """
+    Structured diagnostics of a DynMap run, written as gzipped JSON Lines records (one JSON object per line).
+
+    Blocks are traced if they match the AS number and prefix filters (if any) and are in the sample. Sampling is
+    deterministic, based on the first IP address of the block, so the same blocks are traced on every run.
+
+    A disabled sink (the default) never builds records: callers must check `isTraced` before building a record, so
+    tracing costs a single check per block when disabled.
+
+    In worker processes, records are kept in memory (see `toBuffer`) and written by the main process (see `writeAll`).
+    """
+
+    def __init__(
+        self,
+        filepath: str | None = None,
+        asns: list[int] | None = None,
+        prefixes: list[str] | None = None,
+        sampleRate: float = 1.0,
+        shouldTraceTimeSeries: bool = False,
+    ):
+        self.filepath: str | None = filepath
+        self.asns: set[int] | None = set(asns) if asns else None
+        self.prefixes: set[str] | None = set(prefixes) if prefixes else None
+        self.sampleRate: float = sampleRate
+        self.shouldTraceTimeSeries: bool = shouldTraceTimeSeries
+
+        self.enabled: bool = filepath is not None
+        self.file: TextIO | None = None
+        self.buffer: list[dict[str, Any]] | None = None
+
+    def isTraced(self, asn: int | None, prefix: str | None, start: int) -> bool:
+        """
+        Checks whether a block is traced, given its AS number, BGP prefix and first IP address (as an integer).
+        """
+
+        if not self.enabled:
+            return False
+
+        if self.asns is not None and asn not in self.asns:
+            return False
+
+        if self.prefixes is not None and prefix not in self.prefixes:
+            return False
+
+        if self.sampleRate >= 1.0:
+            return True
+
+        return zlib.crc32(start.to_bytes(4, "big")) < self.sampleRate * 2**32
+
+    def write(self, record: dict[str, Any]) -> None:
+        """
+        Writes a trace record. The trace file is only created when the first record is written.
+        """
+
+        if self.buffer is not None:
+            self.buffer.append(record)
+            return
+
+        if self.file is None:
+            self.file = gzip.open(self.filepath, "wt", encoding="utf-8")
+
+        self.file.write(json.dumps(record) + "\n")
+
+    def writeAll(self, records: list[dict[str, Any]]) -> None:
+        """
+        Writes records gathered by a worker process.
+        """
+
+        for record in records:
+            self.write(record)
+
+    def toBuffer(self) -> None:
+        """
+        Keeps records in memory instead of writing them, for use in worker processes. The trace file (if any) is
+        left to the main process: a forked worker keeps the (inherited) file untouched, since closing it would write
+        to the file of the main process.
+        """
+
+        self.buffer = list()
+
+    def drain(self) -> list[dict[str, Any]]:
+        """
+        Gets and clears the records kept in memory (see `toBuffer`).
+        """
+
+        records: list[dict[str, Any]] = self.buffer or list()
+        self.buffer = list() if self.buffer is not None else None
+
+        return records
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
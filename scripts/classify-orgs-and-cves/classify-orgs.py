@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
 import argparse
-import bz2
 import json
 import logging
 import os
+import pathlib
 import pickle
+import sys
 from collections import defaultdict
 from typing import Any, Callable
 
@@ -15,6 +16,15 @@ from bs4.element import Comment
 from easynmt import EasyNMT  # Translation
 from transformers import Pipeline, pipeline
 
+# Shared modules are in the repository root
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))
+
+from modules.bz2reader import open_lines  # Parallel bz2 decompression
+
+# Processes used to decompress each .json.bz2 file. Classification is much slower than decompression, and files are
+# read after the models are loaded, so a single process is enough
+READER_WORKERS: int = 1
+
 # Candidate labels
 LABELS: list[str] = [
     "healthcare",
@@ -347,14 +357,17 @@ def processOrgsFromShodan(
         isFileCompressed: bool = file.path.endswith(".json.bz2")
 
         if isFileCompressed:
-            data = bz2.open(file.path, "rt")
+            data = open_lines(file.path, READER_WORKERS)
         else:
             data = json.load(open(file.path, "rb"))
 
+        # Compressed files are read line by line, so the amount of scans is not known beforehand
+        total: str = "?" if isFileCompressed else str(len(data))
+
         # Process data
         for idx, scan in enumerate(data):
             if idx % 1000 == 0:
-                logging.info(f"Progress {idx + 1} / {len(data)}")
+                logging.info(f"Progress {idx + 1} / {total}")
 
             if isFileCompressed:
                 scan: dict[Any, Any] = json.loads(scan)